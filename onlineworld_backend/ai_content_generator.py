@@ -1,18 +1,25 @@
-import requests
+import re
 import time
+import logging
 import random
 import json
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 # 直接导入模型和原生SQLAlchemy的Base（无需Flask）
 from forum.models import Board, Post, Reply
+from forum.author_registry import author_registry
 # 导入工具系统
 from ai_tools import tool_registry
 # 导入配置
 from config import Config
+from llm_client import llm_client, LLMError, HostRateLimiter
 from apscheduler.schedulers.blocking import BlockingScheduler
 
+logger = logging.getLogger(__name__)
+
 # -------------------------- 基础配置（从config.py获取）--------------------------
 # 数据库配置（使用与项目config.py相同的配置）
 DATABASE_URL = Config.SQLALCHEMY_DATABASE_URI
@@ -28,6 +35,17 @@ REPLIES_PER_RUN = 4    # 增加到每次运行生成8个回复
 REPLY_TIME_WINDOW = 24  # 仅回复24小时内帖子
 PROB_REUSE_USER = 1.0   # 70%复用现有用户
 USE_TOOL_PROB = 1.0     # 总是使用工具获取地点信息，确保与数据库一致
+GENERATION_CONCURRENCY = Config.LLM_MAX_CONCURRENCY  # 批量生成时同时进行的条数
+MAX_GENERATION_ROUNDS = 3  # 发帖失败名额最多补几轮
+# 各用途的输出token上限（帖子3-5句、回复1-3句、用户名几个字，不需要默认的1000）
+TOKEN_BUDGETS = {"post": 400, "reply": 200, "username": 20}
+DEFAULT_MAX_TOKENS = 1000
+# 流式生成时，帖子正文/回复写满这么多句就提前结束
+POST_MAX_SENTENCES = 5
+REPLY_MAX_SENTENCES = 3
+SENTENCE_END = re.compile(r"[。！？!?…]+")
+# 批量生成的每分钟token预算（LLM_TOKENS_PER_MINUTE为0时不限制）
+_token_budget = HostRateLimiter(Config.LLM_TOKENS_PER_MINUTE / 60, burst=Config.LLM_TOKENS_PER_MINUTE)
 BASE_AUTHOR_POOL = [
     "路人甲", "技术爱好者", "打工人小李", "吃货小张", "运维老司机",
     "编程菜鸟", "生活观察员", "数码发烧友", "职场新人", "闲聊达人"
@@ -50,6 +68,8 @@ from app import app
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})  # SQLite需加此参数
 # 创建会话工厂（替代Flask-SQLAlchemy的db.session）
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 作者池：首次选作者时加载，之后增量刷新（调用时再取 SessionLocal，允许替换会话工厂）
+author_registry.session_factory = lambda: SessionLocal()
 
 # 验证数据库连接
 def test_db_connection():
@@ -59,11 +79,11 @@ def test_db_connection():
             # 执行简单查询，验证连接
             db.query(Board).first()
             db.close()
-            print("✅ 数据库连接成功（原生SQLAlchemy，无Flask依赖）")
+            logger.info("✅ 数据库连接成功（原生SQLAlchemy，无Flask依赖）")
             return True
     except Exception as e:
-        print(f"❌ 数据库连接失败：{str(e)}")
-        print(f"⚠️  请检查 DATABASE_URL 是否与项目config.py一致！")
+        logger.error("❌ 数据库连接失败：%s", e)
+        logger.warning("⚠️  请检查 DATABASE_URL 是否与项目config.py一致！")
         return False
 
 # -------------------------- 工具函数：获取数据库会话 --------------------------
@@ -78,31 +98,30 @@ def get_db():
 
 # -------------------------- 工具函数：获取现有用户列表（去重）--------------------------
 def get_existing_users():
-    db = next(get_db())
-    try:
-        post_authors = db.query(Post.author).distinct().all()
-        reply_authors = db.query(Reply.author).distinct().all()
-        existing_users = set()
-        for author in post_authors:
-            existing_users.add(author[0].strip())
-        for author in reply_authors:
-            existing_users.add(author[0].strip())
-        return [user for user in existing_users if user]
-    finally:
-        db.close()
+    """现有用户名列表（来自作者池，不再扫描帖子/回复表）"""
+    author_registry.refresh()
+    return list(author_registry)
 
 # -------------------------- 工具函数：生成新用户（不重复）--------------------------
-def generate_new_user(existing_users):
+def generate_new_user(existing_users=None):
+    """
+    生成一个不重复的新用户名
+    :param existing_users: 现有用户名集合（支持 in 判断），默认用作者池
+    """
+    if existing_users is None:
+        author_registry.refresh()
+        existing_users = author_registry
+    examples = list(islice(existing_users, 10))
     user_prompt = f"""
     生成一个复古论坛的用户名，要求：
     1. 风格：接地气、生活化，符合2000-2010年论坛风格（如"打工仔小李"、"编程老陈"）；
     2. 格式：2-4字，可带职业、身份或昵称（如"运维达人"、"校园吃货"）；
-    3. 唯一性：不要和以下现有用户名重复：{','.join(existing_users[:10]) if existing_users else '无'}；
+    3. 唯一性：不要和以下现有用户名重复：{','.join(examples) if examples else '无'}；
     4. 输出：仅返回用户名，不要任何多余字符。
     """
     
     # 调用API生成用户名
-    result = call_siliconflow_api(user_prompt, temperature=0.9)
+    result = call_siliconflow_api(user_prompt, temperature=0.9, max_tokens=TOKEN_BUDGETS["username"])
     
     # 处理API响应
     new_username = None
@@ -115,7 +134,7 @@ def generate_new_user(existing_users):
             elif isinstance(result, str):
                 new_username = result.strip()
         except Exception as e:
-            print(f"❌ 解析用户名失败：{str(e)}")
+            logger.error("❌ 解析用户名失败：%s", e)
     
     # API失败时降级到基础池
     if not new_username:
@@ -125,7 +144,7 @@ def generate_new_user(existing_users):
     # 重试3次避免重复
     retry_count = 0
     while new_username in existing_users and retry_count < 3:
-        result = call_siliconflow_api(user_prompt, temperature=0.9)
+        result = call_siliconflow_api(user_prompt, temperature=0.9, max_tokens=TOKEN_BUDGETS["username"])
         if result:
             try:
                 if isinstance(result, dict) and "choices" in result:
@@ -133,44 +152,65 @@ def generate_new_user(existing_users):
                 elif isinstance(result, str):
                     new_username = result.strip()
             except Exception as e:
-                print(f"❌ 重试解析用户名失败：{str(e)}")
+                logger.error("❌ 重试解析用户名失败：%s", e)
         retry_count += 1
     
     return new_username if new_username and new_username not in existing_users else f"用户{random.randint(1000,9999)}"
 
 # -------------------------- 工具函数：选择作者（复用/新增）--------------------------
 def select_author(exclude_author=None):
-    existing_users = get_existing_users()
+    author_registry.refresh()
     random_prob = random.random()
     
     # 70%复用现有用户
-    if random_prob < PROB_REUSE_USER and existing_users:
-        candidates = existing_users if not exclude_author else [u for u in existing_users if u != exclude_author]
-        return random.choice(candidates) if candidates else generate_new_user(existing_users)
+    if random_prob < PROB_REUSE_USER and len(author_registry):
+        author = author_registry.sample(exclude=exclude_author)
+        if author:
+            return author
+        new_user = generate_new_user(author_registry)
     # 30%生成新用户
     else:
-        new_user = generate_new_user(existing_users)
-        print(f"🆕 生成新用户：{new_user}")
-        return new_user
+        new_user = generate_new_user(author_registry)
+        logger.info("🆕 生成新用户：%s", new_user)
+    # 立即占用用户名，避免并发生成时取到同一个新名字
+    author_registry.add(new_user)
+    return new_user
+
+# -------------------------- 输出结构检查（流式提前结束）--------------------------
+def cut_at_sentences(text, max_sentences, header_lines=0):
+    """
+    检查输出结构是否已完整：跳过开头 header_lines 行（如帖子标题）后，正文已写满 max_sentences 句
+    :return: 结构完整时返回截到第 max_sentences 句末尾的文本，否则返回None
+    """
+    lines = text.strip().split("\n", header_lines)
+    if len(lines) <= header_lines:
+        return None
+    body = lines[-1]
+    ends = list(SENTENCE_END.finditer(body))
+    if len(ends) < max_sentences:
+        return None
+    return "\n".join(lines[:-1] + [body[:ends[max_sentences - 1].end()]])
+
+
+def sentence_cutoff(max_sentences, header_lines=0):
+    """生成流式调用的 stop_when：结构完整后立即断开"""
+    return lambda text: cut_at_sentences(text, max_sentences, header_lines) is not None
 
 # -------------------------- 硅基流动API调用 --------------------------
-def call_siliconflow_api(messages, temperature=0.7, tools=None, timeout=30):
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {SILICONFLOW_API_KEY}"
-    }
-    
+def call_siliconflow_api(messages, temperature=0.7, tools=None, timeout=30, cache=None,
+                         max_tokens=DEFAULT_MAX_TOKENS, stream=False, stop_when=None):
+    """
+    调用大模型（共享连接池客户端，失败时自动退避重试），最终失败返回None
+    :param cache: 是否使用响应缓存，None 时按温度决定；帖子/回复等每次都要不同内容的调用传 False
+    :param max_tokens: 输出token上限，按用途取 TOKEN_BUDGETS
+    :param stream: 是否流式接收（带工具的调用不支持，自动改为普通调用）
+    :param stop_when: 流式接收时判断结构已完整、可以提前结束的函数
+    """
     # 确保messages是列表格式
     if isinstance(messages, str):
         messages = [{"role": "user", "content": messages}]
     
-    data = {
-        "model": MODEL_NAME,
-        "messages": messages,
-        "temperature": temperature,
-        "max_tokens": 1000
-    }
-    
+    formatted_tools = None
     # 如果提供了工具，添加工具配置
     if tools:
         # 转换工具格式以符合硅基流动API要求
@@ -185,26 +225,24 @@ def call_siliconflow_api(messages, temperature=0.7, tools=None, timeout=30):
                 }
             }
             formatted_tools.append(formatted_tool)
-        
-        data["tools"] = formatted_tools
-        data["tool_choice"] = "auto"  # 允许模型自动选择是否使用工具
     
-    print(f"📤 API请求数据：{data}")
     try:
-        print(f"🔄 正在调用API...")
-        response = requests.post(SILICONFLOW_API_URL, headers=headers, json=data, timeout=timeout)
-        response.raise_for_status()
-        result = response.json()
-        print(f"📥 API响应结构：")
-        print(f"   - 有choices字段: {'choices' in result}")
-        if 'choices' in result:
-            print(f"   - choices数量: {len(result['choices'])}")
-            if result['choices']:
-                print(f"   - 第一个choice类型: {type(result['choices'][0])}")
-                print(f"   - 第一个choice内容: {json.dumps(result['choices'][0], ensure_ascii=False, indent=2)}")
-        return result
+        # 请求/响应摘要由客户端抽样记录（llm_client.log_call），这里不再打印完整内容
+        if stream and not formatted_tools:
+            return llm_client.stream_chat(
+                messages, temperature=temperature, max_tokens=max_tokens, timeout=timeout, stop_when=stop_when,
+                api_url=SILICONFLOW_API_URL, api_key=SILICONFLOW_API_KEY, model=MODEL_NAME, cache=cache
+            )
+        # tool_choice 默认为 auto，允许模型自动选择是否使用工具
+        return llm_client.chat(
+            messages, temperature=temperature, max_tokens=max_tokens, tools=formatted_tools, timeout=timeout,
+            api_url=SILICONFLOW_API_URL, api_key=SILICONFLOW_API_KEY, model=MODEL_NAME, cache=cache
+        )
+    except LLMError as e:
+        logger.error("❌ API调用失败：%s", e)
+        return None
     except Exception as e:
-        print(f"❌ API调用失败：{str(e)}")
+        logger.error("❌ API调用失败：%s", e)
         import traceback
         traceback.print_exc()
         return None
@@ -216,9 +254,9 @@ def handle_tool_call(tool_call):
     
     try:
         tool_args = json.loads(tool_call["function"]["arguments"])
-        print(f"🔧 执行工具调用：{tool_name}，参数：{tool_args}")
+        logger.debug("🔧 执行工具调用：%s，参数：%s", tool_name, tool_args)
     except json.JSONDecodeError as e:
-        print(f"❌ 解析工具参数失败：{str(e)}")
+        logger.error("❌ 解析工具参数失败：%s", e)
         return {
             "tool_call_id": tool_call["id"],
             "name": tool_name,
@@ -228,7 +266,7 @@ def handle_tool_call(tool_call):
     # 获取工具实例
     tool = tool_registry.get_tool(tool_name)
     if not tool:
-        print(f"❌ 找不到工具：{tool_name}")
+        logger.error("❌ 找不到工具：%s", tool_name)
         return {
             "tool_call_id": tool_call["id"],
             "name": tool_name,
@@ -241,7 +279,7 @@ def handle_tool_call(tool_call):
             # 检查是否有keyword参数，如果有，转换为合适的查询
             if "keyword" in tool_args:
                 keyword = tool_args["keyword"]
-                print(f"⚠️  MapLocationTool参数转换：将keyword '{keyword}'转换为地点查询")
+                logger.warning("⚠️  MapLocationTool参数转换：将keyword '%s'转换为地点查询", keyword)
                 # 尝试直接通过名称获取地点信息
                 # 如果是特定地点名称（如阳光小区），尝试获取详细信息
                 if keyword in ["星云小区", "幻想公寓", "梦境城邦", "星湖别墅"]:
@@ -254,7 +292,7 @@ def handle_tool_call(tool_call):
                     }
                     if keyword in place_id_map:
                         tool_args = {"query_type": "places", "place_id": place_id_map[keyword]}
-                        print(f"🔍 直接查询特定地点：{keyword} (place_id={place_id_map[keyword]})")
+                        logger.debug("🔍 直接查询特定地点：%s (place_id=%s)", keyword, place_id_map[keyword])
                     else:
                         tool_args = {"query_type": "places", "limit": 5}
             elif "query_type" not in tool_args:
@@ -265,7 +303,7 @@ def handle_tool_call(tool_call):
             # 转换place_name为place_id
             elif "place_name" in tool_args:
                 place_name = tool_args["place_name"]
-                print(f"⚠️  MapLocationTool参数转换：将place_name '{place_name}'转换为place_id")
+                logger.warning("⚠️  MapLocationTool参数转换：将place_name '%s'转换为place_id", place_name)
                 place_id_map = {
                     "星云小区": 1,
                     "幻想公寓": 2,
@@ -274,19 +312,19 @@ def handle_tool_call(tool_call):
                 }
                 if place_name in place_id_map:
                     tool_args = {"query_type": "places", "place_id": place_id_map[place_name]}
-                    print(f"🔍 直接查询特定地点：{place_name} (place_id={place_id_map[place_name]})")
+                    logger.debug("🔍 直接查询特定地点：%s (place_id=%s)", place_name, place_id_map[place_name])
                 else:
                     tool_args = {"query_type": "places", "limit": 5}
         
-        # 执行工具
-        result = tool.execute(**tool_args)
+        # 执行工具（带结果缓存）
+        result = tool.run(**tool_args)
         return {
             "tool_call_id": tool_call["id"],
             "name": tool_name,
             "content": result
         }
     except TypeError as e:
-        print(f"❌ 工具参数错误：{str(e)}")
+        logger.error("❌ 工具参数错误：%s", e)
         # 如果是参数错误，提供友好的错误信息
         return {
             "tool_call_id": tool_call["id"],
@@ -294,7 +332,7 @@ def handle_tool_call(tool_call):
             "content": f"错误：工具参数错误 - {str(e)}"
         }
     except Exception as e:
-        print(f"❌ 工具执行失败：{str(e)}")
+        logger.error("❌ 工具执行失败：%s", e)
         import traceback
         traceback.print_exc()
         return {
@@ -304,28 +342,37 @@ def handle_tool_call(tool_call):
         }
 
 # -------------------------- 带工具调用的内容生成 --------------------------
-def generate_content_with_tools(messages, temperature=0.7, use_tool_prob=USE_TOOL_PROB, max_tool_calls=2, current_tool_calls=0):
-    """生成内容，支持工具调用（有概率使用工具）"""
+def generate_content_with_tools(messages, temperature=0.7, use_tool_prob=USE_TOOL_PROB, max_tool_calls=2, current_tool_calls=0,
+                                max_tokens=DEFAULT_MAX_TOKENS, stop_when=None):
+    """
+    生成内容，支持工具调用（有概率使用工具）；帖子/回复每次都要不同的内容，不走响应缓存
+    最终内容流式接收，stop_when 判断结构完整后提前结束
+    :param max_tokens: 输出token上限
+    :param stop_when: 见 sentence_cutoff
+    """
     
     # 随机决定是否使用工具
     use_tools = random.random() < use_tool_prob
     
     if use_tools and current_tool_calls < max_tool_calls:
-        print(f"🔧 本次生成将尝试使用工具获取额外信息（已调用{current_tool_calls}/{max_tool_calls}次）")
+        logger.debug("🔧 本次生成将尝试使用工具获取额外信息（已调用%s/%s次）", current_tool_calls, max_tool_calls)
         # 获取所有工具的描述
         tools_description = tool_registry.get_tools_description()
         
         # 第一次调用大模型
-        response = call_siliconflow_api(messages, temperature, tools_description, timeout=60)
+        response = call_siliconflow_api(messages, temperature, tools_description, timeout=60, cache=False,
+                                        max_tokens=max_tokens)
         if not response:
-            print("⚠️  使用工具失败，回退到普通生成模式")
-            return generate_content_with_tools(messages, temperature, use_tool_prob=0.0, max_tool_calls=max_tool_calls, current_tool_calls=current_tool_calls)
+            logger.warning("⚠️  使用工具失败，回退到普通生成模式")
+            return generate_content_with_tools(messages, temperature, use_tool_prob=0.0, max_tool_calls=max_tool_calls, current_tool_calls=current_tool_calls,
+                                                max_tokens=max_tokens, stop_when=stop_when)
         
         # 处理大模型的响应
         try:
             if "choices" not in response or not response["choices"]:
-                print("⚠️  API响应格式错误，回退到普通生成模式")
-                return generate_content_with_tools(messages, temperature, use_tool_prob=0.0, max_tool_calls=max_tool_calls, current_tool_calls=current_tool_calls)
+                logger.warning("⚠️  API响应格式错误，回退到普通生成模式")
+                return generate_content_with_tools(messages, temperature, use_tool_prob=0.0, max_tool_calls=max_tool_calls, current_tool_calls=current_tool_calls,
+                                                max_tokens=max_tokens, stop_when=stop_when)
                 
             message = response["choices"][0]["message"]
             
@@ -363,62 +410,63 @@ def generate_content_with_tools(messages, temperature=0.7, use_tool_prob=USE_TOO
                 current_tool_calls += 1
                 
                 # 再次调用大模型，获取最终响应
-                response = call_siliconflow_api(messages, temperature, timeout=60)
+                response = call_siliconflow_api(messages, temperature, timeout=60, cache=False,
+                                                max_tokens=max_tokens, stream=True, stop_when=stop_when)
                 if not response:
                     return None
-                    
-                print(f"📤 工具调用后API返回原始响应：{json.dumps(response, ensure_ascii=False, indent=2)}")
                 
                 if "choices" not in response or not response["choices"]:
-                    print("⚠️  工具调用后API响应中没有choices字段或choices为空")
+                    logger.warning("⚠️  工具调用后API响应中没有choices字段或choices为空")
                     return None
                     
                 message = response["choices"][0]["message"]
                 # 详细记录content和reasoning_content的内容
                 content_field = message.get("content", "").strip()
                 reasoning_content_field = message.get("reasoning_content", "").strip()
-                print(f"📋 工具调用后content字段内容: {'[空]' if not content_field else content_field[:100]}...")
-                print(f"📋 工具调用后reasoning_content字段内容: {'[空]' if not reasoning_content_field else reasoning_content_field[:100]}...")
+                logger.debug("📋 工具调用后content字段内容: %s...", '[空]' if not content_field else content_field[:100])
+                logger.debug("📋 工具调用后reasoning_content字段内容: %s...", '[空]' if not reasoning_content_field else reasoning_content_field[:100])
                 # 优先使用content字段（最终输出结果），仅当content为空时才使用reasoning_content
                 content = content_field or reasoning_content_field
                 
                 # 检查是否是DSML格式的工具调用
                 if content and "<｜DSML｜function_calls>" in content:
-                    print("⚠️  检测到DSML格式工具调用请求，当前版本暂不支持DSML格式，回退到普通生成模式")
-                    return generate_content_with_tools(messages, temperature, use_tool_prob=0.0, max_tool_calls=max_tool_calls, current_tool_calls=current_tool_calls)
+                    logger.warning("⚠️  检测到DSML格式工具调用请求，当前版本暂不支持DSML格式，回退到普通生成模式")
+                    return generate_content_with_tools(messages, temperature, use_tool_prob=0.0, max_tool_calls=max_tool_calls, current_tool_calls=current_tool_calls,
+                                                max_tokens=max_tokens, stop_when=stop_when)
                 
-                print(f"📝 解析后的内容：{content}")
+                logger.debug("📝 解析后的内容：%s", content)
                 return content
             
             # 如果大模型直接返回了内容
-            print(f"📤 直接返回API响应：{json.dumps(response, ensure_ascii=False, indent=2)}")
             # 详细记录content和reasoning_content的内容
             content_field = message.get("content", "").strip()
             reasoning_content_field = message.get("reasoning_content", "").strip()
-            print(f"📋 直接返回时content字段内容: {'[空]' if not content_field else content_field[:100]}...")
-            print(f"📋 直接返回时reasoning_content字段内容: {'[空]' if not reasoning_content_field else reasoning_content_field[:100]}...")
+            logger.debug("📋 直接返回时content字段内容: %s...", '[空]' if not content_field else content_field[:100])
+            logger.debug("📋 直接返回时reasoning_content字段内容: %s...", '[空]' if not reasoning_content_field else reasoning_content_field[:100])
             # 优先使用content字段（最终输出结果），仅当content为空时才使用reasoning_content
             content = content_field or reasoning_content_field
             
             # 检查是否是DSML格式的工具调用
             if content and "<｜DSML｜function_calls>" in content:
-                print("⚠️  检测到DSML格式工具调用请求，当前版本暂不支持DSML格式，回退到普通生成模式")
-                return generate_content_with_tools(messages, temperature, use_tool_prob=0.0, max_tool_calls=max_tool_calls, current_tool_calls=current_tool_calls)
+                logger.warning("⚠️  检测到DSML格式工具调用请求，当前版本暂不支持DSML格式，回退到普通生成模式")
+                return generate_content_with_tools(messages, temperature, use_tool_prob=0.0, max_tool_calls=max_tool_calls, current_tool_calls=current_tool_calls,
+                                                max_tokens=max_tokens, stop_when=stop_when)
             
-            print(f"📝 直接解析的内容：{content}")
+            logger.debug("📝 直接解析的内容：%s", content)
             return content
         except Exception as e:
-            print(f"❌ 处理工具响应时出错：{str(e)}")
-            return generate_content_with_tools(messages, temperature, use_tool_prob=0.0, max_tool_calls=max_tool_calls, current_tool_calls=current_tool_calls)
+            logger.error("❌ 处理工具响应时出错：%s", e)
+            return generate_content_with_tools(messages, temperature, use_tool_prob=0.0, max_tool_calls=max_tool_calls, current_tool_calls=current_tool_calls,
+                                                max_tokens=max_tokens, stop_when=stop_when)
     else:
-        print("📝 本次生成将直接使用AI模型生成内容")
+        logger.debug("📝 本次生成将直接使用AI模型生成内容")
         # 不使用工具，直接调用大模型
-        response = call_siliconflow_api(messages, temperature, timeout=60)
+        response = call_siliconflow_api(messages, temperature, timeout=60, cache=False,
+                                        max_tokens=max_tokens, stream=True, stop_when=stop_when)
         if not response:
             return None
         
         try:
-            print(f"📤 API返回原始响应：{json.dumps(response, ensure_ascii=False, indent=2)}")
             if "choices" in response and response["choices"]:
                 message = response["choices"][0]["message"]
                 # 优先使用content字段（最终输出结果），仅当content为空时才使用reasoning_content
@@ -426,95 +474,166 @@ def generate_content_with_tools(messages, temperature=0.7, use_tool_prob=USE_TOO
                 
                 # 检查是否是DSML格式的工具调用
                 if content and "<｜DSML｜function_calls>" in content:
-                    print("⚠️  检测到DSML格式工具调用请求，当前版本暂不支持DSML格式，回退到普通生成模式")
-                    return generate_content_with_tools(messages, temperature, use_tool_prob=0.0, max_tool_calls=max_tool_calls, current_tool_calls=current_tool_calls)
+                    logger.warning("⚠️  检测到DSML格式工具调用请求，当前版本暂不支持DSML格式，回退到普通生成模式")
+                    return generate_content_with_tools(messages, temperature, use_tool_prob=0.0, max_tool_calls=max_tool_calls, current_tool_calls=current_tool_calls,
+                                                max_tokens=max_tokens, stop_when=stop_when)
                 
-                print(f"📝 解析后的内容：{content}")
+                logger.debug("📝 解析后的内容：%s", content)
                 return content
             else:
-                print("⚠️  API响应中没有choices字段或choices为空")
+                logger.warning("⚠️  API响应中没有choices字段或choices为空")
                 return None
         except Exception as e:
-            print(f"❌ 解析普通生成响应时出错：{str(e)}")
+            logger.error("❌ 解析普通生成响应时出错：%s", e)
             import traceback
             traceback.print_exc()
             return None
 
+# -------------------------- 批量并发生成 --------------------------
+def estimate_tokens(messages, max_tokens=DEFAULT_MAX_TOKENS):
+    """粗略估计一次生成消耗的token数（中文约1字1token，再加上输出上限）"""
+    return sum(len(m.get("content") or "") for m in messages) + max_tokens
+
+
+def generate_batch(message_batches, concurrency=None, max_tokens=DEFAULT_MAX_TOKENS, stop_when=None):
+    """
+    并发生成一批内容（支持工具调用），同时受并发数和每分钟token预算约束
+    :param message_batches: 每条内容各自的对话消息列表
+    :param concurrency: 同时生成的条数，默认 GENERATION_CONCURRENCY
+    :param max_tokens: 每条内容的输出token上限
+    :param stop_when: 流式生成时判断结构完整、提前结束的函数
+    :return: 与输入顺序一致的内容列表，失败的位置为None
+    """
+    def worker(messages):
+        # 预约token预算，不够时等到预算恢复
+        time.sleep(_token_budget.reserve("generation", estimate_tokens(messages, max_tokens)))
+        try:
+            # 工具会查询数据库，每个线程需要自己的应用上下文
+            with app.app_context():
+                return generate_content_with_tools(messages, max_tokens=max_tokens, stop_when=stop_when)
+        except Exception as e:
+            logger.error("❌ 并发生成失败：%s", e)
+            return None
+
+    if not message_batches:
+        return []
+    workers = min(concurrency or GENERATION_CONCURRENCY, len(message_batches))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="content-gen") as pool:
+        return list(pool.map(worker, message_batches))
+
+
 # -------------------------- 自动发帖 --------------------------
-def generate_new_posts():
+def build_post_messages(author, board_name, theme):
+    return [
+        {
+            "role": "system",
+            "content": f"你是复古论坛的用户「{author}」，在「{board_name}」板块发帖。你可以使用提供的工具来获取虚构的地点信息。生成的内容应尽量与现实世界保持距离，避免提及真实的地点、人名、事件或品牌。"
+        },
+        {
+            "role": "user",
+            "content": f'''请发一个关于「{theme}」的帖子，要求：
+1. 标题：简洁明了，含「{theme}」关键词，不超过20字；
+2. 内容：口语化，3-5句话，像真实用户提问/分享，贴合「{author}」昵称风格；
+3. 风格：接地气、有生活气息，符合现实，但内容中提到的地名与现实无关；
+4. 如果主题与地点相关（如租房、通勤、美食），请使用工具获取虚构地点信息，使帖子内容更有想象力；
+5. 输出格式：先标题（换行）再内容，无多余字符。'''
+        }
+    ]
+
+
+def generate_new_posts(count=NEW_POSTS_PER_RUN, concurrency=None):
+    """
+    并发生成一批新帖，全部生成完后一次提交（ORM批量插入，搜索索引等写入事件照常触发）
+    生成失败的名额在下一轮补上，最多 MAX_GENERATION_ROUNDS 轮
+    """
     db = next(get_db())
     try:
-        # 查询所有板块
         boards = db.query(Board).all()
         if not boards:
-            print("⚠️  无可用板块，跳过发帖")
+            logger.warning("⚠️  无可用板块，跳过发帖")
             return
         
-        generated_count = 0
-        while generated_count < NEW_POSTS_PER_RUN:
-            board = random.choice(boards)
-            board_name = board.name
-            theme = random.choice(BOARD_THEME_MAP.get(board_name, ["日常讨论"]))
-            author = select_author()
-            
-            # 生成帖子内容（支持工具调用）
-            messages = [
-                {
-                    "role": "system",
-                    "content": f"你是复古论坛的用户「{author}」，在「{board_name}」板块发帖。你可以使用提供的工具来获取虚构的地点信息。生成的内容应尽量与现实世界保持距离，避免提及真实的地点、人名、事件或品牌。"
-                },
-                {
-                    "role": "user",
-                    "content": f'''请发一个关于「{theme}」的帖子，要求：
-1. 标题：简洁明了，含「{theme}」关键词，不超过20字；
-2. 内容：口语化，3-5句话，像真实用户提问/分享，贴合「{author}」昵称风格；
-3. 风格：接地气、有生活气息，符合现实，但内容中提到的地名与现实无关；
-4. 如果主题与地点相关（如租房、通勤、美食），请使用工具获取虚构地点信息，使帖子内容更有想象力；
-5. 输出格式：先标题（换行）再内容，无多余字符。'''
-                }
-            ]
-            
-            content = generate_content_with_tools(messages)
-            if not content:
-                print("⚠️  generate_content_with_tools返回None")
-                continue
-            
-            print(f"📥 从API获取到的完整内容：{repr(content)}")
-            
-            # 拆分标题和内容
-            parts = [p.strip() for p in content.split("\n") if p.strip()]
-            print(f"✂️  内容拆分为：{parts}")
+        new_posts = []
+        for round_no in range(MAX_GENERATION_ROUNDS):
+            remaining = count - len(new_posts)
+            if remaining <= 0:
+                break
             
-            if len(parts) < 2:
-                print(f"⚠️  帖子格式错误（{author}）：内容行数不足2行")
-                continue
-            title, post_content = parts[0], "\n".join(parts[1:])
+            # 先在主线程规划好本轮每个帖子的板块、主题和作者
+            tasks = []
+            for _ in range(remaining):
+                board = random.choice(boards)
+                theme = random.choice(BOARD_THEME_MAP.get(board.name, ["日常讨论"]))
+                author = select_author()
+                tasks.append((board, author, build_post_messages(author, board.name, theme)))
             
-            print(f"📝 提取的标题：{repr(title)}")
-            print(f"📝 提取的内容：{repr(post_content)}")
+            logger.info("🚀 第%s轮：并发生成%s个帖子", round_no + 1, len(tasks))
+            contents = generate_batch([messages for _, _, messages in tasks], concurrency,
+                                      max_tokens=TOKEN_BUDGETS["post"],
+                                      stop_when=sentence_cutoff(POST_MAX_SENTENCES, header_lines=1))
             
-            # 新增帖子到数据库
-            print(f"💾 准备保存到数据库：标题={title[:20]}..., 作者={author}, 板块ID={board.id}")
-            new_post = Post(
-                title=title,
-                content=post_content,
-                author=author,
-                board_id=board.id,
-                create_time=datetime.utcnow()
-            )
-            db.add(new_post)
-            db.commit()
-            print(f"✅ 新增帖子：[{board_name}] {title}（{author}）")
-            generated_count += 1
-            time.sleep(1)
+            for (board, author, _), content in zip(tasks, contents):
+                if not content:
+                    logger.warning("⚠️  generate_content_with_tools返回None")
+                    continue
+                content = cut_at_sentences(content, POST_MAX_SENTENCES, header_lines=1) or content
+                
+                # 拆分标题和内容
+                parts = [p.strip() for p in content.split("\n") if p.strip()]
+                if len(parts) < 2:
+                    logger.warning("⚠️  帖子格式错误（%s）：内容行数不足2行", author)
+                    continue
+                title, post_content = parts[0], "\n".join(parts[1:])
+                logger.info("📝 [%s] %s（%s）", board.name, title, author)
+                new_posts.append(Post(
+                    title=title,
+                    content=post_content,
+                    author=author,
+                    board_id=board.id,
+                    create_time=datetime.utcnow()
+                ))
+        
+        if not new_posts:
+            logger.warning("⚠️  本次没有生成任何帖子")
+            return
+        # 一次提交所有新帖
+        db.add_all(new_posts)
+        db.commit()
+        logger.info("✅ 新增帖子%s个", len(new_posts))
     except Exception as e:
         db.rollback()
-        print(f"❌ 发帖失败：{str(e)}")
+        logger.error("❌ 发帖失败：%s", e)
     finally:
         db.close()
 
 # -------------------------- 自动回复 --------------------------
-def generate_replies():
+def build_reply_messages(author, post):
+    return [
+        {
+            "role": "system",
+            "content": f"你是复古论坛的用户「{author}」，正在回复一个帖子。你可以使用提供的工具来获取虚构的地点信息。生成的内容应尽量与现实世界保持距离，避免提及真实的地点、人名、事件或品牌。"
+        },
+        {
+            "role": "user",
+            "content": f'''请回复以下帖子：
+标题：{post.title}
+内容：{post.content}
+发帖人：{post.author}
+要求：
+1. 回复内容必须与帖子主题强相关
+2. 口语化表达，1-3句话即可
+3. 贴合「{author}」的昵称风格
+4. 如果合适，可以使用工具获取虚构信息使回复更丰富
+5. 回复内容必须是虚构的，不与现实对应
+6. 只返回回复内容，不要包含任何额外格式或说明'''}
+    ]
+
+
+def generate_replies(count=REPLIES_PER_RUN, concurrency=None):
+    """
+    为近期帖子并发生成一批回复，全部生成完后一次提交
+    生成失败的名额顺延给后面的帖子，与原先逐条生成的行为一致
+    """
     db = next(get_db())
     try:
         # 查询24小时内的帖子
@@ -524,75 +643,51 @@ def generate_replies():
         ).order_by(Post.create_time.desc()).all()
         
         if not recent_posts:
-            print("⚠️  无近期帖子，跳过回复")
+            logger.warning("⚠️  无近期帖子，跳过回复")
             return
         
-        replied_count = 0
         random.shuffle(recent_posts)
-        for post in recent_posts:
-            if replied_count >= REPLIES_PER_RUN:
-                break
+        signatures = ["", "专注此事10年", "纯属个人经验", "欢迎交流～", "亲测有效！", "踩过坑分享"]
+        new_replies = []
+        while len(new_replies) < count and recent_posts:
+            # 每轮取还差的数量个帖子，并发生成回复
+            batch, recent_posts = recent_posts[:count - len(new_replies)], recent_posts[count - len(new_replies):]
+            tasks = []
+            for post in batch:
+                author = select_author(exclude_author=post.author)
+                tasks.append((post, author, build_reply_messages(author, post)))
             
-            author = select_author(exclude_author=post.author)
+            logger.info("🚀 并发生成%s条回复", len(tasks))
+            contents = generate_batch([messages for _, _, messages in tasks], concurrency,
+                                      max_tokens=TOKEN_BUDGETS["reply"],
+                                      stop_when=sentence_cutoff(REPLY_MAX_SENTENCES))
             
-            # 生成回复内容（支持工具调用）
-            messages = [
-                {
-                    "role": "system",
-                    "content": f"你是复古论坛的用户「{author}」，正在回复一个帖子。你可以使用提供的工具来获取虚构的地点信息。生成的内容应尽量与现实世界保持距离，避免提及真实的地点、人名、事件或品牌。"
-                },
-                {
-                    "role": "user",
-                    "content": f'''请回复以下帖子：
-标题：{post.title}
-内容：{post.content}
-发帖人：{post.author}
-要求：
-1. 回复内容必须与帖子主题强相关
-2. 口语化表达，1-3句话即可
-3. 贴合「{author}」的昵称风格
-4. 如果合适，可以使用工具获取虚构信息使回复更丰富
-5. 回复内容必须是虚构的，不与现实对应
-6. 只返回回复内容，不要包含任何额外格式或说明'''}
-            ]
-            
-            reply_content = generate_content_with_tools(messages)
-            if not reply_content:
-                print("⚠️  generate_content_with_tools返回None")
-                continue
-            
-            print(f"📥 从API获取到的完整回复：{repr(reply_content)}")
-            
-            # 简单清理：去除首尾空白
-            final_content = reply_content.strip()
-            
-            # 如果清理后内容为空，跳过
-            if not final_content:
-                print(f"⚠️  清理后回复内容为空，跳过")
-                continue
-            
-            print(f"✨ 清理后的最终回复内容：{repr(final_content)}")
-            
-            signatures = ["", "专注此事10年", "纯属个人经验", "欢迎交流～", "亲测有效！", "踩过坑分享"]
-            signature = random.choice(signatures)
-            
-            # 新增回复到数据库
-            print(f"💾 准备保存回复到数据库：内容={final_content[:20]}..., 作者={author}, 帖子ID={post.id}")
-            new_reply = Reply(
-                content=final_content,
-                author=author,
-                signature=signature,
-                post_id=post.id,
-                create_time=datetime.utcnow()
-            )
-            db.add(new_reply)
-            db.commit()
-            print(f"✅ 新增回复：《{post.title}》（{author}）")
-            replied_count += 1
-            time.sleep(1)
+            for (post, author, _), reply_content in zip(tasks, contents):
+                # 简单清理：去除首尾空白（超出句数的部分截掉），为空则跳过
+                final_content = (reply_content or "").strip()
+                final_content = cut_at_sentences(final_content, REPLY_MAX_SENTENCES) or final_content
+                if not final_content:
+                    logger.warning("⚠️  《%s》的回复生成失败或为空，跳过", post.title)
+                    continue
+                logger.info("✨ 《%s》（%s）：%s", post.title, author, final_content[:30])
+                new_replies.append(Reply(
+                    content=final_content,
+                    author=author,
+                    signature=random.choice(signatures),
+                    post_id=post.id,
+                    create_time=datetime.utcnow()
+                ))
+        
+        if not new_replies:
+            logger.warning("⚠️  本次没有生成任何回复")
+            return
+        # 一次提交所有新回复（回帖计数由写入事件维护）
+        db.add_all(new_replies)
+        db.commit()
+        logger.info("✅ 新增回复%s条", len(new_replies))
     except Exception as e:
         db.rollback()
-        print(f"❌ 回复失败：{str(e)}")
+        logger.error("❌ 回复失败：%s", e)
         import traceback
         traceback.print_exc()
     finally:
@@ -609,20 +704,22 @@ def main():
         if not test_db_connection():
             return
         
-        print("🚀 启动AI内容生成器（支持工具调用）")
-        print("可用工具：")
+        logger.info("🚀 启动AI内容生成器（支持工具调用）")
+        logger.info("可用工具：")
         for tool in tool_registry.list_tools():
-            print(f"  - {tool.name()}: {tool.description()}")
+            logger.info("  - %s: %s", tool.name(), tool.description())
+        # 预先计算公司信息、地图等几乎不变的工具结果
+        tool_registry.warm_up()
         
         # 执行发帖（暂时注释掉，只测试回帖）
-        print("\n📝 开始生成新帖子...")
+        logger.info("📝 开始生成新帖子...")
         generate_new_posts()  # 生成新帖子
         
         # 执行回帖
         # print("\n💬 开始生成回复...")
         # generate_replies()    # 生成回复
         
-        print("\n✅ 已完成回帖，程序结束")
+        logger.info("✅ 已完成回帖，程序结束")
 
 # # 直接执行主函数
 # if __name__ == "__main__":
@@ -0,0 +1,253 @@
+"""
+调度AI的持久化任务队列（基于SQLite，无需外部服务）
+- /api/ai/schedule 只负责入队，立即返回任务ID，HTTP worker不再被整个计划占住
+- worker进程循环领取任务：一条 UPDATE ... RETURNING 原子地把最早的待执行任务
+  （或租约已过期的执行中任务）标记为running，多个worker不会领到同一个任务
+- 每完成一个步骤写一行检查点（ai_job_step），与该步骤写入的帖子/回复/网盘记录在同一个事务里提交，
+  任务失败或worker崩溃后重新执行时，已完成步骤的结果直接从检查点恢复到资源池，从中断处继续，不会重复发帖
+- 执行期间后台线程定期续租；worker崩溃后租约过期，任务会被其他worker接手
+- 执行失败的任务按指数退避（llm_client.backoff_delay）推迟到 available_at 之后才能再次领取，
+  上游持续限流或5xx时不会被立即重新领取、在短时间内耗尽重试次数
+- 每个任务有独立的执行上下文（资源池），一个worker进程可以用多个线程同时执行多个任务
+
+启动worker：python ai_job_queue.py --workers 2 --concurrency 4
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, inspect as sa_inspect, or_, select, update
+from sqlalchemy.schema import CreateColumn
+
+from forum.models import db, AIJob, AIJobStep
+from llm_client import backoff_delay
+
+# 租约时长（秒）：worker超过这个时间没有续租，任务会被重新领取
+LEASE_SECONDS = 300
+# 续租间隔（秒）
+HEARTBEAT_INTERVAL = 60
+# 没有任务时的轮询间隔（秒）
+POLL_INTERVAL = 2
+# 任务最多执行几次（失败后自动从检查点恢复重试）
+MAX_JOB_ATTEMPTS = 3
+# 每个worker进程同时执行的任务数
+WORKER_CONCURRENCY = 4
+
+
+def ensure_ai_job_columns(session):
+    """启动时检查（旧数据库升级）：为ai_job表补建 available_at 列"""
+    connection = session.connection()
+    table = AIJob.__table__
+    existing = {column["name"] for column in sa_inspect(connection).get_columns(table.name)}
+    if "available_at" not in existing:
+        ddl = CreateColumn(table.c.available_at).compile(dialect=connection.dialect)
+        connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+    session.commit()
+
+
+# -------------------------- 入队与查询（Web进程使用） --------------------------
+def enqueue_job(task, parameters=None):
+    """
+    提交任务
+    :param task: 任务描述
+    :param parameters: 合并到每个步骤的参数
+    :return: AIJob
+    """
+    job = AIJob(job_id=uuid.uuid4().hex, task=task, parameters=parameters or {})
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def get_job(job_id):
+    """按对外任务ID查询任务，不存在返回None"""
+    return AIJob.query.filter_by(job_id=job_id).first()
+
+
+def retry_job(job):
+    """
+    把失败的任务重新放回队列（保留检查点，从最后完成的步骤之后继续）
+    :return: 是否已重新入队
+    """
+    if job.status != 'error':
+        return False
+    job.status = 'pending'
+    job.attempts = 0
+    job.available_at = None
+    job.finish_time = None
+    db.session.commit()
+    return True
+
+
+# -------------------------- 领取与执行（worker进程使用） --------------------------
+def claim_job(worker_name):
+    """
+    原子地领取一个任务：最早的已到可领取时间的pending任务，或租约已过期的running任务
+    :return: AIJob，没有可领取的任务时返回None
+    """
+    now = datetime.utcnow()
+    table = AIJob.__table__
+    claimable = or_(
+        and_(table.c.status == 'pending', or_(table.c.available_at.is_(None), table.c.available_at <= now)),
+        and_(table.c.status == 'running', table.c.lease_until < now)
+    )
+    candidate = select(table.c.id).where(claimable).order_by(table.c.id).limit(1).scalar_subquery()
+    stmt = update(table).where(table.c.id == candidate, claimable).values(
+        status='running',
+        worker=worker_name,
+        lease_until=now + timedelta(seconds=LEASE_SECONDS),
+        attempts=table.c.attempts + 1,
+        update_time=now
+    ).returning(table.c.id)
+    job_pk = db.session.execute(stmt).scalar()
+    db.session.commit()
+    return db.session.get(AIJob, job_pk) if job_pk else None
+
+
+def _renew_lease(engine, job_pk, worker_name, stop_event):
+    """后台续租线程：任务还在执行就定期延长租约"""
+    table = AIJob.__table__
+    while not stop_event.wait(HEARTBEAT_INTERVAL):
+        try:
+            with engine.begin() as connection:
+                connection.execute(update(table).where(
+                    table.c.id == job_pk, table.c.worker == worker_name
+                ).values(lease_until=datetime.utcnow() + timedelta(seconds=LEASE_SECONDS)))
+        except Exception as e:
+            print(f"❌ 任务续租失败: {str(e)}")
+
+
+def run_job(job, worker_name, scheduler=None):
+    """
+    执行一个已领取的任务：首次执行时生成并保存计划，之后从检查点恢复已完成的步骤，只执行剩下的步骤
+    :param scheduler: 调度器，默认用进程内共享的全局调度器
+    :return: 执行后的任务状态
+    """
+    from ai_scheduler import ExecutionContext, aI_scheduler
+
+    job_pk = job.id
+    scheduler = scheduler or aI_scheduler
+    stop_event = threading.Event()
+    heartbeat = threading.Thread(target=_renew_lease, args=(db.engine, job_pk, worker_name, stop_event),
+                                 name=f"ai-job-lease-{job_pk}", daemon=True)
+    heartbeat.start()
+    print(f"🔄 [{worker_name}] 开始执行任务 {job.job_id}（第{job.attempts}次）")
+    try:
+        if job.plan is None:
+            plan = scheduler.generate_execution_plan(job.task)
+            if job.parameters:
+                for step in plan.get('steps', []):
+                    step.setdefault('params', {}).update(job.parameters)
+            job.plan = plan
+            db.session.commit()
+
+        completed = {step.step_id: step.result for step in job.steps}
+        if completed:
+            print(f"⏩ 从检查点恢复 {len(completed)} 个已完成步骤")
+
+        def checkpoint(session, step_id, result):
+            # 在执行器的会话中加入检查点，随步骤数据一起提交
+            session.add(AIJobStep(job_id=job_pk, step_id=step_id, result=result))
+
+        def record_timing(step_id, result, timing):
+            step = AIJobStep.query.filter_by(job_id=job_pk, step_id=step_id).first()
+            if step is None:
+                # 执行器没有写检查点（不写数据库的步骤），在这里补上
+                db.session.add(AIJobStep(job_id=job_pk, step_id=step_id, result=result, timing=timing))
+            else:
+                step.timing = timing
+            db.session.commit()
+
+        results = scheduler.execute_plan(job.plan, completed=completed, on_step_done=record_timing,
+                                         context=ExecutionContext(job.job_id, checkpoint=checkpoint))
+        job = db.session.get(AIJob, job_pk)
+        job.status = 'success'
+        job.result = results
+        job.error = None
+        job.finish_time = datetime.utcnow()
+        print(f"✅ 任务 {job.job_id} 执行成功")
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(AIJob, job_pk)
+        job.error = str(e)
+        if job.attempts < MAX_JOB_ATTEMPTS:
+            # 退避后再允许领取，上游持续出错时不会被立即重新领取
+            delay = backoff_delay(job.attempts)
+            job.status = 'pending'
+            job.available_at = datetime.utcnow() + timedelta(seconds=delay)
+            print(f"⚠️  任务 {job.job_id} 执行失败，{delay:.1f}秒后从检查点重试: {str(e)}")
+        else:
+            job.status = 'error'
+            job.finish_time = datetime.utcnow()
+            print(f"❌ 任务 {job.job_id} 执行失败（已达最大次数）: {str(e)}")
+    finally:
+        stop_event.set()
+    job.lease_until = None
+    db.session.commit()
+    return job.status
+
+
+def _claim_loop(app, worker_name, once):
+    """单个执行线程：在自己的应用上下文（独立数据库会话）里循环领取并执行任务"""
+    with app.app_context():
+        while True:
+            job = claim_job(worker_name)
+            if job is None:
+                if once:
+                    return
+                time.sleep(POLL_INTERVAL)
+                continue
+            run_job(job, worker_name)
+
+
+def worker_loop(worker_name=None, once=False, concurrency=1):
+    """
+    worker主循环：领取任务并执行，没有任务时轮询等待
+    :param once: True时队列为空就退出（测试/手动处理积压时使用）
+    :param concurrency: 同时执行的任务数（线程数），各任务共享进程内的调度器
+    """
+    from app import app
+    from ai_tools import tool_registry
+
+    worker_name = worker_name or f"{socket.gethostname()}-{os.getpid()}"
+    print(f"🚀 AI任务worker已启动：{worker_name}（并发 {concurrency}）")
+    with app.app_context():
+        tool_registry.warm_up()
+    if concurrency <= 1:
+        _claim_loop(app, worker_name, once)
+        return
+    threads = [threading.Thread(target=_claim_loop, args=(app, f"{worker_name}-{i}", once),
+                                name=f"ai-job-{i}", daemon=True)
+               for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="调度AI任务队列worker")
+    parser.add_argument("--workers", type=int, default=1, help="worker进程数")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY, help="每个进程同时执行的任务数")
+    parser.add_argument("--once", action="store_true", help="处理完队列中的任务后退出")
+    args = parser.parse_args()
+
+    if args.workers <= 1:
+        worker_loop(once=args.once, concurrency=args.concurrency)
+        return
+    processes = [multiprocessing.Process(target=worker_loop, kwargs={"once": args.once, "concurrency": args.concurrency},
+                                         name=f"ai-worker-{i}")
+                 for i in range(args.workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,13 @@
 from slugify import slugify
 import bleach
 import uuid
-import requests
 import json
 import os
 from datetime import datetime
 from onlineworld_backend.forum.models import DynamicPage
 from sqlalchemy.exc import SQLAlchemyError
 from .image_generator import generate_image
+from .llm_client import llm_client
 
 class AIPageGenerator:
     def __init__(self, db, app_config):
@@ -53,32 +53,14 @@ class AIPageGenerator:
         :param timeout: 请求超时时间
         :return: API响应内容
         """
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.silicon_flow_api_key}"
-        }
-        
-        # 确保messages是列表格式
-        if isinstance(messages, str):
-            messages = [{"role": "user", "content": messages}]
-        
-        data = {
-            "model": self.ai_model_name,
-            "messages": messages,
-            "temperature": temperature,
-            "max_tokens": 2000
-        }
-        
         try:
-            response = requests.post(self.silicon_flow_api_url, headers=headers, json=data, timeout=timeout)
-            response.raise_for_status()
-            result = response.json()
-            
-            if "choices" in result and result["choices"]:
-                message = result["choices"][0]["message"]
-                content = message.get("content", "").strip() or message.get("reasoning_content", "").strip()
-                return content
-            return None
+            # 共享连接池客户端，网络错误/限流/5xx自动退避重试
+            content = llm_client.chat_text(
+                messages, temperature=temperature, max_tokens=2000, timeout=timeout,
+                api_url=self.silicon_flow_api_url, api_key=self.silicon_flow_api_key, model=self.ai_model_name,
+                cache=True  # 同一页面的提示词相同，复用已生成的页面
+            )
+            return content or None
         except Exception as e:
             print(f"API调用失败：{str(e)}")
             return None
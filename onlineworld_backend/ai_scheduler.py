@@ -1,63 +1,141 @@
 import json
+import re
 import time
 import random
 import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
 from abc import ABC, abstractmethod
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# 配置日志（按模块设置级别，后台队列输出，见 logging_setup.py）
+from logging_setup import setup_logging
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # 导入现有功能
-from ai_content_generator import call_siliconflow_api, generate_content_with_tools, select_author
+from ai_content_generator import (call_siliconflow_api, generate_content_with_tools, select_author,
+                                  cut_at_sentences, sentence_cutoff, TOKEN_BUDGETS,
+                                  POST_MAX_SENTENCES, REPLY_MAX_SENTENCES)
 from forum.disk_file_generator import DiskFileGenerator
 from forum.models import Post, Reply, Board, db
 from app import app
 
+# 单个计划中同时执行的最大步骤数
+MAX_PARALLEL_STEPS = 4
+# 调度器共享的步骤线程数（所有并发任务合计）
+MAX_SCHEDULER_THREADS = 16
+# 参数值形如 step_1 时视为引用了该步骤的结果
+STEP_REF_PATTERN = re.compile(r"^step_\w+$")
+
+def step_dependencies(step, step_ids):
+    """
+    找出步骤依赖的其他步骤：params.use_resources 里列出的，以及取值为 step_* 的参数（如 reply 的 post_id）
+    :param step_ids: 计划中所有步骤ID，引用不存在的步骤时忽略
+    """
+    params = step.get('params') or {}
+    refs = list(params.get('use_resources') or [])
+    refs += [value for key, value in params.items()
+             if key != 'use_resources' and isinstance(value, str) and STEP_REF_PATTERN.match(value)]
+    return {ref for ref in refs if ref in step_ids and ref != step['id']}
+
+def build_step_graph(steps):
+    """
+    构建步骤依赖图
+    :return: {步骤ID: 依赖的步骤ID集合}
+    :raises ValueError: 步骤ID重复或存在循环依赖
+    """
+    for index, step in enumerate(steps):
+        step.setdefault('id', f"auto_step_{index + 1}")
+    step_ids = [step['id'] for step in steps]
+    if len(set(step_ids)) != len(step_ids):
+        raise ValueError("执行计划中存在重复的步骤ID")
+    graph = {step['id']: step_dependencies(step, set(step_ids)) for step in steps}
+
+    # 拓扑排序检查循环依赖
+    remaining = {step_id: set(deps) for step_id, deps in graph.items()}
+    while remaining:
+        ready = [step_id for step_id, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"执行计划存在循环依赖：{sorted(remaining)}")
+        for step_id in ready:
+            del remaining[step_id]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return graph
+
 class ResourcePool:
-    """资源池，用于存储中间生成结果"""
+    """资源池，用于存储一个任务的中间生成结果（线程安全，同一任务的并行步骤共用）"""
     
     def __init__(self):
         self.resources = {}
+        self._lock = threading.Lock()
     
     def add_resource(self, step_id, resource_data):
         """添加资源到资源池"""
-        self.resources[step_id] = resource_data
-        logger.info(f"资源添加成功：{step_id} - {resource_data}")
+        with self._lock:
+            self.resources[step_id] = resource_data
+        logger.info("资源添加成功：%s - %s", step_id, resource_data)
     
     def get_resource(self, step_id):
         """从资源池获取资源"""
-        return self.resources.get(step_id)
+        with self._lock:
+            return self.resources.get(step_id)
     
     def get_all_resources(self):
-        """获取所有资源"""
-        return self.resources
+        """获取所有资源（副本）"""
+        with self._lock:
+            return dict(self.resources)
     
     def clear(self):
         """清空资源池"""
-        self.resources.clear()
+        with self._lock:
+            self.resources.clear()
+
+class ExecutionContext:
+    """
+    单个任务的执行上下文：每次执行计划都新建一个，任务之间的资源互不可见，
+    多个任务可以同时在同一个调度器上执行，不会互相覆盖 step_1 之类的资源
+    :param task_id: 任务标识（用于日志区分并发任务），默认随机生成
+    :param checkpoint: 写检查点的函数 checkpoint(会话, 步骤ID, 结果)，把检查点记录加入会话（不提交），
+        由执行器和步骤产生的数据（帖子、回复、网盘记录）在同一个事务里提交；None 表示不写检查点
+    """
+    
+    def __init__(self, task_id=None, checkpoint=None):
+        self.task_id = task_id or uuid.uuid4().hex[:8]
+        self.resource_pool = ResourcePool()
+        self.checkpoint = checkpoint
+    
+    def commit_step(self, session, step_id, result):
+        """提交步骤产生的数据，连同该步骤的检查点（同一事务：要么都写入，要么都没有，重试时不会重复发帖）"""
+        if self.checkpoint:
+            self.checkpoint(session, step_id, result)
+        session.commit()
 
 class StepExecutor(ABC):
-    """步骤执行器抽象类"""
+    """
+    步骤执行器抽象类
+    执行器在所有任务间共享，不能在实例上保存任务状态：中间结果只通过传入的 resource_pool 读写
+    写数据库的执行器用 context.commit_step 提交，检查点与步骤数据在同一个事务里
+    """
     
     @abstractmethod
-    def execute(self, step, resource_pool):
+    def execute(self, step, resource_pool, context=None):
         """执行步骤"""
         pass
 
 class DiskFileExecutor(StepExecutor):
     """网盘文件执行器"""
     
-    def execute(self, step, resource_pool):
+    def execute(self, step, resource_pool, context=None):
         """执行网盘文件生成"""
         try:
             params = step.get('params', {})
             content = params.get('content', '')
-            file_name = params.get('file_name', f"ai-generated-{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+            # 默认文件名带随机后缀：同一秒内并行执行的多个网盘步骤不会互相覆盖文件
+            file_name = params.get('file_name') or \
+                f"ai-generated-{datetime.now().strftime('%Y%m%d_%H%M%S')}-{uuid.uuid4().hex[:8]}"
             file_extension = params.get('file_extension', 'txt')
             
             # 使用现有 DiskFileGenerator
@@ -66,19 +144,21 @@ class DiskFileExecutor(StepExecutor):
                 result = disk_generator.generate_disk_file(
                     content=content,
                     file_name=file_name,
-                    file_extension=file_extension
+                    file_extension=file_extension,
+                    commit=False
                 )
+                (context or ExecutionContext()).commit_step(db.session, step['id'], result)
             
-            logger.info(f"网盘文件生成成功：{result['file_name']}")
+            logger.info("网盘文件生成成功：%s", result['file_name'])
             return result
         except Exception as e:
-            logger.error(f"网盘文件生成失败：{str(e)}")
+            logger.error("网盘文件生成失败：%s", e)
             raise
 
 class PostExecutor(StepExecutor):
     """帖子执行器"""
     
-    def execute(self, step, resource_pool):
+    def execute(self, step, resource_pool, context=None):
         """执行帖子生成"""
         try:
             params = step.get('params', {})
@@ -119,8 +199,10 @@ class PostExecutor(StepExecutor):
                 }
             ]
             
-            # 使用现有 generate_content_with_tools 函数
-            content = generate_content_with_tools(messages)
+            # 使用现有 generate_content_with_tools 函数（流式生成，正文写满后提前结束）
+            content = generate_content_with_tools(messages, max_tokens=TOKEN_BUDGETS["post"],
+                                                  stop_when=sentence_cutoff(POST_MAX_SENTENCES, header_lines=1))
+            content = cut_at_sentences(content, POST_MAX_SENTENCES, header_lines=1) or content
             
             # 拆分标题和内容
             parts = [p.strip() for p in content.split('\n') if p.strip()]
@@ -138,27 +220,29 @@ class PostExecutor(StepExecutor):
                     create_time=datetime.utcnow()
                 )
                 db.session.add(new_post)
-                db.session.commit()
-            
-            result = {
-                "id": new_post.id,
-                "title": new_post.title,
-                "content": new_post.content,
-                "author": new_post.author,
-                "board_id": new_post.board_id,
-                "create_time": new_post.create_time.strftime("%Y-%m-%d %H:%M:%S")
-            }
+                db.session.flush()
+                
+                # 在应用上下文内取出字段：退出上下文后会话关闭，提交后过期的对象无法再刷新
+                result = {
+                    "id": new_post.id,
+                    "title": new_post.title,
+                    "content": new_post.content,
+                    "author": new_post.author,
+                    "board_id": new_post.board_id,
+                    "create_time": new_post.create_time.strftime("%Y-%m-%d %H:%M:%S")
+                }
+                (context or ExecutionContext()).commit_step(db.session, step['id'], result)
             
-            logger.info(f"帖子生成成功：{result['title']}")
+            logger.info("帖子生成成功：%s", result['title'])
             return result
         except Exception as e:
-            logger.error(f"帖子生成失败：{str(e)}")
+            logger.error("帖子生成失败：%s", e)
             raise
 
 class ReplyExecutor(StepExecutor):
     """回复执行器"""
     
-    def execute(self, step, resource_pool):
+    def execute(self, step, resource_pool, context=None):
         """执行回复生成"""
         try:
             params = step.get('params', {})
@@ -202,9 +286,10 @@ class ReplyExecutor(StepExecutor):
                 }
             ]
             
-            # 使用现有 generate_content_with_tools 函数
-            reply_content = generate_content_with_tools(messages)
-            final_content = reply_content.strip()
+            # 使用现有 generate_content_with_tools 函数（流式生成，写满句数后提前结束）
+            reply_content = generate_content_with_tools(messages, max_tokens=TOKEN_BUDGETS["reply"],
+                                                        stop_when=sentence_cutoff(REPLY_MAX_SENTENCES))
+            final_content = cut_at_sentences(reply_content.strip(), REPLY_MAX_SENTENCES) or reply_content.strip()
             
             if not final_content:
                 raise ValueError("回复内容为空")
@@ -219,37 +304,47 @@ class ReplyExecutor(StepExecutor):
                     create_time=datetime.utcnow()
                 )
                 db.session.add(new_reply)
-                db.session.commit()
-            
-            result = {
-                "id": new_reply.id,
-                "content": new_reply.content,
-                "author": new_reply.author,
-                "post_id": new_reply.post_id,
-                "create_time": new_reply.create_time.strftime("%Y-%m-%d %H:%M:%S")
-            }
+                db.session.flush()
+                
+                result = {
+                    "id": new_reply.id,
+                    "content": new_reply.content,
+                    "author": new_reply.author,
+                    "post_id": new_reply.post_id,
+                    "create_time": new_reply.create_time.strftime("%Y-%m-%d %H:%M:%S")
+                }
+                (context or ExecutionContext()).commit_step(db.session, step['id'], result)
             
-            logger.info(f"回复生成成功")
+            logger.info("回复生成成功")
             return result
         except Exception as e:
-            logger.error(f"回复生成失败：{str(e)}")
+            logger.error("回复生成失败：%s", e)
             raise
 
 class AIScheduler:
-    """AI调度器"""
+    """
+    AI调度器（可被多个线程同时调用）
+    每次执行计划使用独立的 ExecutionContext；执行器无状态，所有任务共享；
+    各任务的步骤提交到同一个线程池，总线程数受 max_threads 约束
+    :param max_threads: 共享步骤线程池大小
+    """
     
-    def __init__(self):
-        self.resource_pool = ResourcePool()
+    def __init__(self, max_threads=MAX_SCHEDULER_THREADS):
         self.executors = {
             'disk_file': DiskFileExecutor(),
             'post': PostExecutor(),
             'reply': ReplyExecutor()
         }
+        self._step_pool = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="plan-step")
     
     def register_executor(self, step_type, executor):
-        """注册新的执行器"""
-        self.executors[step_type] = executor
-        logger.info(f"执行器注册成功：{step_type}")
+        """注册新的执行器（替换字典而不是原地修改，正在执行的计划不受影响）"""
+        self.executors = {**self.executors, step_type: executor}
+        logger.info("执行器注册成功：%s", step_type)
+    
+    def close(self):
+        """关闭共享步骤线程池（等待在途步骤结束）"""
+        self._step_pool.shutdown(wait=True)
     
     def generate_execution_plan(self, task_description):
         """生成执行计划"""
@@ -291,7 +386,7 @@ class AIScheduler:
                 }
             ]
             
-            response = call_siliconflow_api(messages, temperature=0.7)
+            response = call_siliconflow_api(messages, temperature=0.7, cache=True)  # 同一任务描述的计划可以复用
             
             if response and "choices" in response:
                 content = response["choices"][0]["message"].get("content", "")
@@ -300,7 +395,7 @@ class AIScheduler:
                 json_match = re.search(r'\{[\s\S]*\}', content)
                 if json_match:
                     plan = json.loads(json_match.group(0))
-                    logger.info(f"执行计划生成成功：{plan}")
+                    logger.info("执行计划生成成功：%s", plan)
                     return plan
             
             # 默认计划
@@ -316,10 +411,10 @@ class AIScheduler:
                     }
                 ]
             }
-            logger.warning(f"使用默认执行计划：{default_plan}")
+            logger.warning("使用默认执行计划：%s", default_plan)
             return default_plan
         except Exception as e:
-            logger.error(f"执行计划生成失败：{str(e)}")
+            logger.error("执行计划生成失败：%s", e)
             # 返回默认计划
             return {
                 "steps": [
@@ -334,43 +429,111 @@ class AIScheduler:
                 ]
             }
     
-    def execute_plan(self, plan):
-        """执行计划"""
+    def _run_step(self, executor, step, context, plan_start):
+        """在工作线程中执行单个步骤，返回 (结果, 耗时信息, 异常)"""
+        start = time.monotonic()
+        result, error = None, None
+        try:
+            # 工作线程没有应用上下文，工具调用和数据库访问都需要
+            with app.app_context():
+                result = executor.execute(step, context.resource_pool, context)
+        except Exception as e:
+            error = e
+        timing = {
+            "type": step.get('type'),
+            "start": round(start - plan_start, 3),
+            "duration": round(time.monotonic() - start, 3),
+            "status": "error" if error else "success"
+        }
+        return result, timing, error
+
+    def execute_plan(self, plan, timings=None, max_workers=MAX_PARALLEL_STEPS, completed=None, on_step_done=None,
+                     context=None):
+        """
+        按依赖关系并行执行计划：依赖都完成的步骤立即提交到线程池，互不依赖的步骤并发执行，
+        总耗时约等于关键路径的耗时。任一步骤失败后不再启动新步骤，等在途步骤结束后抛出异常
+        :param timings: 传入字典时填充每个步骤的耗时 {步骤ID: {"type", "start", "duration", "status"}}
+        :param max_workers: 本计划同时执行的最大步骤数
+        :param completed: 已完成步骤的结果 {步骤ID: 结果}（从检查点恢复），这些步骤不再执行，结果直接放入资源池
+        :param on_step_done: 每个步骤成功后的回调 on_step_done(步骤ID, 结果, 耗时信息)，在调度线程中调用（用于记录耗时；
+            检查点由执行器通过 context.commit_step 与步骤数据一起提交）
+        :param context: 任务执行上下文，默认新建（资源只在本次执行内可见）
+        :return: {步骤ID: 结果}
+        """
+        context = context or ExecutionContext()
+        executors = self.executors
         try:
-            results = {}
             steps = plan.get('steps', [])
-            
-            for step in steps:
-                step_id = step.get('id')
-                step_type = step.get('type')
-                
-                logger.info(f"执行步骤：{step_id} ({step_type})")
-                
-                # 获取执行器
-                executor = self.executors.get(step_type)
-                if not executor:
-                    logger.error(f"未知的步骤类型：{step_type}")
-                    continue
-                
-                # 执行步骤
-                result = executor.execute(step, self.resource_pool)
-                
-                # 保存结果到资源池
-                if result:
-                    self.resource_pool.add_resource(step_id, result)
-                    results[step_id] = result
+            graph = build_step_graph(steps)
+            steps_by_id = {step['id']: step for step in steps}
+            timings = {} if timings is None else timings
+            results = {}
+            done = set()
+            for step_id, result in (completed or {}).items():
+                if step_id in graph:
+                    del graph[step_id]
+                    done.add(step_id)
+                    if result:
+                        context.resource_pool.add_resource(step_id, result)
+                        results[step_id] = result
+            running = {}  # {future: 步骤ID}
+            first_error = None
+            plan_start = time.monotonic()
+            
+            while graph or running:
+                # 提交所有依赖已满足的步骤（未知类型的步骤直接跳过，视为完成）
+                submitted = True
+                while submitted and first_error is None:
+                    submitted = False
+                    for step_id in [s for s, deps in graph.items() if deps <= done]:
+                        if len(running) >= max_workers:
+                            break
+                        del graph[step_id]
+                        step = steps_by_id[step_id]
+                        executor = executors.get(step.get('type'))
+                        if not executor:
+                            logger.error("[%s] 未知的步骤类型：%s", context.task_id, step.get('type'))
+                            timings[step_id] = {"type": step.get('type'), "status": "skipped"}
+                            done.add(step_id)
+                            submitted = True
+                            continue
+                        logger.info("[%s] 执行步骤：%s (%s)", context.task_id, step_id, step.get('type'))
+                        future = self._step_pool.submit(self._run_step, executor, step, context, plan_start)
+                        running[future] = step_id
+                if not running:
+                    break
                 
-                # 避免API调用过于频繁
-                time.sleep(1)
-            
-            logger.info(f"执行计划完成，共执行 {len(results)} 个步骤")
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    step_id = running.pop(future)
+                    result, timing, error = future.result()
+                    timings[step_id] = timing
+                    done.add(step_id)
+                    if error is not None:
+                        logger.error("[%s] 步骤 %s 执行失败：%s", context.task_id, step_id, error)
+                        first_error = first_error or error
+                        continue
+                    logger.info("[%s] 步骤 %s 完成，耗时 %ss", context.task_id, step_id, timing['duration'])
+                    # 保存结果到本任务的资源池
+                    if result:
+                        context.resource_pool.add_resource(step_id, result)
+                        results[step_id] = result
+                    if on_step_done:
+                        on_step_done(step_id, result, timing)
+            
+            if first_error is not None:
+                raise first_error
+            logger.info("[%s] 执行计划完成，共执行 %s 个步骤，总耗时 %.2fs", context.task_id, len(results), time.monotonic() - plan_start)
             return results
         except Exception as e:
-            logger.error(f"执行计划失败：{str(e)}")
+            logger.error("[%s] 执行计划失败：%s", context.task_id, e)
             raise
     
-    def run_task(self, task_description, parameters=None):
-        """运行任务"""
+    def run_task(self, task_description, parameters=None, task_id=None):
+        """
+        运行任务（生成计划并执行），可在多个线程中同时调用
+        :param task_id: 任务标识，用于日志区分
+        """
         try:
             # 生成执行计划
             plan = self.generate_execution_plan(task_description)
@@ -381,21 +544,22 @@ class AIScheduler:
                     step['params'].update(parameters)
             
             # 执行计划
-            results = self.execute_plan(plan)
-            
-            # 清空资源池
-            self.resource_pool.clear()
+            timings = {}
+            start = time.monotonic()
+            results = self.execute_plan(plan, timings=timings, context=ExecutionContext(task_id))
             
             return {
                 "status": "success",
-                "result": results
+                "result": results,
+                "timings": timings,
+                "elapsed": round(time.monotonic() - start, 3)
             }
         except Exception as e:
-            logger.error(f"任务运行失败：{str(e)}")
+            logger.error("任务运行失败：%s", e)
             return {
                 "status": "error",
                 "message": str(e)
             }
 
-# 创建全局调度器实例
+# 创建全局调度器实例（同一进程内的所有任务共享）
 aI_scheduler = AIScheduler()
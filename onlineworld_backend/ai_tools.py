@@ -1,6 +1,8 @@
 import json
+import inspect
 from abc import ABC, abstractmethod
 from forum.models import Post, Reply, Board, CompanyInfo, ProductCategory, Product, AIMapRegion, AIMapAIInfo, ShopCategory, ShopMerchant, ShopProduct
+from forum.response_cache import response_cache
 from sqlalchemy import or_
 import sys
 import os
@@ -24,8 +26,21 @@ except ImportError:
         app = None
         db = None
 
+# 工具结果缓存时间（秒）：依赖表有写入时缓存立即失效，TTL只是兜底（绕过ORM的写入、其他进程的写入）
+TOOL_CACHE_TTL = 300
+# 几乎不变的工具（公司信息、地图）的缓存时间
+STATIC_TOOL_CACHE_TTL = 24 * 3600
+
 class BaseTool(ABC):
-    """基础工具类，定义工具接口"""
+    """
+    基础工具类，定义工具接口
+    run() 在 execute() 外加一层结果缓存：缓存键 = 工具名 + 规范化参数（补齐默认值）+ 依赖表的写入版本号，
+    依赖表（cache_models）有ORM写入时版本号变化，旧结果自然失效
+    """
+    
+    # 结果依赖的模型，为空时不缓存
+    cache_models = ()
+    cache_ttl = TOOL_CACHE_TTL
     
     @abstractmethod
     def name(self):
@@ -46,6 +61,44 @@ class BaseTool(ABC):
     def execute(self, **kwargs):
         """执行工具逻辑"""
         pass
+    
+    def warm_queries(self):
+        """启动时预先计算的查询参数列表（几乎不变的工具覆盖此方法）"""
+        return []
+    
+    def canonical_args(self, kwargs):
+        """
+        规范化参数：补齐默认值后按参数名排序序列化，{"query_type": "places"} 与 {"query_type": "places", "limit": 10} 命中同一条缓存
+        :raises TypeError: 参数与 execute 的签名不匹配
+        """
+        bound = inspect.signature(self.execute).bind(**kwargs)
+        bound.apply_defaults()
+        return json.dumps(bound.arguments, ensure_ascii=False, sort_keys=True, default=str)
+    
+    def run(self, **kwargs):
+        """执行工具（带结果缓存），只缓存成功的结果"""
+        if not self.cache_models:
+            return self.execute(**kwargs)
+        # 参数不匹配时抛出TypeError，由调用方按参数错误处理
+        args_key = self.canonical_args(kwargs)
+        tables = sorted(model.__table__.name for model in self.cache_models)
+        try:
+            versions = ".".join(str(v) for v in response_cache.read_versions(tables, self.get_session()))
+            key = f"tool:{self.name()}:{versions}:{args_key}"
+            hit = response_cache.backend.get(key)
+        except Exception as e:
+            print(f"❌ 读取工具结果缓存失败: {str(e)}")
+            return self.execute(**kwargs)
+        if hit is not None:
+            return hit
+        
+        result = self.execute(**kwargs)
+        try:
+            if json.loads(result).get("success"):
+                response_cache.backend.set(key, result, self.cache_ttl)
+        except Exception as e:
+            print(f"❌ 写入工具结果缓存失败: {str(e)}")
+        return result
 
     def get_session(self):
         """获取数据库会话，兼容Flask应用上下文和原生SQLAlchemy方式"""
@@ -66,6 +119,8 @@ class BaseTool(ABC):
 class ForumInfoTool(BaseTool):
     """论坛信息获取工具"""
     
+    cache_models = (Post, Reply, Board)
+    
     def name(self):
         return "get_forum_info"
     
@@ -186,6 +241,9 @@ class ForumInfoTool(BaseTool):
 class CompanyInfoTool(BaseTool):
     """公司网页/产品信息获取工具"""
     
+    cache_models = (CompanyInfo, ProductCategory, Product)
+    cache_ttl = STATIC_TOOL_CACHE_TTL
+    
     def name(self):
         return "get_company_info"
     
@@ -218,6 +276,9 @@ class CompanyInfoTool(BaseTool):
             "required": ["query_type"]
         }
     
+    def warm_queries(self):
+        return [{"query_type": "company"}, {"query_type": "categories"}, {"query_type": "products"}]
+    
     def execute(self, query_type, product_id=None, category_id=None, limit=10):
         """获取公司网页/产品信息"""
         try:
@@ -331,6 +392,9 @@ class CompanyInfoTool(BaseTool):
 class MapLocationTool(BaseTool):
     """地名信息获取工具"""
     
+    cache_models = (AIMapRegion, AIMapAIInfo)
+    cache_ttl = STATIC_TOOL_CACHE_TTL
+    
     def name(self):
         return "get_map_location_info"
     
@@ -367,6 +431,13 @@ class MapLocationTool(BaseTool):
             "required": ["query_type"]
         }
     
+    def warm_queries(self):
+        # 地名列表、AI列表，以及每个公开地名的详情（handle_tool_call 会把常见地名转换成 place_id 查询）
+        queries = [{"query_type": "places"}, {"query_type": "ai"}]
+        region_ids = self.get_session().query(AIMapRegion.id).filter_by(is_public=True).order_by(AIMapRegion.id).all()
+        queries += [{"query_type": "places", "place_id": region_id} for (region_id,) in region_ids]
+        return queries
+    
     def execute(self, query_type, place_id=None, ai_id=None, keyword=None, limit=10):
         """获取地名信息"""
         try:
@@ -507,6 +578,8 @@ class MapLocationTool(BaseTool):
 class ShopInfoTool(BaseTool):
     """商店网页信息获取工具"""
     
+    cache_models = (ShopCategory, ShopMerchant, ShopProduct)
+    
     def name(self):
         return "get_shop_info"
     
@@ -672,6 +745,22 @@ class ToolRegistry:
         """列出所有已注册的工具"""
         return list(self.tools.values())
     
+    def warm_up(self):
+        """
+        预先计算各工具的常用查询并放入结果缓存（需要在应用上下文中调用）
+        :return: 预热的查询数
+        """
+        count = 0
+        for tool in self.tools.values():
+            try:
+                for kwargs in tool.warm_queries():
+                    tool.run(**kwargs)
+                    count += 1
+            except Exception as e:
+                print(f"❌ 预热工具 {tool.name()} 失败: {str(e)}")
+        print(f"🔥 工具结果缓存预热完成，共 {count} 个查询")
+        return count
+    
     def get_tools_description(self):
         """获取所有工具的描述信息，用于大模型理解"""
         return [{
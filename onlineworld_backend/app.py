@@ -21,13 +21,19 @@ import functools
 app = Flask(__name__)
 app.config.from_object(Config)
 
+# 日志：按模块设置级别，输出放到后台队列线程（见 logging_setup.py）
+from logging_setup import setup_logging
+setup_logging()
+
 # 配置应用
 app.config["ALLOWED_HTML_TAGS"] = ["div", "p", "h2", "h3", "h4", "ul", "li", "a", "strong", "em", "code", "pre", "img"]
 app.config["ALLOWED_HTML_ATTRS"] = {"a": ["href", "target", "rel"], "code": ["class"], "img": ["src", "alt", "title", "width", "height"]}
 app.config["API_KEY"] = "your-secret-key-123456"  # 请替换为你的实际密钥（重要！）
 
 # 启用CORS，增加对/email路径的明确支持
-CORS(app, origins=['http://localhost:8080'], supports_credentials=True, allow_headers=['Content-Type', 'Authorization'])
+# X-Download-URL：网盘下载返回的可续传GET链接，需要暴露给前端脚本读取
+CORS(app, origins=['http://localhost:8080'], supports_credentials=True, allow_headers=['Content-Type', 'Authorization'],
+     expose_headers=['X-Download-URL'])
 
 # 初始化数据库
 import os
@@ -41,6 +47,35 @@ db.init_app(app)
 # 确保邮箱系统数据表被创建
 with app.app_context():
     db.create_all()
+    # 旧数据库升级：为已有搜索索引补建实体索引和倒排索引
+    from forum.search_index import ensure_search_index
+    ensure_search_index(db.session)
+    # 旧数据库升级：为帖子补建回帖计数列并回填
+    from forum.post_counters import ensure_post_counters
+    ensure_post_counters(db.session)
+    # 旧数据库升级：补建游标分页用的复合索引
+    from forum.models import ShopMerchant, ShopProduct
+    from forum.pagination import ensure_pagination_indexes
+    ensure_pagination_indexes(db.session, [Post, Reply, ShopMerchant, ShopProduct])
+    # 旧数据库升级：把PlayerStatus的JSON访问记录迁移到player_visit表
+    from forum.player_visits import ensure_player_visits
+    ensure_player_visits(db.session)
+    # 旧数据库升级：为产品补建DataSheet输入指纹列
+    from forum.datasheet_service import ensure_datasheet_columns
+    ensure_datasheet_columns(db.session)
+    # 旧数据库升级：为调度任务补建重试退避时间列
+    from ai_job_queue import ensure_ai_job_columns
+    ensure_ai_job_columns(db.session)
+
+# 浏览量缓冲：定时把内存中累计的浏览量批量写回数据库
+from forum.view_counter import view_counter
+view_counter.init_app(app)
+# 玩家会话：last_visit定时批量写回
+from forum.player_session import player_sessions
+player_sessions.init_app(app)
+# 响应缓存：读多写少页面的数据缓存，模型写入后自动失效
+from forum.response_cache import response_cache
+response_cache.init_app(app)
 
 # -------------------------- 导入并注册所有蓝图 --------------------------
 # 导入蓝图
@@ -262,6 +297,14 @@ def init_db():
     
     print("数据库初始化成功！测试数据已插入")
 
+@app.cli.command("backfill-reply-counts")
+def backfill_reply_counts():
+    """按回帖表重新回填所有帖子的回帖计数（对账用）"""
+    from forum.post_counters import backfill_post_counters
+    total = backfill_post_counters(db.session)
+    db.session.commit()
+    print(f"回帖计数回填完成！共更新 {total} 个帖子")
+
 # -------------------------- 404页面（保持不变）--------------------------
 @app.errorhandler(404)
 def page_not_found(e):
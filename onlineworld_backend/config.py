@@ -28,7 +28,52 @@ class Config:
     SILICONFLOW_API_URL = SILICON_FLOW_API_URL  # 兼容ai_content_generator.py中的命名
     AI_MODEL_NAME = os.getenv("AI_MODEL_NAME", "Pro/deepseek-ai/DeepSeek-V3.2-Exp")
     AI_IMAGE_MODEL_NAME = os.getenv("AI_IMAGE_MODEL_NAME", "Kwai-Kolors/Kolors")
+    # 大模型客户端（llm_client.py）：并发上限、每个主机每秒请求数、失败重试次数
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+    LLM_RATE_LIMIT = float(os.getenv("LLM_RATE_LIMIT", "2"))
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+    # 批量生成帖子/回复时每分钟的token预算（按预估值扣减，0表示不限制）
+    LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+    # 大模型响应缓存（llm_cache.py）：本地SQLite文件，TTL秒数、最多条目数、默认缓存的温度上限（不含，温度低于该值才默认缓存）
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "True").lower() in ('true', '1', 't', 'yes')
+    LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(app_root, 'instance', 'llm_cache.db'))
+    LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(24 * 3600)))
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+    LLM_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0.7"))
+    # 大模型调用日志的抽样比例（成功的调用按此比例记录，失败的调用总是记录）
+    LLM_LOG_SAMPLE_RATE = float(os.getenv("LLM_LOG_SAMPLE_RATE", "0.1"))
+    # 图片生成流水线（image_generator.py）：同时在途的生成请求数、下载/解码/保存线程数、请求与下载超时秒数
+    IMAGE_MAX_CONCURRENCY = int(os.getenv("IMAGE_MAX_CONCURRENCY", "4"))
+    IMAGE_IO_WORKERS = int(os.getenv("IMAGE_IO_WORKERS", "8"))
+    IMAGE_API_TIMEOUT = int(os.getenv("IMAGE_API_TIMEOUT", "120"))
+    IMAGE_FETCH_TIMEOUT = int(os.getenv("IMAGE_FETCH_TIMEOUT", "60"))
+    # 图片存储目录（image_store.py，原图按内容哈希命名，衍生图在其下的 variants 目录）
+    IMAGE_STORE_DIR = os.getenv("IMAGE_STORE_DIR", os.path.join(app_root, 'static', 'images'))
+    # 静态文件发送（forum/static_delivery.py）：为空时由应用直接发送（支持Range/条件请求）；
+    # 部署在本机反向代理后可设为 x-accel-redirect（nginx）或 x-sendfile（Apache/lighttpd），文件内容由代理发送
+    STATIC_SENDFILE = os.getenv("STATIC_SENDFILE", "").lower()
+    # x-accel-redirect 模式：STATIC_ACCEL_ROOT 下的文件映射到 nginx internal location STATIC_ACCEL_PREFIX
+    STATIC_ACCEL_ROOT = os.getenv("STATIC_ACCEL_ROOT", app_root)
+    STATIC_ACCEL_PREFIX = os.getenv("STATIC_ACCEL_PREFIX", "/protected/")
+    # 网盘可续传下载链接的有效秒数
+    DISK_DOWNLOAD_LINK_TTL = int(os.getenv("DISK_DOWNLOAD_LINK_TTL", "3600"))
+    # DataSheet后台生成（forum/datasheet_service.py）：PDF渲染进程数、获取大模型文案的线程数
+    DATASHEET_RENDER_WORKERS = int(os.getenv("DATASHEET_RENDER_WORKERS", "2"))
+    DATASHEET_CONTENT_WORKERS = int(os.getenv("DATASHEET_CONTENT_WORKERS", "4"))
+
+    # 日志配置（logging_setup.py）
+    # LOG_LEVELS 按模块设置级别，如 "forum.blueprints.api=DEBUG,llm_client=WARNING"；LOG_FORMAT 为 text 或 json
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+    LOG_FILE = os.getenv("LOG_FILE", "")
     # 测试模式标志，用于控制是否使用真实API
     TEST_MODE = os.getenv("TEST_MODE", "False").lower() in ('true', '1', 't', 'yes')
 
+    # 响应缓存配置
+    # 为空时使用进程内LRU缓存；设置为 redis://localhost:6379/0 时使用Redis兼容服务（多进程共享缓存项）
+    # 两种后端的失效版本号都存在数据库 cache_version 表里，生成器进程的写入对所有Web进程立即生效
+    RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL", "")
+    RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "300"))  # 默认缓存秒数
+
 config = Config()
\ No newline at end of file
@@ -0,0 +1,135 @@
+"""
+作者池（内存中的用户名集合）
+生成帖子/回复时选作者不再每次对 Post、Reply 全表 SELECT DISTINCT author：
+- 首次使用时全量加载一次，记下两张表的最大id
+- 本进程提交的帖子/回复通过会话提交事件实时加入；其他进程（网页发帖等）写入的作者，
+  每隔 REFRESH_INTERVAL 秒按 id > 上次最大id 增量补充（主键范围查询）
+- 随机抽样、排除指定作者、判断是否重名都是O(1)
+"""
+import random
+import threading
+import time
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from .models import Post, Reply
+
+# 增量刷新间隔（秒）
+REFRESH_INTERVAL = 60
+# 排除指定作者时最多重抽几次
+MAX_SAMPLE_ATTEMPTS = 8
+
+
+class AuthorRegistry:
+    """
+    作者池（线程安全）
+    :param session_factory: 返回数据库会话的无参函数，加载/刷新时调用，用完关闭
+    """
+
+    def __init__(self, session_factory=None):
+        self.session_factory = session_factory
+        self._names = []  # 用户名列表（随机抽样用）
+        self._index = {}  # {用户名: 在列表中的位置}
+        self._last_ids = {Post: 0, Reply: 0}
+        self._loaded = False
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __iter__(self):
+        # 列表只追加不删除，迭代期间有新作者加入也是安全的
+        return iter(self._names)
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def add(self, name):
+        """加入一个用户名（空白名忽略，已存在时不重复加入）"""
+        name = (name or "").strip()
+        if not name:
+            return
+        with self._lock:
+            if name not in self._index:
+                self._index[name] = len(self._names)
+                self._names.append(name)
+
+    def sample(self, exclude=None):
+        """
+        随机取一个用户名
+        :param exclude: 不希望取到的用户名（如回复时排除发帖人）
+        :return: 用户名，作者池为空（或只有被排除的那一个）时返回None
+        """
+        with self._lock:
+            names = self._names
+            if not names or (len(names) == 1 and names[0] == exclude):
+                return None
+            for _ in range(MAX_SAMPLE_ATTEMPTS):
+                name = random.choice(names)
+                if name != exclude:
+                    return name
+            # 极少数情况下连续抽中被排除的作者：直接取它的下一个位置
+            return names[(self._index[exclude] + 1) % len(names)]
+
+    def refresh(self, force=False):
+        """
+        加载或增量刷新作者池
+        :param force: 忽略刷新间隔立即刷新
+        """
+        if not force and self._loaded and time.monotonic() - self._last_refresh < REFRESH_INTERVAL:
+            return
+        if self.session_factory is None:
+            return
+        session = self.session_factory()
+        try:
+            for model in (Post, Reply):
+                last_id = self._last_ids[model]
+                max_id = session.query(func.max(model.id)).scalar() or 0
+                if max_id > last_id:
+                    rows = session.query(model.author).filter(model.id > last_id).distinct().all()
+                    for (author,) in rows:
+                        self.add(author)
+                self._last_ids[model] = max(last_id, max_id)
+        finally:
+            session.close()
+        if not self._loaded:
+            print(f"👥 作者池加载完成，共 {len(self)} 个用户")
+        self._loaded = True
+        self._last_refresh = time.monotonic()
+
+
+# 全局作者池（由生成器设置 session_factory）
+author_registry = AuthorRegistry()
+
+
+# -------------------------- 提交事件：新帖子/回复的作者实时加入作者池 --------------------------
+def _collect_authors(session, flush_context):
+    authors = session.info.setdefault("_author_registry_names", set())
+    for obj in session.new:
+        if isinstance(obj, (Post, Reply)) and obj.author:
+            authors.add(obj.author)
+
+
+def _register_on_commit(session):
+    authors = session.info.pop("_author_registry_names", None)
+    if authors and author_registry.loaded:
+        for author in authors:
+            author_registry.add(author)
+
+
+def _discard_on_rollback(session):
+    session.info.pop("_author_registry_names", None)
+
+
+# 会话级监听器，兼容 forum.models 与 onlineworld_backend.forum.models 两种导入路径（只注册一次）
+if not getattr(Session, "_author_registry_registered", False):
+    event.listen(Session, "after_flush", _collect_authors)
+    event.listen(Session, "after_commit", _register_on_commit)
+    event.listen(Session, "after_rollback", _discard_on_rollback)
+    Session._author_registry_registered = True
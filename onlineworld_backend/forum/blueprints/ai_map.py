@@ -3,12 +3,16 @@ from .base import BasePageView, register_page_route
 from ..models import AIMapRegion, AIMapAIInfo, AIMapEvent, db
 from flask import session
 from datetime import datetime
+from ..response_cache import response_cache
 
 # 导入API蓝图
 from .api import api_bp
 
 # 地图首页视图类
 class AIMapIndexView(BasePageView):
+    version_models = (AIMapRegion,)
+
+    @response_cache.cached("ai_map_index", [AIMapRegion])
     def get_data(self):
         # 获取所有公开的地图区域
         regions = AIMapRegion.query.filter_by(is_public=True).all()
@@ -33,6 +37,8 @@ class AIMapIndexView(BasePageView):
 
 # 地图区域详情视图类
 class AIMapRegionDetailView(BasePageView):
+    version_models = (AIMapRegion, AIMapAIInfo, AIMapEvent)
+
     def get_data(self, region_id):
         # 获取区域详情
         region = AIMapRegion.query.get_or_404(region_id)
@@ -67,6 +73,8 @@ class AIMapRegionDetailView(BasePageView):
 
 # AI详情视图类
 class AIMapAIDetailView(BasePageView):
+    version_models = (AIMapAIInfo, AIMapRegion)
+
     def get_data(self, ai_id):
         # 获取AI详情
         ai = AIMapAIInfo.query.get_or_404(ai_id)
@@ -1,15 +1,26 @@
-from flask import Blueprint, request, jsonify, make_response, send_file
-import os
+from flask import Blueprint, request, jsonify, make_response, url_for
 from .base import BasePageView, register_page_route, require_api_key
-from ..models import Post, Reply, db, SearchIndex, Board, ShopProduct, DynamicPage, OnlineDiskShare
+from ..search_index import search_titles_ranked, build_search_index as rebuild_search_index
+from ..pagination import keyset_paginate, keyset_slice, get_page_args, InvalidCursor
+from ..view_counter import view_counter
+from ..response_cache import response_cache
+from ..static_delivery import resolve_path, send_static
+from ..models import Post, Reply, db, Board, OnlineDiskShare, SearchIndex
 from flask import current_app
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import joinedload
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+import logging
+
+logger = logging.getLogger(__name__)
 
 # 创建API蓝图
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
 # 搜索接口视图类
 class SearchView(BasePageView):
+    version_models = (Post, Reply, Board)
+
     def get_data(self):
         # 获取前端传递的搜索参数
         keyword = request.args.get('keyword', '').strip()
@@ -25,12 +36,16 @@ class SearchView(BasePageView):
         # 1. 搜索帖子：模糊匹配标题或内容，关联板块信息
         if search_type == 'post':
             # 使用 LIKE 模糊查询（不区分大小写，适配不同数据库）
-            posts = Post.query.filter(
+            query = Post.query.options(joinedload(Post.board)).filter(
                 db.or_(
                     Post.title.ilike(f'%{keyword}%'),
                     Post.content.ilike(f'%{keyword}%')
                 )
-            ).order_by(Post.create_time.desc()).all()
+            )
+            # 游标分页（按 (create_time, id) 倒序）
+            cursor, limit = get_page_args()
+            page = keyset_paginate(query, (Post.create_time, Post.id), cursor, limit)
+            posts = page.items
 
             results = [{
                 "id": post.id,
@@ -41,11 +56,13 @@ class SearchView(BasePageView):
                 "board_name": post.board.name,
                 "create_time": post.create_time.strftime("%Y-%m-%d %H:%M:%S"),
                 "view_count": post.view_count,
-                "reply_count": len(post.replies)
+                "reply_count": post.reply_count
             } for post in posts]
+            pagination = page.to_dict()
 
         # 2. 搜索用户：模糊匹配作者名，去重并统计发帖/回帖数
         elif search_type == 'user':
+            pagination = None
             # 从帖子表和回帖表中查询匹配的作者名（去重）
             post_authors = Post.query.filter(Post.author.ilike(f'%{keyword}%')).with_entities(Post.author).distinct()
             reply_authors = Reply.query.filter(Reply.author.ilike(f'%{keyword}%')).with_entities(Reply.author).distinct()
@@ -72,11 +89,13 @@ class SearchView(BasePageView):
         # 其他类型默认返回空结果
         else:
             results = []
+            pagination = None
 
         return {
             "results": results,
             "keyword": keyword,
-            "type": search_type
+            "type": search_type,
+            "pagination": pagination
         }
 
 # 注册搜索接口路由
@@ -86,6 +105,8 @@ register_page_route(api_bp, "/search", SearchView)
 
 # 搜索引擎搜索视图类
 class SearchEngineView(BasePageView):
+    version_models = (SearchIndex,)
+
     def get_data(self):
         # 获取前端传递的搜索参数
         keyword = request.args.get('keyword', '').strip()
@@ -100,9 +121,8 @@ class SearchEngineView(BasePageView):
         # 1. 分割关键词，去除空字符串
         keywords = [k.strip() for k in keyword.split() if k.strip()]
         
-        # 调试：输出原始关键词和分割后的关键词
-        print(f"[调试] API - 原始搜索关键词: '{keyword}'")
-        print(f"[调试] API - 分割后的关键词列表: {keywords}")
+        # 调试：输出原始关键词和分割后的关键词（DEBUG级别未开启时不格式化）
+        logger.debug("API - 原始搜索关键词: %r，分割后的关键词列表: %s", keyword, keywords)
         
         if not keywords:
             return {
@@ -110,59 +130,15 @@ class SearchEngineView(BasePageView):
                 "keyword": keyword
             }
         
-        # 2. 基本搜索（包含所有关键词）
-        query = SearchIndex.query
-        
-        # 调试：输出查询构建过程
-        print(f"[调试] API - 开始构建查询")
-        for k in keywords:
-            # 转义特殊字符，避免SQL注入
-            safe_k = k.replace('%', '\\%').replace('_', '\\_')
-            print(f"[调试] API - 添加关键词过滤: '{k}' (转义后: '{safe_k}')")
-            print(f"[调试] API - 过滤条件: SearchIndex.title.ilike('%{safe_k}%')")
-            query = query.filter(SearchIndex.title.ilike(f'%{safe_k}%', escape='\\'))
-        
-        # 3. 获取结果
-        results = query.all()
-        print(f"[调试] API - 查询结果数量: {len(results)}")
-        print(f"[调试] API - 查询结果详情: {[(r.id, r.title, r.entity_type) for r in results]}")
-        
-        # 4. 三级排序：完全相符 > 开头匹配 > 包含匹配
-        def get_sort_level(title, keyword_string):
-            """获取排序级别：1级=完全匹配，2级=开头匹配，3级=包含匹配"""
-            title_lower = title.lower()
-            keyword_lower = keyword_string.lower()
-            
-            # 调试：排序级别计算
-            print(f"[调试] API - 标题: '{title_lower}', 关键词: '{keyword_lower}'")
-            
-            # 1级：完全匹配
-            if title_lower == keyword_lower:
-                print(f"[调试] API -  完全匹配，返回级别1")
-                return 1
-            
-            # 2级：开头匹配（标题以搜索词开头）
-            if title_lower.startswith(keyword_lower):
-                print(f"[调试] API -  开头匹配，返回级别2")
-                return 2
-            
-            # 3级：包含匹配（标题包含搜索词）
-            print(f"[调试] API -  包含匹配，返回级别3")
-            return 3
-        
-        # 按级别排序，同一级别内按更新时间降序
-        print(f"[调试] API - 开始三级排序，结果数量: {len(results)}")
-        sorted_results = sorted(
-            results, 
-            key=lambda r: (get_sort_level(r.title, keyword), r.update_time), 
-            reverse=True
-        )
-        print(f"[调试] API - 排序完成，排序后结果数量: {len(sorted_results)}")
-        print(f"[调试] API - 排序后结果详情: {[(r.id, r.title, r.entity_type) for r in sorted_results]}")
+        # 2. 倒排索引检索 + BM25排序（三级匹配作为同分时的次级排序）
+        ranked_results = search_titles_ranked(db.session, keyword)
+        logger.debug("API - 查询结果数量: %s", len(ranked_results))
         
-        # 5. 格式化搜索结果
+        # 3. 按排序键游标分页，只格式化当前页
+        cursor, limit = get_page_args()
+        page = keyset_slice(ranked_results, cursor, limit)
         formatted_results = []
-        for result in sorted_results:
+        for result in page.items:
             formatted_results.append({
                 "id": result.id,
                 "title": result.title,
@@ -173,7 +149,9 @@ class SearchEngineView(BasePageView):
         
         return {
             "results": formatted_results,
-            "keyword": keyword
+            "keyword": keyword,
+            "total": len(ranked_results),
+            "pagination": page.to_dict()
         }
 
 # 注册搜索引擎路由
@@ -183,67 +161,17 @@ register_page_route(api_bp, "/search-engine", SearchEngineView)
 @api_bp.route("/search-engine/build-index", methods=["POST"])
 def build_search_index():
     """
-    构建搜索索引，从所有可搜索的模型中提取标题并存储到SearchIndex表
+    全量重建搜索索引（离线对账用）
+    日常的增删改已由模型写入事件增量同步到SearchIndex，这里只用于修复漂移或初始化
     """
     try:
-        # 首先清空现有的索引
-        SearchIndex.query.delete()
-        db.session.commit()
-        
-        # 从各个模型中提取标题并创建索引
-        search_indexes = []
-        
-        # 1. 论坛板块 (Board)
-        boards = Board.query.all()
-        for board in boards:
-            index = SearchIndex(
-                title=board.name,
-                entity_type="forum_board",
-                entity_id=board.id,
-                url=f"/forum/board/{board.id}"
-            )
-            search_indexes.append(index)
-        
-        # 2. 论坛帖子 (Post)
-        posts = Post.query.all()
-        for post in posts:
-            index = SearchIndex(
-                title=post.title,
-                entity_type="forum_post",
-                entity_id=post.id,
-                url=f"/forum/post/{post.id}"
-            )
-            search_indexes.append(index)
-        
-        # 3. 商城商品 (ShopProduct)
-        products = ShopProduct.query.filter_by(is_active=True).all()
-        for product in products:
-            index = SearchIndex(
-                title=product.name,
-                entity_type="shop_product",
-                entity_id=product.id,
-                url=f"/shop/product/{product.id}"
-            )
-            search_indexes.append(index)
-        
-        # 4. 动态页面 (DynamicPage)
-        pages = DynamicPage.query.filter_by(is_active=True, is_public=True).all()
-        for page in pages:
-            index = SearchIndex(
-                title=page.title,
-                entity_type="dynamic_page",
-                entity_id=page.id,
-                url=f"/dynamic/{page.slug}"
-            )
-            search_indexes.append(index)
-        
-        # 批量添加索引
-        db.session.add_all(search_indexes)
-        db.session.commit()
+        counts = rebuild_search_index(db.session)
+        total = sum(counts.values())
         
         return jsonify({
             "status": "success",
-            "message": f"搜索索引构建完成，共添加 {len(search_indexes)} 条记录"
+            "message": f"搜索索引构建完成，共添加 {total} 条记录",
+            "counts": counts
         }), 200
         
     except SQLAlchemyError as e:
@@ -305,6 +233,7 @@ def ai_generate_page():
 
 # 首页数据接口（兼容前端请求）
 @api_bp.route("/", methods=["GET"])
+@response_cache.cached("api_index", [Board])
 def api_index():
     """
     首页数据接口，返回论坛板块信息
@@ -352,8 +281,12 @@ def api_board(board_id):
         # 查询板块信息
         board = Board.query.get_or_404(board_id)
         
-        # 查询该板块下的所有帖子
-        posts = Post.query.filter_by(board_id=board_id).order_by(Post.create_time.desc()).all()
+        # 游标分页查询该板块下的帖子（按 (create_time, id) 倒序）
+        cursor, limit = get_page_args()
+        page = keyset_paginate(Post.query.filter_by(board_id=board_id), (Post.create_time, Post.id), cursor, limit)
+        posts = page.items
+        # 合并内存中尚未写回的浏览量
+        pending_views = view_counter.pending(Post, [post.id for post in posts])
         
         # 格式化帖子数据
         posts_data = []
@@ -363,8 +296,9 @@ def api_board(board_id):
                 "title": post.title,
                 "author": post.author,
                 "create_time": post.create_time.strftime("%Y-%m-%d %H:%M:%S"),
-                "view_count": post.view_count,
-                "reply_count": Reply.query.filter_by(post_id=post.id).count()
+                "view_count": (post.view_count or 0) + pending_views.get(post.id, 0),
+                "reply_count": post.reply_count,
+                "last_reply_time": post.last_reply_time.strftime("%Y-%m-%d %H:%M:%S") if post.last_reply_time else None
             })
         
         return jsonify({
@@ -377,9 +311,12 @@ def api_board(board_id):
                     "description": board.description,
                     "create_time": board.create_time.strftime("%Y-%m-%d %H:%M:%S")
                 },
-                "posts": posts_data
+                "posts": posts_data,
+                "pagination": page.to_dict()
             }
         })
+    except InvalidCursor as e:
+        return jsonify({"status": "error", "msg": str(e)}), 400
     except Exception as e:
         return jsonify({
             "status": "error",
@@ -423,7 +360,7 @@ def api_post(post_id):
                     "content": post.content,
                     "author": post.author,
                     "create_time": post.create_time.strftime("%Y-%m-%d %H:%M:%S"),
-                    "view_count": post.view_count,
+                    "view_count": view_counter.view_count(post),
                     "board_id": post.board_id,
                     "board_name": post.board.name
                 },
@@ -446,8 +383,15 @@ def api_user(author):
         # 从models导入Post、Reply和Board模型
         from ..models import Post, Reply, Board, db
         
-        # 查询用户发布的帖子
-        posts = Post.query.filter_by(author=author).order_by(Post.create_time.desc()).all()
+        # 游标分页查询用户发布的帖子（板块一并join，回帖数读反范式字段；参数 post_cursor / post_limit）
+        post_cursor, post_limit = get_page_args(prefix="post_")
+        post_page = keyset_paginate(
+            Post.query.options(joinedload(Post.board)).filter_by(author=author),
+            (Post.create_time, Post.id), post_cursor, post_limit
+        )
+        posts = post_page.items
+        # 浏览量加上缓冲区里尚未写回的部分，与板块页、帖子页一致
+        pending_views = view_counter.pending(Post, [post.id for post in posts])
         
         # 格式化发布的帖子数据
         posts_data = []
@@ -459,18 +403,23 @@ def api_user(author):
                 "board_id": post.board_id,
                 "board_name": post.board.name,
                 "create_time": post.create_time.strftime("%Y-%m-%d %H:%M:%S"),
-                "view_count": post.view_count,
-                "reply_count": Reply.query.filter_by(post_id=post.id).count()
+                "view_count": (post.view_count or 0) + pending_views.get(post.id, 0),
+                "reply_count": post.reply_count
             })
         
-        # 查询用户回复的帖子
-        replies = Reply.query.filter_by(author=author).order_by(Reply.create_time.desc()).all()
+        # 游标分页查询用户回复的帖子（所属帖子一并join，不再逐条查询；参数 reply_cursor / reply_limit）
+        reply_cursor, reply_limit = get_page_args(prefix="reply_")
+        reply_page = keyset_paginate(
+            Reply.query.options(joinedload(Reply.post)).filter_by(author=author),
+            (Reply.create_time, Reply.id), reply_cursor, reply_limit
+        )
+        replies = reply_page.items
         
         # 格式化回复的帖子数据
         replies_data = []
         for reply in replies:
             # 获取回复对应的帖子信息
-            post = Post.query.get(reply.post_id)
+            post = reply.post
             if post:
                 replies_data.append({
                     "id": reply.id,
@@ -482,23 +431,21 @@ def api_user(author):
                     "signature": reply.signature
                 })
         
-        # 计算用户的发帖数和回帖数
-        post_count = len(posts_data)
-        reply_count = len(replies_data)
-        
         return jsonify({
             "status": "success",
             "data": {
                 "title": f"个人主页 - {author}",
                 "user_info": {
-                    "author": author,
-                    "post_count": post_count,
-                    "reply_count": reply_count
+                    "author": author
                 },
                 "posts": posts_data,
-                "replies": replies_data
+                "replies": replies_data,
+                "posts_pagination": post_page.to_dict(),
+                "replies_pagination": reply_page.to_dict()
             }
         })
+    except InvalidCursor as e:
+        return jsonify({"status": "error", "msg": str(e)}), 400
     except Exception as e:
         return jsonify({
             "status": "error",
@@ -513,33 +460,50 @@ def api_user(author):
 @api_bp.route("/datasheet/generate/<int:product_id>", methods=["POST"])
 def generate_datasheet(product_id):
     """
-    生成产品DataSheet的API端点
+    生成产品DataSheet的API端点（后台生成）
     :param product_id: 产品ID
-    :return: JSON响应，包含生成结果和文件信息
+    查询参数 force=1 时即使产品没有变化也重新生成
+    :return: 产品没有变化时返回200和已有文件信息；否则返回202和任务ID，之后轮询任务状态接口
     """
     try:
-        from ..datasheet_generator import DataSheetGenerator
+        from ..models import Product
+        from ..datasheet_service import datasheet_service
         
-        generator = DataSheetGenerator()
-        result = generator.generate_and_save_datasheet(product_id)
+        product = Product.query.get(product_id)
+        if not product:
+            return jsonify({"status": "error", "message": "产品不存在"}), 404
         
-        if result["success"]:
+        force = request.args.get("force", "").lower() in ("1", "true", "yes")
+        job, result = datasheet_service.submit(product, force=force)
+        if job is None:
             return jsonify({
                 "status": "success",
                 "data": result,
-                "message": "DataSheet生成成功"
-            }), 200
-        else:
-            return jsonify({
-                "status": "error",
                 "message": result["message"]
-            }), 500
+            }), 200
+        
+        return jsonify({
+            "status": "queued",
+            "job_id": job.job_id,
+            "status_url": url_for("api.datasheet_job_status", job_id=job.job_id)
+        }), 202
     except Exception as e:
         return jsonify({
             "status": "error",
             "message": f"生成DataSheet失败：{str(e)}"
         }), 500
 
+
+@api_bp.route("/datasheet/jobs/<job_id>", methods=["GET"])
+def datasheet_job_status(job_id):
+    """查询DataSheet生成任务：pending / running / success / error，完成后 result 中包含文件信息"""
+    from ..datasheet_service import datasheet_service
+    
+    job = datasheet_service.get_job(job_id)
+    if not job:
+        return jsonify({"status": "error", "message": "任务不存在或已过期"}), 404
+    return jsonify({"status": "success", "data": job.to_dict()})
+
 @api_bp.route("/datasheet/download/<int:product_id>", methods=["GET"])
 def download_datasheet(product_id):
     """
@@ -560,16 +524,16 @@ def download_datasheet(product_id):
             }), 404
         
         # 构建文件路径
-        file_path = os.path.join(current_app.root_path, product.datasheet_url.lstrip("/"))
+        file_path = resolve_path(current_app.root_path, product.datasheet_url)
         
-        if not os.path.exists(file_path):
+        if not file_path:
             return jsonify({
                 "status": "error",
                 "message": "DataSheet文件不存在"
             }), 404
         
-        # 发送文件下载
-        return send_file(file_path, as_attachment=True)
+        # 发送文件下载（重新生成会覆盖同名文件，每次使用前按ETag重新验证；支持断点续传）
+        return send_static(file_path, as_attachment=True)
     except Exception as e:
         return jsonify({
             "status": "error",
@@ -612,9 +576,9 @@ def download_disk_file():
             }), 401
         
         # 构建文件路径
-        file_path = os.path.join(current_app.root_path, share.file_path.lstrip("/"))
+        file_path = resolve_path(current_app.root_path, share.file_path)
         
-        if not os.path.exists(file_path):
+        if not file_path:
             # 更新分享为无效
             share.is_active = False
             db.session.commit()
@@ -627,30 +591,55 @@ def download_disk_file():
         share.download_count += 1
         db.session.commit()
         
-        # 发送文件下载
-        return send_file(
-            file_path,
-            as_attachment=True,
-            download_name=share.file_name,
-            mimetype=None  # 让Flask自动检测文件类型
-        )
+        # 发送文件下载（mimetype 由Flask自动检测）
+        # POST请求不能断点续传，X-Download-URL 附上有时效的GET下载链接，下载中断后用它按Range续传
+        response = send_static(file_path, as_attachment=True, download_name=share.file_name)
+        response.headers["X-Download-URL"] = url_for(
+            "api.download_disk_link", token=_disk_link_serializer().dumps(share.share_id))
+        return response
     except Exception as e:
         return jsonify({
             "status": "error",
             "message": f"下载网盘文件失败：{str(e)}"
         }), 500
 
+
+def _disk_link_serializer():
+    """网盘下载链接的签名器（链接中只含分享号和签发时间，密码已在签发前验证）"""
+    return URLSafeTimedSerializer(current_app.secret_key, salt="disk-download-link")
+
+
+@api_bp.route("/disk/download/<token>", methods=["GET"])
+def download_disk_link(token):
+    """
+    网盘文件的可续传下载链接（由 POST /api/disk/download 验证密码后在 X-Download-URL 头中返回）
+    支持 Range 断点续传和条件请求，不重复计入下载次数
+    """
+    try:
+        share_id = _disk_link_serializer().loads(token, max_age=current_app.config.get("DISK_DOWNLOAD_LINK_TTL", 3600))
+    except SignatureExpired:
+        return jsonify({"status": "error", "message": "下载链接已过期，请重新输入分享号和密码"}), 410
+    except BadSignature:
+        return jsonify({"status": "error", "message": "下载链接无效"}), 403
+    
+    share = OnlineDiskShare.query.filter_by(share_id=share_id, is_active=True).first()
+    file_path = resolve_path(current_app.root_path, share.file_path) if share else None
+    if not file_path:
+        return jsonify({"status": "error", "message": "文件不存在或已被删除"}), 404
+    return send_static(file_path, as_attachment=True, download_name=share.file_name)
+
 # -------------------------- 调度AI API --------------------------
 
 @api_bp.route("/ai/schedule", methods=["POST"])
 def ai_schedule():
     """
-    调度AI的API接口
+    调度AI的API接口：任务进入持久化队列，由worker进程（python ai_job_queue.py）执行
     请求体：{"task": "任务描述", "parameters": {"参数": "值"}}
+    返回202和任务ID，之后轮询状态/结果接口
     """
     try:
         # 延迟导入，避免循环依赖
-        from ai_scheduler import aI_scheduler
+        from ai_job_queue import enqueue_job
         
         data = request.get_json()
         task_description = data.get("task", "")
@@ -662,10 +651,15 @@ def ai_schedule():
                 "message": "任务描述不能为空"
             }), 400
         
-        # 运行任务
-        result = aI_scheduler.run_task(task_description, parameters)
+        # 入队，立即返回
+        job = enqueue_job(task_description, parameters)
         
-        return jsonify(result), 200 if result.get("status") == "success" else 500
+        return jsonify({
+            "status": "queued",
+            "job_id": job.job_id,
+            "status_url": url_for("api.ai_job_status", job_id=job.job_id),
+            "result_url": url_for("api.ai_job_result", job_id=job.job_id)
+        }), 202
     except ValueError as e:
         # 参数校验失败
         return jsonify({"status": "error", "message": str(e)}), 400
@@ -674,24 +668,95 @@ def ai_schedule():
         return jsonify({"status": "error", "message": f"调度AI失败：{str(e)}"}), 500
 
 
+@api_bp.route("/ai/jobs/<job_id>", methods=["GET"])
+def ai_job_status(job_id):
+    """查询调度任务状态：pending / running / success / error，以及步骤进度和耗时"""
+    from ai_job_queue import get_job
+    
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"status": "error", "message": "任务不存在"}), 404
+    return jsonify({"status": "success", "data": job.to_dict()})
+
+
+@api_bp.route("/ai/jobs/<job_id>/result", methods=["GET"])
+def ai_job_result(job_id):
+    """
+    获取调度任务结果
+    任务完成返回200和结果；还在排队/执行返回202；失败返回500和错误信息
+    """
+    from ai_job_queue import get_job
+    
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"status": "error", "message": "任务不存在"}), 404
+    if job.status == "success":
+        return jsonify({"status": "success", "result": job.result})
+    if job.status == "error":
+        return jsonify({"status": "error", "message": job.error}), 500
+    return jsonify({"status": job.status, "message": "任务尚未完成"}), 202
+
+
+@api_bp.route("/ai/jobs/<job_id>/retry", methods=["POST"])
+def ai_job_retry(job_id):
+    """把失败的任务重新放回队列，从最后完成的步骤之后继续执行"""
+    from ai_job_queue import get_job, retry_job
+    
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"status": "error", "message": "任务不存在"}), 404
+    if not retry_job(job):
+        return jsonify({"status": "error", "message": f"只有失败的任务可以重试（当前状态：{job.status}）"}), 409
+    return jsonify({"status": "queued", "job_id": job.job_id}), 202
+
+
+@api_bp.route("/ai/llm-cache/stats", methods=["GET"])
+@require_api_key
+def llm_cache_stats():
+    """大模型响应缓存的命中率统计（本进程计数 + 缓存文件中的累计命中次数）"""
+    from llm_cache import llm_cache
+    
+    return jsonify({"status": "success", "data": llm_cache.stats()})
+
+
+# 图片缓存时长：按内容哈希命名的图片内容不会变化，缓存一年并标记immutable；旧的时间戳命名图片缓存一天
+IMAGE_CACHE_MAX_AGE = 365 * 24 * 3600
+LEGACY_IMAGE_CACHE_MAX_AGE = 24 * 3600
+
+
 @api_bp.route("/images/<path:image_filename>", methods=["GET"])
 def get_image(image_filename):
     """
     通用图片访问API端点
     根据文件名从static/images目录中提供图片文件
     可以被网站的任何部分调用，而不仅限于商城功能
+    查询参数：
+    - size=thumb|small|medium：返回对应尺寸的WebP缩略图（最长边128/256/512像素）
+    - format=webp：返回原尺寸的WebP图片
+    不带参数时返回原图
     """
+    from image_store import VARIANTS, image_store, is_content_addressed
+
+    size = request.args.get('size')
+    if size and (size not in VARIANTS or VARIANTS[size] is None):
+        sizes = [name for name, edge in VARIANTS.items() if edge]
+        return jsonify({"error": f"不支持的图片尺寸: {size}，可选: {sizes}"}), 400
+    variant = size or ('webp' if request.args.get('format') == 'webp' else None)
+
     try:
-        # 获取图片存储的基础路径
-        static_dir = os.path.join(current_app.root_path, 'static')
-        image_path = os.path.join(static_dir, 'images', image_filename)
+        # 在图片存储目录下解析路径（拒绝跳出图片目录的路径）
+        image_path = resolve_path(image_store.root, image_filename)
         
         # 验证图片文件是否存在
-        if not os.path.exists(image_path) or not os.path.isfile(image_path):
+        if not image_path:
             return jsonify({"error": "图片文件不存在"}), 404
+        if variant:
+            image_path = image_store.variant_path(image_filename, variant)
         
         # 发送图片文件
-        return send_file(image_path, as_attachment=False)
+        if is_content_addressed(image_filename):
+            return send_static(image_path, max_age=IMAGE_CACHE_MAX_AGE, immutable=True)
+        return send_static(image_path, max_age=LEGACY_IMAGE_CACHE_MAX_AGE)
         
     except Exception as e:
         current_app.logger.error(f"图片访问API错误: {str(e)}")
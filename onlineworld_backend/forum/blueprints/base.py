@@ -5,42 +5,56 @@ from onlineworld_backend.config import config
 from ..models import db, Board, Post, Reply, PlayerStatus, DynamicPage
 from datetime import datetime
 from ..ai_page_generator import AIPageGenerator
+from ..player_session import player_sessions
+from ..conditional_get import table_version, make_validators, is_not_modified, apply_validators, not_modified_response
+from ..pagination import InvalidCursor
 from sqlalchemy.exc import SQLAlchemyError
 import functools
 
 # 核心基类（所有网页路由继承此类）
 class BasePageView(MethodView):
     """网页路由基类：封装公共逻辑，子类只需实现 get_data()"""
+
+    # 页面数据来源的模型类，用于计算ETag / Last-Modified；None表示不做条件GET，()表示静态页面
+    version_models = None
+
+    def __init__(self, version_models=None):
+        if version_models is not None:
+            self.version_models = version_models
     
     def dispatch_request(self, *args, **kwargs):
         """所有请求都会经过此方法（MethodView核心），封装公共逻辑"""
         try:
             # 第一步：生成/验证匿名玩家ID（公共逻辑）
-            player_id = session.get("player_id")
-            if not player_id or not PlayerStatus.query.get(player_id):
-                # 新建匿名玩家
-                player = PlayerStatus()
-                db.session.add(player)
-                db.session.commit()
-                player_id = player.id
-                session["player_id"] = player_id
-            else:
-                # 更新最后访问时间
-                player = PlayerStatus.query.get(player_id)
-                player.last_visit = datetime.utcnow()
-                db.session.commit()
+            # 已知玩家只在内存里记录访问时间，定时批量写回，读页面不再访问数据库
+            player_id = player_sessions.current_player_id()
+
+            # 第二步：条件GET，数据版本没变时直接返回304，不执行 get_data
+            # 响应里带有玩家ID，ETag按玩家和完整URL区分
+            version = self.get_version(*args, **kwargs) if request.method in ("GET", "HEAD") else None
+            if version is not None:
+                etag, last_modified = make_validators(version, salt=f"{player_id}|{request.full_path}")
+                if is_not_modified(etag, last_modified):
+                    self.on_not_modified(*args, **kwargs)
+                    return not_modified_response(etag, last_modified)
 
-            # 第二步：调用子类实现的 get_data()，获取页面专属数据
+            # 第三步：调用子类实现的 get_data()，获取页面专属数据
             page_data = self.get_data(*args, **kwargs)  # 子类必须实现此方法
 
-            # 第三步：返回统一格式的响应（公共响应格式）
-            return jsonify({
+            # 第四步：返回统一格式的响应（公共响应格式）
+            response = jsonify({
                 "status": "success",
                 "data": {
                     "player_id": player_id,  # 所有页面都返回匿名ID（前端无需显示）
                     **page_data  # 合并子类返回的页面数据（如title、boards、posts等）
                 }
             })
+            if version is not None:
+                apply_validators(response, etag, last_modified)
+            return response
+        except InvalidCursor as e:
+            # 分页游标被篡改或格式不对：参数错误，不伪装成404
+            return make_response(jsonify({"status": "error", "msg": str(e)}), 400)
         except Exception as e:
             # 异常处理：返回404（拟真）
             return make_response(jsonify({
@@ -53,18 +67,32 @@ class BasePageView(MethodView):
         """子类必须实现的方法：返回页面专属数据（如 {"title": "首页", "boards": [...]}）"""
         raise NotImplementedError("子类必须实现 get_data() 方法")
 
+    def get_version(self, *args, **kwargs):
+        """
+        页面数据版本（用于ETag / Last-Modified），返回None表示不做条件GET
+        默认按 version_models 里各模型的整表版本计算；只依赖部分行的页面（板块页、帖子页等）在子类中重写
+        """
+        if self.version_models is None:
+            return None
+        return [table_version(model) for model in self.version_models]
+
+    def on_not_modified(self, *args, **kwargs):
+        """返回304前的钩子：页面有副作用（记录访问、浏览量）时在子类中重写"""
+        pass
+
 # 辅助函数：简化路由注册（可选，进一步简化开发）
-def register_page_route(blueprint, url_rule, view_class, endpoint=None):
+def register_page_route(blueprint, url_rule, view_class, endpoint=None, version_models=None):
     """
     注册页面路由的辅助函数，避免重复写 add_url_rule
     :param blueprint: 蓝图对象
     :param url_rule: 路由路径（如 "/"、"/board/<int:board_id>"）
     :param view_class: 视图类（继承自 BasePageView）
     :param endpoint: 路由别名（默认用视图类名小写）
+    :param version_models: 覆盖视图类的 version_models（同一视图类注册到数据来源不同的路由时使用）
     """
     if not endpoint:
         endpoint = view_class.__name__.lower()
-    blueprint.add_url_rule(url_rule, view_func=view_class.as_view(endpoint))
+    blueprint.add_url_rule(url_rule, view_func=view_class.as_view(endpoint, version_models=version_models))
 
 # 接口鉴权装饰器
 def require_api_key(f):
@@ -3,12 +3,16 @@ from .base import BasePageView, register_page_route
 from ..models import CompanyInfo, ProductCategory, Product, db
 from flask import session
 from datetime import datetime
+from ..response_cache import response_cache
 
 # 导入API蓝图而不是创建新蓝图
 from .api import api_bp
 
 # 首页视图类
 class CompanyIndexView(BasePageView):
+    version_models = (CompanyInfo, ProductCategory, Product)
+
+    @response_cache.cached("company_index", [CompanyInfo, ProductCategory, Product])
     def get_data(self):
         # 获取公司基本信息
         company_info = CompanyInfo.query.first()
@@ -67,6 +71,8 @@ class CompanyIndexView(BasePageView):
 
 # 产品列表页视图类
 class ProductListView(BasePageView):
+    version_models = (ProductCategory, Product)
+
     def get_data(self, category_id=None):
         # 获取产品分类
         categories = ProductCategory.query.order_by(ProductCategory.order_num).all()
@@ -109,6 +115,8 @@ class ProductListView(BasePageView):
 
 # 产品详情页视图类
 class ProductDetailView(BasePageView):
+    version_models = (ProductCategory, Product)
+
     def get_data(self, product_id):
         # 查询产品详情
         product = Product.query.get_or_404(product_id)
@@ -143,6 +151,9 @@ class ProductDetailView(BasePageView):
 
 # 关于我们视图类
 class AboutView(BasePageView):
+    version_models = (CompanyInfo,)
+
+    @response_cache.cached("company_about", [CompanyInfo])
     def get_data(self):
         # 获取公司基本信息
         company_info = CompanyInfo.query.first()
@@ -179,6 +190,8 @@ class AboutView(BasePageView):
 
 # 联系我们视图类
 class ContactView(BasePageView):
+    version_models = (CompanyInfo,)
+
     def get_data(self):
         # 获取公司基本信息
         company_info = CompanyInfo.query.first()
@@ -2,6 +2,8 @@ from flask import Blueprint, request, jsonify, session, current_app
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
 from ..models import db, MailUser, Mail
+from ..conditional_get import conditional_get, table_version
+from sqlalchemy import func
 from datetime import datetime
 import re
 
@@ -26,6 +28,22 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def mailbox_version(user_column):
+    """
+    邮箱列表的数据版本：新邮件、删除、已读/星标变化都会改变版本
+    :param user_column: 按哪一列筛选当前用户的邮件（收件箱 Mail.recipient_id，发件箱 Mail.sender_id）
+    """
+    def version_func(*args, **kwargs):
+        return [table_version(
+            Mail, user_column == request.current_user.id, Mail.is_deleted == False,
+            extra=(func.sum(Mail.is_read), func.sum(Mail.is_starred))
+        )]
+    return version_func
+
+def mailbox_salt():
+    """ETag按登录用户和完整URL（分页、过滤参数）区分"""
+    return f"{request.current_user.id}|{request.full_path}"
+
 def is_valid_email(email):
     """验证邮箱格式是否正确"""
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
@@ -183,6 +201,7 @@ def send_email():
 
 @email_bp.route('/inbox', methods=['GET'])
 @login_required
+@conditional_get(mailbox_version(Mail.recipient_id), mailbox_salt)
 def get_inbox():
     """获取收件箱邮件列表"""
     try:
@@ -238,6 +257,7 @@ def get_inbox():
 
 @email_bp.route('/outbox', methods=['GET'])
 @login_required
+@conditional_get(mailbox_version(Mail.sender_id), mailbox_salt)
 def get_outbox():
     """获取发件箱邮件列表"""
     try:
@@ -3,12 +3,26 @@ from .base import BasePageView, register_page_route
 from ..models import Board, Post, Reply, PlayerStatus, DynamicPage, db
 from flask import session
 from datetime import datetime
+from ..pagination import keyset_paginate, get_page_args
+from ..view_counter import view_counter
+from ..player_visits import record_visit, VISIT_BOARD, VISIT_POST
+from ..response_cache import response_cache
+from ..conditional_get import table_version
+from sqlalchemy import func
 
 # 创建论坛页面蓝图
 forum_bp = Blueprint('forum', __name__, url_prefix='/forum')
 
+def record_visit_and_commit(entity_type, entity_id):
+    """记录当前玩家的访问，首次访问才提交事务"""
+    if record_visit(db.session, session["player_id"], entity_type, entity_id):
+        db.session.commit()
+
 # 首页视图类
 class IndexView(BasePageView):
+    version_models = (Board,)
+
+    @response_cache.cached("forum_index", [Board])
     def get_data(self):
         # 只关注首页专属逻辑：查询所有板块
         boards = Board.query.all()
@@ -25,61 +39,89 @@ class IndexView(BasePageView):
 
 # 板块页面视图类
 class BoardView(BasePageView):
+    def get_version(self, board_id):
+        # 板块本身 + 该板块下的帖子（新帖、新回帖都会改变版本；浏览量不参与）
+        return [
+            table_version(Board, Board.id == board_id),
+            table_version(Post, Post.board_id == board_id,
+                          extra=(func.max(Post.last_reply_time), func.sum(Post.reply_count)))
+        ]
+
+    def on_not_modified(self, board_id):
+        # 304时照常记录访问和浏览量：只按索引取出本页帖子ID，不加载帖子
+        record_visit_and_commit(VISIT_BOARD, board_id)
+        cursor, limit = get_page_args()
+        page = keyset_paginate(db.session.query(Post.id, Post.create_time).filter(Post.board_id == board_id),
+                               (Post.create_time, Post.id), cursor, limit)
+        view_counter.incr(Post, [row.id for row in page.items])
+
     def get_data(self, board_id):
         # 板块页专属逻辑：查询板块+帖子
         board = Board.query.get_or_404(board_id)  # 不存在直接404
-        posts = Post.query.filter_by(board_id=board_id).order_by(Post.create_time.desc()).all()
+        # 先取出板块字段：后面的commit会让board过期，再访问会重新查询
+        board_info = {
+            "id": board.id,
+            "name": board.name,
+            "description": board.description
+        }
         
-        # 更新玩家已访问板块
-        player_id = session["player_id"]
-        player = PlayerStatus.query.get(player_id)
-        if board_id not in player.visited_boards:
-            player.visited_boards.append(board_id)
-            db.session.commit()
+        # 更新玩家已访问板块（已访问过时只做一次索引点查，不写库）
+        record_visit_and_commit(VISIT_BOARD, board_id)
         
-        # 更新帖子浏览量
-        for post in posts:
-            post.view_count += 1
-        db.session.commit()
+        # 帖子列表只查一次：回帖数直接读反范式字段，板块信息复用board_info
+        # （放在玩家状态提交之后查询，避免commit使帖子过期后逐条刷新）
+        # 按 (create_time, id) 游标分页，参数 cursor / limit
+        cursor, limit = get_page_args()
+        page = keyset_paginate(Post.query.filter_by(board_id=board_id), (Post.create_time, Post.id), cursor, limit)
+        posts = page.items
+        
+        # 更新帖子浏览量（先记在内存缓冲里，定时批量写回，读页面不再开写事务）
+        view_counter.incr(Post, [post.id for post in posts])
+        pending_views = view_counter.pending(Post, [post.id for post in posts])
         
         post_list = [{
             "id": post.id,
             "title": post.title,
             "author": post.author,
             "create_time": post.create_time.strftime("%Y-%m-%d %H:%M:%S"),
-            "view_count": post.view_count,
-            "reply_count": len(post.replies),
-            "board_id": post.board.id,
-            "board_name": post.board.name
+            "view_count": (post.view_count or 0) + pending_views.get(post.id, 0),
+            "reply_count": post.reply_count,
+            "last_reply_time": post.last_reply_time.strftime("%Y-%m-%d %H:%M:%S") if post.last_reply_time else None,
+            "board_id": board_info["id"],
+            "board_name": board_info["name"]
         } for post in posts]
         
         return {
-            "title": f"复古论坛 - {board.name}",
-            "board": {
-                "id": board.id,
-                "name": board.name,
-                "description": board.description
-            },
-            "posts": post_list
+            "title": f"复古论坛 - {board_info['name']}",
+            "board": board_info,
+            "posts": post_list,
+            "pagination": page.to_dict()
         }
 
 # 帖子详情页视图类
 class PostView(BasePageView):
+    def get_version(self, post_id):
+        # 帖子本身 + 它的回帖（浏览量不参与）
+        return [
+            table_version(Post, Post.id == post_id,
+                          extra=(func.max(Post.last_reply_time), func.max(Post.reply_count))),
+            table_version(Reply, Reply.post_id == post_id)
+        ]
+
+    def on_not_modified(self, post_id):
+        record_visit_and_commit(VISIT_POST, post_id)
+        view_counter.incr(Post, post_id)
+
     def get_data(self, post_id):
         # 帖子页专属逻辑：查询帖子+回帖
         post = Post.query.get_or_404(post_id)
         replies = Reply.query.filter_by(post_id=post_id).order_by(Reply.create_time.asc()).all()
         
-        # 更新玩家已访问帖子
-        player_id = session["player_id"]
-        player = PlayerStatus.query.get(player_id)
-        if post_id not in player.visited_posts:
-            player.visited_posts.append(post_id)
-            db.session.commit()
+        # 更新玩家已访问帖子（已访问过时只做一次索引点查，不写库）
+        record_visit_and_commit(VISIT_POST, post_id)
         
-        # 更新帖子浏览量
-        post.view_count += 1
-        db.session.commit()
+        # 更新帖子浏览量（内存缓冲，定时批量写回）
+        view_counter.incr(Post, post.id)
         
         reply_list = [{
             "id": reply.id,
@@ -97,7 +139,7 @@ class PostView(BasePageView):
                 "content": post.content,
                 "author": post.author,
                 "create_time": post.create_time.strftime("%Y-%m-%d %H:%M:%S"),
-                "view_count": post.view_count,
+                "view_count": view_counter.view_count(post),
                 "board_name": post.board.name,
                 "board_id": post.board.id
             },
@@ -106,6 +148,8 @@ class PostView(BasePageView):
 
 # 搜索结果页面视图类
 class SearchResultView(BasePageView):
+    version_models = ()  # 静态页面
+
     def get_data(self):
         return {
             "title": "复古论坛 - 搜索结果"
@@ -113,6 +157,8 @@ class SearchResultView(BasePageView):
 
 # 新人指南视图类
 class NewbieGuideView(BasePageView):
+    version_models = ()
+
     def get_data(self):
         # 静态页面：只需返回标题
         return {
@@ -121,6 +167,8 @@ class NewbieGuideView(BasePageView):
 
 # 版规说明视图类
 class RulesView(BasePageView):
+    version_models = ()
+
     def get_data(self):
         return {
             "title": "复古论坛 - 版规说明"
@@ -128,6 +176,8 @@ class RulesView(BasePageView):
 
 # 联系我们视图类
 class ContactView(BasePageView):
+    version_models = ()
+
     def get_data(self):
         return {
             "title": "复古论坛 - 联系我们"
@@ -136,6 +186,8 @@ class ContactView(BasePageView):
 # 动态页面类
 class DynamicPageView(BasePageView):
     """通用动态页面视图类：匹配大模型生成的所有网页"""
+    version_models = (DynamicPage,)
+
     def get_data(self, slug):
         # 1. 查询动态页面（未启用或不存在则404）
         dynamic_page = DynamicPage.query.filter_by(
@@ -8,12 +8,38 @@ import json
 shop_bp = Blueprint('shop', __name__, url_prefix='/api/shop')
 
 from forum.models import db, ShopCategory, ShopMerchant, ShopProduct
+from forum.pagination import keyset_paginate, get_page_args, InvalidCursor
+from forum.view_counter import view_counter
+from forum.response_cache import response_cache
+
+
+def _use_keyset():
+    """是否使用游标分页：传 pagination=keyset 或带cursor时启用，默认仍按页码分页（兼容旧前端）"""
+    return request.args.get('pagination') == 'keyset' or bool(request.args.get('cursor'))
+
+
+def _keyset_response(query, sort_columns, per_page, descending=True):
+    """
+    游标分页响应：深页不再付出OFFSET扫描的代价
+    :param sort_columns: 排序列，最后一列须唯一（id）
+    """
+    cursor, limit = get_page_args(default_limit=per_page)
+    try:
+        page = keyset_paginate(query, sort_columns, cursor, limit, descending)
+    except InvalidCursor as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    return jsonify({
+        "success": True,
+        "data": [item.to_dict() for item in page.items],
+        **page.to_dict()
+    })
 
 
 # ===================== 商品分类API =====================
 
 @shop_bp.route('/categories', methods=['GET'])
 @cross_origin()
+@response_cache.cached("shop_categories", [ShopCategory])
 def get_categories():
     """获取所有商品分类"""
     categories = ShopCategory.query.filter_by(is_active=True).order_by(ShopCategory.order_num).all()
@@ -65,6 +91,9 @@ def get_merchants():
     if keyword:
         query = query.filter(ShopMerchant.name.contains(keyword))
     
+    if _use_keyset():
+        return _keyset_response(query, (ShopMerchant.rating, ShopMerchant.id), per_page)
+    
     pagination = query.order_by(ShopMerchant.rating.desc()).paginate(page=page, per_page=per_page, error_out=False)
     
     return jsonify({
@@ -102,10 +131,14 @@ def get_merchant_products(merchant_id):
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     
-    pagination = ShopProduct.query.filter_by(
+    query = ShopProduct.query.filter_by(
         merchant_id=merchant_id, 
         is_active=True
-    ).order_by(ShopProduct.create_time.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    )
+    if _use_keyset():
+        return _keyset_response(query, (ShopProduct.create_time, ShopProduct.id), per_page)
+    
+    pagination = query.order_by(ShopProduct.create_time.desc()).paginate(page=page, per_page=per_page, error_out=False)
     
     return jsonify({
         "success": True,
@@ -160,6 +193,16 @@ def get_products():
     sort_by = request.args.get('sort_by', 'create_time')
     sort_order = request.args.get('sort_order', 'desc')
     
+    if _use_keyset():
+        # 每种排序都有 (排序列, id) 复合索引（见 ShopProduct.__table_args__），翻页走索引范围扫描
+        sort_column = {
+            'price': ShopProduct.price,
+            'sales': ShopProduct.sold_count,
+            'rating': ShopProduct.rating
+        }.get(sort_by, ShopProduct.create_time)
+        return _keyset_response(query, (sort_column, ShopProduct.id), per_page,
+                                descending=sort_order != 'asc')
+    
     if sort_by == 'price':
         if sort_order == 'asc':
             query = query.order_by(ShopProduct.price.asc())
@@ -199,13 +242,14 @@ def get_product(product_id):
     """获取商品详情"""
     product = ShopProduct.query.get_or_404(product_id)
     
-    # 增加浏览量
-    product.view_count += 1
-    db.session.commit()
+    # 增加浏览量（内存缓冲，定时批量写回）
+    view_counter.incr(ShopProduct, product.id)
+    data = product.to_dict()
+    data["view_count"] = view_counter.view_count(product)
     
     return jsonify({
         "success": True,
-        "data": product.to_dict()
+        "data": data
     })
 
 
@@ -216,10 +260,14 @@ def get_featured_products():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
     
-    pagination = ShopProduct.query.filter_by(
+    query = ShopProduct.query.filter_by(
         is_active=True, 
         is_featured=True
-    ).order_by(ShopProduct.create_time.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    )
+    if _use_keyset():
+        return _keyset_response(query, (ShopProduct.create_time, ShopProduct.id), per_page)
+    
+    pagination = query.order_by(ShopProduct.create_time.desc()).paginate(page=page, per_page=per_page, error_out=False)
     
     return jsonify({
         "success": True,
@@ -287,6 +335,7 @@ def search_products():
 
 @shop_bp.route('/home', methods=['GET'])
 @cross_origin()
+@response_cache.cached("shop_home", [ShopCategory, ShopProduct, ShopMerchant])
 def get_shop_home():
     """获取商城首页数据"""
     # 获取分类
@@ -324,6 +373,7 @@ def get_shop_home():
 
 @shop_bp.route('/stats', methods=['GET'])
 @cross_origin()
+@response_cache.cached("shop_stats", [ShopCategory, ShopProduct, ShopMerchant])
 def get_stats():
     """获取商城统计数据"""
     return jsonify({
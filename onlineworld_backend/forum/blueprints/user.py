@@ -2,27 +2,54 @@ from flask import Blueprint
 from .base import BasePageView, register_page_route
 from ..models import Post, Reply, PlayerStatus
 from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from ..pagination import keyset_paginate, get_page_args
+from ..conditional_get import table_version
+from ..view_counter import view_counter
 
 # 创建用户相关蓝图
 user_bp = Blueprint('user', __name__, url_prefix='/user')
 
 # 个人页面（查看用户发帖、回帖）
 class UserProfileView(BasePageView):
+    def get_version(self, author):
+        # 只看该用户的帖子和回帖（按作者索引聚合）；其他人回复该用户的帖子会改变回帖数和最新回帖时间
+        return [
+            table_version(Post, Post.author == author,
+                          extra=(func.max(Post.last_reply_time), func.sum(Post.reply_count))),
+            table_version(Reply, Reply.author == author)
+        ]
+
     def get_data(self, author):
-        # 1. 查询该用户发布的帖子（按时间倒序）
-        user_posts = Post.query.filter_by(author=author).order_by(Post.create_time.desc()).all()
+        # 1. 查询该用户发布的帖子（按时间倒序，板块一并join，回帖数读反范式字段）
+        #    按 (create_time, id) 游标分页，参数 post_cursor / post_limit
+        post_cursor, post_limit = get_page_args(prefix="post_")
+        post_page = keyset_paginate(
+            Post.query.options(joinedload(Post.board)).filter_by(author=author),
+            (Post.create_time, Post.id), post_cursor, post_limit
+        )
+        user_posts = post_page.items
+        # 浏览量加上缓冲区里尚未写回的部分，与板块页、帖子页一致
+        pending_views = view_counter.pending(Post, [post.id for post in user_posts])
         post_list = [{
             "id": post.id,
             "title": post.title,
             "board_name": post.board.name,
             "board_id": post.board.id,
             "create_time": post.create_time.strftime("%Y-%m-%d %H:%M:%S"),
-            "view_count": post.view_count,
-            "reply_count": len(post.replies)
+            "view_count": (post.view_count or 0) + pending_views.get(post.id, 0),
+            "reply_count": post.reply_count
         } for post in user_posts]
 
-        # 2. 查询该用户发布的回帖（按时间倒序）
-        user_replies = Reply.query.filter_by(author=author).order_by(Reply.create_time.desc()).all()
+        # 2. 查询该用户发布的回帖（按时间倒序，所属帖子一并join）
+        #    按 (create_time, id) 游标分页，参数 reply_cursor / reply_limit
+        reply_cursor, reply_limit = get_page_args(prefix="reply_")
+        reply_page = keyset_paginate(
+            Reply.query.options(joinedload(Reply.post)).filter_by(author=author),
+            (Reply.create_time, Reply.id), reply_cursor, reply_limit
+        )
+        user_replies = reply_page.items
         reply_list = [{
             "id": reply.id,
             "content": reply.content[:100] + "..." if len(reply.content) > 100 else reply.content,  # 截取前100字
@@ -35,12 +62,12 @@ class UserProfileView(BasePageView):
         return {
             "title": f"复古论坛 - {author} 的个人主页",
             "user_info": {
-                "author": author,
-                "post_count": len(post_list),  # 发帖数
-                "reply_count": len(reply_list)  # 回帖数
+                "author": author
             },
             "posts": post_list,  # 发布的帖子
-            "replies": reply_list  # 发布的回帖
+            "replies": reply_list,  # 发布的回帖
+            "posts_pagination": post_page.to_dict(),
+            "replies_pagination": reply_page.to_dict()
         }
 
 # 注册用户相关路由
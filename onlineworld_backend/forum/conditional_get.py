@@ -0,0 +1,100 @@
+"""
+条件GET（ETag / Last-Modified）
+页面先算一个廉价的数据版本（每张相关表一条聚合查询：行数、最大id、最近修改时间），
+客户端带着上次的 ETag / Last-Modified 轮询时，版本没变就直接返回304，不再执行 get_data 的查询和序列化。
+- 最近修改时间依次取 update_time / updated_time / create_time 中模型有的第一个字段；
+  没有修改时间的字段由调用方通过 extra 传入聚合表达式（如回帖数之和）
+- 再混入响应缓存的表写入版本号（存在数据库里，所有进程一致），ORM修改任何字段ETag都会变
+- 浏览量等高频计数不参与版本计算，304 时客户端展示的是上次拿到的值
+"""
+import hashlib
+from datetime import timezone
+from functools import wraps
+
+from flask import current_app, make_response, request
+from sqlalchemy import func
+
+from .models import db
+from .response_cache import response_cache
+
+# 作为"最近修改时间"的字段，按优先级排列
+TIME_COLUMNS = ("update_time", "updated_time", "create_time")
+
+
+def table_version(model, *criteria, extra=()):
+    """
+    某张表（或其中一部分行）的数据版本
+    :param model: 模型类
+    :param criteria: 过滤条件（如 Post.board_id == 1），只对相关行计算版本
+    :param extra: 额外的聚合表达式（如 func.sum(Post.reply_count)），用于捕捉没有修改时间的字段变化
+    :return: (行数, 最大id, 最近修改时间, *extra, 写入版本号)，模型没有时间字段时不含最近修改时间
+    """
+    aggregates = [func.count(model.id), func.max(model.id)]
+    time_column = next((getattr(model, name) for name in TIME_COLUMNS if hasattr(model, name)), None)
+    if time_column is not None:
+        aggregates.append(func.max(time_column))
+    row = db.session.query(*aggregates, *extra).filter(*criteria).one()
+    return (*row, *response_cache.table_versions([model.__table__.name]))
+
+
+def make_validators(parts, salt=""):
+    """
+    数据版本 -> (ETag, Last-Modified)
+    :param parts: 版本组成部分（table_version 的结果列表等），其中的datetime取最大值作为Last-Modified
+    :param salt: 同一份数据对应不同响应时的区分（玩家ID、URL查询参数等）
+    """
+    etag = hashlib.sha1(repr((parts, salt)).encode("utf-8")).hexdigest()[:24]
+    times = [value for part in parts for value in (part if isinstance(part, tuple) else (part,))
+             if hasattr(value, "tzinfo")]
+    last_modified = None
+    if times:
+        # 数据库里是UTC时间（datetime.utcnow），HTTP日期精确到秒
+        last_modified = max(times).replace(tzinfo=timezone.utc, microsecond=0)
+    return etag, last_modified
+
+
+def is_not_modified(etag, last_modified):
+    """客户端缓存的副本是否仍然有效（If-None-Match 优先于 If-Modified-Since）"""
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if last_modified is not None and request.if_modified_since:
+        return request.if_modified_since >= last_modified
+    return False
+
+
+def apply_validators(response, etag, last_modified):
+    """给响应加上 ETag / Last-Modified，并要求客户端每次使用前重新验证"""
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def not_modified_response(etag, last_modified):
+    """304响应（无响应体）"""
+    return apply_validators(current_app.response_class(status=304), etag, last_modified)
+
+
+def conditional_get(version_func, salt_func=None):
+    """
+    普通路由函数的条件GET装饰器（BasePageView 已内置，不需要再用）
+    :param version_func: 与路由函数同参数，返回数据版本（table_version 结果列表）
+    :param salt_func: 返回区分不同用户/参数的字符串，默认用完整URL
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return func(*args, **kwargs)
+            salt = salt_func() if salt_func else request.full_path
+            etag, last_modified = make_validators(version_func(*args, **kwargs), salt)
+            if is_not_modified(etag, last_modified):
+                return not_modified_response(etag, last_modified)
+
+            response = make_response(func(*args, **kwargs))
+            if response.status_code == 200:
+                apply_validators(response, etag, last_modified)
+            return response
+        return wrapper
+    return decorator
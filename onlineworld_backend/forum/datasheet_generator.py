@@ -1,7 +1,13 @@
 import os
 import sys
 import json
-import requests
+import hashlib
+import logging
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from types import SimpleNamespace
+from functools import lru_cache
 from flask import current_app, jsonify, send_file
 from reportlab.lib.pagesizes import letter, landscape
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -10,27 +16,235 @@ from reportlab.lib import colors
 from reportlab.lib.units import inch
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfbase.cidfonts import UnicodeCIDFont
 from dotenv import load_dotenv
 from .models import Product, db
 
 # 添加项目根目录到路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import config
+from llm_client import llm_client
+from logging_setup import setup_logging
 
 # 加载环境变量
 load_dotenv()
 
-# 注册中文字体
-try:
-    # 注册黑体字体
-    simhei_path = 'C:\\Windows\\Fonts\\simhei.ttf'
-    if os.path.exists(simhei_path):
-        pdfmetrics.registerFont(TTFont('SimHei', simhei_path))
-    else:
-        # 如果系统字体不存在，尝试使用ReportLab内置字体
-        current_app.logger.warning("SimHei font not found, using default font")
-except Exception as e:
-    current_app.logger.error(f"Font registration failed: {str(e)}")
+logger = logging.getLogger(__name__)
+
+# 中文字体：优先使用黑体字体文件，找不到时使用ReportLab内置的宋体CID字体（不需要字体文件）
+SIMHEI_PATH = os.getenv("DATASHEET_FONT_PATH", 'C:\\Windows\\Fonts\\simhei.ttf')
+FALLBACK_FONT = 'STSong-Light'
+# 模板版本：修改PDF版式或提示词后加1，已生成的DataSheet指纹随之失效
+DATASHEET_TEMPLATE_VERSION = 1
+
+# 渲染进程池的启动方式：父进程（Web进程、批量脚本）里已经有日志队列线程、定时写回线程和请求线程，
+# fork 出的子进程会继承其他线程持有的锁，以及一个没有监听线程的日志队列（子进程的日志全部丢失），
+# 所以渲染进程一律以 spawn 方式启动，在 init_render_worker 中重新配置日志
+RENDER_MP_CONTEXT = multiprocessing.get_context("spawn")
+
+# 交给后台线程的产品字段快照（后台线程不访问ORM对象）
+SNAPSHOT_FIELDS = ("id", "name", "model", "description", "features", "specifications", "price")
+
+_font_name = None
+
+
+def register_fonts():
+    """
+    注册中文字体（每个进程只注册一次）
+    :return: 实际使用的字体名
+    """
+    global _font_name
+    if _font_name:
+        return _font_name
+    try:
+        if os.path.exists(SIMHEI_PATH):
+            # 注册黑体字体
+            pdfmetrics.registerFont(TTFont('SimHei', SIMHEI_PATH))
+            _font_name = 'SimHei'
+        else:
+            logger.warning("SimHei font not found, using %s", FALLBACK_FONT)
+            pdfmetrics.registerFont(UnicodeCIDFont(FALLBACK_FONT))
+            _font_name = FALLBACK_FONT
+    except Exception as e:
+        logger.error("Font registration failed: %s", e)
+        _font_name = 'Helvetica'
+    return _font_name
+
+
+def init_render_worker():
+    """渲染进程初始化：配置日志（字体回退等警告写到日志输出），注册字体、构建样式"""
+    setup_logging()
+    datasheet_styles()
+
+
+@lru_cache(maxsize=None)
+def datasheet_styles():
+    """DataSheet的段落样式（每个进程构建一次后复用）"""
+    font_name = register_fonts()
+    styles = getSampleStyleSheet()
+    return {
+        "title": ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=24,
+            textColor=colors.HexColor('#1a365d'),
+            spaceAfter=30,
+            fontName=font_name  # 中文字体
+        ),
+        "subtitle": ParagraphStyle(
+            'CustomSubtitle',
+            parent=styles['Heading2'],
+            fontSize=18,
+            textColor=colors.HexColor('#2d3748'),
+            spaceAfter=20,
+            fontName=font_name
+        ),
+        "normal": ParagraphStyle(
+            'CustomNormal',
+            parent=styles['Normal'],
+            fontSize=12,
+            leading=16,
+            spaceAfter=12,
+            fontName=font_name
+        ),
+        "bullet": ParagraphStyle(
+            'CustomBullet',
+            parent=styles['Normal'],
+            fontSize=12,
+            leading=16,
+            bulletIndent=15,
+            leftIndent=25,
+            spaceAfter=6,
+            fontName=font_name
+        ),
+        "footer": ParagraphStyle(
+            'CustomFooter',
+            parent=styles['Normal'],
+            fontSize=10,
+            textColor=colors.HexColor('#718096'),
+            alignment=1,  # 居中对齐
+            fontName=font_name
+        ),
+    }
+
+
+def datasheet_fingerprint(product):
+    """
+    DataSheet输入指纹：影响文案和PDF内容的产品字段 + 模板版本的SHA-256
+    :param product: Product对象（或具有相同字段的对象）
+    """
+    raw = json.dumps({
+        "name": product.name,
+        "model": product.model,
+        "description": product.description,
+        "features": product.features,
+        "specifications": product.specifications,
+        "price": product.price,
+        "template": DATASHEET_TEMPLATE_VERSION
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def product_snapshot(product):
+    """产品字段快照（可在线程/进程间传递）"""
+    return SimpleNamespace(**{field: getattr(product, field) for field in SNAPSHOT_FIELDS})
+
+
+def render_datasheet_pdf(content, output_path):
+    """
+    按生成好的文案排版PDF（纯CPU工作，不访问数据库和大模型，可以在进程池中执行）
+    先写临时文件再改名，下载方不会读到写了一半的文件
+    :param content: generate_datasheet_content 返回的字典
+    :param output_path: 输出文件路径
+    """
+    styles = datasheet_styles()
+    title_style = styles["title"]
+    subtitle_style = styles["subtitle"]
+    normal_style = styles["normal"]
+    bullet_style = styles["bullet"]
+    
+    # 创建PDF文档，使用横向布局
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    doc = SimpleDocTemplate(tmp_path, pagesize=landscape(letter))
+    elements = []
+    
+    # 添加标题
+    elements.append(Paragraph(f"{content['product_name']} 数据手册", title_style))
+    elements.append(Paragraph(f"型号: {content['product_model']}", subtitle_style))
+    elements.append(Spacer(1, 20))
+    
+    # 添加产品概述
+    elements.append(Paragraph("产品概述", subtitle_style))
+    elements.append(Paragraph(content['overview'], normal_style))
+    elements.append(Spacer(1, 20))
+    
+    # 添加产品特性
+    elements.append(Paragraph("产品特性", subtitle_style))
+    features_lines = content['features'].split('\n')
+    for line in features_lines:
+        if line.strip():
+            elements.append(Paragraph(line.strip(), bullet_style))
+    elements.append(Spacer(1, 20))
+    
+    # 添加技术规格
+    elements.append(Paragraph("技术规格", subtitle_style))
+    specs_data = []
+    for key, value in content['specifications'].items():
+        specs_data.append([Paragraph(key, normal_style), Paragraph(value, normal_style)])
+    
+    specs_table = Table(specs_data, colWidths=[2*inch, 4*inch])
+    specs_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#edf2f7')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#2d3748')),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
+    ]))
+    elements.append(specs_table)
+    elements.append(Spacer(1, 20))
+    
+    # 添加应用场景（如果有）
+    if content['applications']:
+        elements.append(Paragraph("应用场景", subtitle_style))
+        applications_lines = content['applications'].split('\n')
+        for line in applications_lines:
+            if line.strip():
+                elements.append(Paragraph(line.strip(), bullet_style))
+        elements.append(Spacer(1, 20))
+    
+    # 添加价格信息
+    if content['price']:
+        elements.append(Paragraph(f"建议零售价: ¥{content['price']}", normal_style))
+        elements.append(Spacer(1, 20))
+    
+    # 添加页脚
+    elements.append(Paragraph("© 2025 未来科技有限公司. 保留所有权利.", styles["footer"]))
+    
+    # 生成PDF
+    try:
+        doc.build(elements)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return output_path
+
+
+def timed_render_datasheet_pdf(content, output_path):
+    """排版PDF并返回耗时秒数（批量生成时在渲染进程中执行）"""
+    started = time.monotonic()
+    render_datasheet_pdf(content, output_path)
+    return time.monotonic() - started
+
+
+def datasheet_output_dir():
+    """DataSheet输出目录（不存在时创建）"""
+    output_dir = os.path.join(current_app.root_path, 'static', 'files', 'datasheets')
+    os.makedirs(output_dir, exist_ok=True)
+    return output_dir
 
 class DataSheetGenerator:
     def __init__(self):
@@ -44,25 +258,18 @@ class DataSheetGenerator:
         :param prompt: 提示词
         :return: AI生成的内容
         """
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-        data = {
-            "model": self.model_name,
-            "messages": [
-                {"role": "system", "content": "你是一名专业的产品文案撰写专家，擅长撰写技术产品的DataSheet内容。请保持专业、准确、简洁的风格。"},
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.7,
-            "max_tokens": 500
-        }
+        messages = [
+            {"role": "system", "content": "你是一名专业的产品文案撰写专家，擅长撰写技术产品的DataSheet内容。请保持专业、准确、简洁的风格。"},
+            {"role": "user", "content": prompt}
+        ]
         
         try:
-            response = requests.post(self.api_url, headers=headers, json=data, timeout=60)
-            response.raise_for_status()
-            result = response.json()
-            return result['choices'][0]['message']['content'].strip()
+            # 共享连接池客户端，网络错误/限流/5xx自动退避重试
+            return llm_client.chat_text(
+                messages, temperature=0.7, max_tokens=500, timeout=60,
+                api_url=self.api_url, api_key=self.api_key, model=self.model_name,
+                cache=False  # 重新生成（force）要拿到新的文案，不走响应缓存
+            )
         except Exception as e:
             current_app.logger.error(f"AI API调用失败: {str(e)}")
             # 如果AI调用失败，返回空字符串，后续使用默认内容
@@ -132,124 +339,54 @@ class DataSheetGenerator:
         :return: 是否生成成功
         """
         try:
-            # 获取AI生成的内容
+            # 获取AI生成的内容，再排版
             content = self.generate_datasheet_content(product)
-            
-            # 创建PDF文档，使用横向布局
-            doc = SimpleDocTemplate(output_path, pagesize=landscape(letter))
-            elements = []
-            
-            # 设置样式
-            styles = getSampleStyleSheet()
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=24,
-                textColor=colors.HexColor('#1a365d'),
-                spaceAfter=30,
-                fontName='SimHei'  # 添加中文字体
-            )
-            subtitle_style = ParagraphStyle(
-                'CustomSubtitle',
-                parent=styles['Heading2'],
-                fontSize=18,
-                textColor=colors.HexColor('#2d3748'),
-                spaceAfter=20,
-                fontName='SimHei'  # 添加中文字体
-            )
-            normal_style = ParagraphStyle(
-                'CustomNormal',
-                parent=styles['Normal'],
-                fontSize=12,
-                leading=16,
-                spaceAfter=12,
-                fontName='SimHei'  # 添加中文字体
-            )
-            bullet_style = ParagraphStyle(
-                'CustomBullet',
-                parent=styles['Normal'],
-                fontSize=12,
-                leading=16,
-                bulletIndent=15,
-                leftIndent=25,
-                spaceAfter=6,
-                fontName='SimHei'  # 添加中文字体
-            )
-            
-            # 添加标题
-            elements.append(Paragraph(f"{content['product_name']} 数据手册", title_style))
-            elements.append(Paragraph(f"型号: {content['product_model']}", subtitle_style))
-            elements.append(Spacer(1, 20))
-            
-            # 添加产品概述
-            elements.append(Paragraph("产品概述", subtitle_style))
-            elements.append(Paragraph(content['overview'], normal_style))
-            elements.append(Spacer(1, 20))
-            
-            # 添加产品特性
-            elements.append(Paragraph("产品特性", subtitle_style))
-            features_lines = content['features'].split('\n')
-            for line in features_lines:
-                if line.strip():
-                    elements.append(Paragraph(line.strip(), bullet_style))
-            elements.append(Spacer(1, 20))
-            
-            # 添加技术规格
-            elements.append(Paragraph("技术规格", subtitle_style))
-            specs_data = []
-            for key, value in content['specifications'].items():
-                specs_data.append([Paragraph(key, normal_style), Paragraph(value, normal_style)])
-            
-            specs_table = Table(specs_data, colWidths=[2*inch, 4*inch])
-            specs_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#edf2f7')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#2d3748')),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
-            ]))
-            elements.append(specs_table)
-            elements.append(Spacer(1, 20))
-            
-            # 添加应用场景（如果有）
-            if content['applications']:
-                elements.append(Paragraph("应用场景", subtitle_style))
-                applications_lines = content['applications'].split('\n')
-                for line in applications_lines:
-                    if line.strip():
-                        elements.append(Paragraph(line.strip(), bullet_style))
-                elements.append(Spacer(1, 20))
-            
-            # 添加价格信息
-            if content['price']:
-                elements.append(Paragraph(f"建议零售价: ¥{content['price']}", normal_style))
-                elements.append(Spacer(1, 20))
-            
-            # 添加页脚
-            footer_style = ParagraphStyle(
-                'CustomFooter',
-                parent=styles['Normal'],
-                fontSize=10,
-                textColor=colors.HexColor('#718096'),
-                alignment=1,  # 居中对齐
-                fontName='SimHei'  # 添加中文字体
-            )
-            elements.append(Paragraph("© 2025 未来科技有限公司. 保留所有权利.", footer_style))
-            
-            # 生成PDF
-            doc.build(elements)
+            render_datasheet_pdf(content, output_path)
             return True
         except Exception as e:
             current_app.logger.error(f"PDF生成失败: {str(e)}")
             return False
 
-    def generate_and_save_datasheet(self, product_id):
+    def output_file(self, product):
+        """
+        产品DataSheet的文件名和输出路径
+        :return: (文件名, 输出路径)
+        """
+        file_name = f"{product.model}_datasheet.pdf"
+        return file_name, os.path.join(datasheet_output_dir(), file_name)
+
+    def is_up_to_date(self, product, fingerprint=None):
+        """已生成的DataSheet是否仍然有效（指纹未变且文件存在）"""
+        fingerprint = fingerprint or datasheet_fingerprint(product)
+        if not product.datasheet_url or product.datasheet_hash != fingerprint:
+            return False
+        return os.path.isfile(self.output_file(product)[1])
+
+    def save_result(self, product, fingerprint, cached=False):
+        """
+        记录生成结果（datasheet_url 和输入指纹）
+        :param cached: 是否因为指纹未变而跳过了生成
+        :return: 包含文件路径和状态的字典
         """
-        生成并保存DataSheet
+        file_name, output_path = self.output_file(product)
+        if not cached:
+            product.datasheet_url = f"/static/files/datasheets/{file_name}"
+            product.datasheet_hash = fingerprint
+            db.session.commit()
+        return {
+            "success": True,
+            "message": "DataSheet已是最新，跳过生成" if cached else "DataSheet生成成功",
+            "file_path": output_path,
+            "datasheet_url": product.datasheet_url,
+            "file_name": file_name,
+            "cached": cached
+        }
+
+    def generate_and_save_datasheet(self, product_id, force=False):
+        """
+        生成并保存DataSheet（同步执行；Web请求中使用 datasheet_service 在后台生成）
         :param product_id: 产品ID
+        :param force: 为True时即使产品没有变化也重新生成
         :return: 包含文件路径和状态的字典
         """
         # 获取产品信息
@@ -257,78 +394,118 @@ class DataSheetGenerator:
         if not product:
             return {"success": False, "message": "产品不存在"}
         
-        # 创建输出目录
-        output_dir = os.path.join(current_app.root_path, 'static', 'files', 'datasheets')
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # 生成文件名
-        file_name = f"{product.model}_datasheet.pdf"
-        output_path = os.path.join(output_dir, file_name)
+        # 产品没有变化时直接返回已有文件
+        fingerprint = datasheet_fingerprint(product)
+        if not force and self.is_up_to_date(product, fingerprint):
+            return self.save_result(product, fingerprint, cached=True)
         
         # 生成PDF
-        if self.generate_pdf(product, output_path):
-            # 更新产品的datasheet_url
-            product.datasheet_url = f"/static/files/datasheets/{file_name}"
-            db.session.commit()
-            
-            return {
-                "success": True,
-                "message": "DataSheet生成成功",
-                "file_path": output_path,
-                "datasheet_url": product.datasheet_url,
-                "file_name": file_name
-            }
+        if self.generate_pdf(product, self.output_file(product)[1]):
+            return self.save_result(product, fingerprint)
         else:
             return {"success": False, "message": "DataSheet生成失败"}
 
-    def generate_all_datasheets(self):
+    def generate_all_datasheets(self, force=False, content_workers=None, render_workers=None, adopt_existing=False):
         """
         批量生成所有产品的DataSheet
-        :return: 生成结果的统计信息
+        1. 跳过没有变化的产品（指纹相同且文件存在）；没有指纹的产品（旧版本生成的文件）重新生成
+        2. 所有待生成产品的大模型文案并发获取
+        3. 每拿到一个产品的文案就提交到渲染进程池（spawn方式启动，启动时配置日志、预先注册字体、构建样式），文案获取和PDF排版重叠进行
+        :param force: 为True时全部重新生成
+        :param content_workers: 并发获取文案的线程数，默认 DATASHEET_CONTENT_WORKERS
+        :param render_workers: PDF渲染进程数，默认CPU核数
+        :param adopt_existing: 为True时已有文件、还没有指纹的产品不重新生成，直接记录当前指纹
+            （文件的实际输入无法确认，只在确定旧文件与当前产品数据一致时使用）
+        :return: 生成结果的统计信息，timings 为每个产品的文案/排版耗时（秒）
         """
+        started = time.monotonic()
         # 获取所有产品
         products = Product.query.all()
         total_count = len(products)
         if not products:
-            return {"success": True, "message": "没有找到产品", "total": 0, "generated": 0, "skipped": 0, "failed": 0}
-        
-        # 创建输出目录
-        output_dir = os.path.join(current_app.root_path, 'static', 'files', 'datasheets')
-        os.makedirs(output_dir, exist_ok=True)
+            return {"success": True, "message": "没有找到产品", "total": 0, "generated": 0, "skipped": 0, "failed": 0,
+                    "timings": [], "elapsed": 0.0}
         
         # 统计信息
         generated_count = 0
         skipped_count = 0
         failed_count = 0
+        timings = []
         
-        # 遍历所有产品
+        # 筛选需要生成的产品
+        pending = []
         for product in products:
-            # 生成文件名
-            file_name = f"{product.model}_datasheet.pdf"
-            output_path = os.path.join(output_dir, file_name)
+            fingerprint = datasheet_fingerprint(product)
+            if not force:
+                if self.is_up_to_date(product, fingerprint):
+                    skipped_count += 1
+                    continue
+                file_name, output_path = self.output_file(product)
+                if adopt_existing and product.datasheet_hash is None and os.path.isfile(output_path):
+                    product.datasheet_url = f"/static/files/datasheets/{file_name}"
+                    product.datasheet_hash = fingerprint
+                    skipped_count += 1
+                    continue
+            pending.append((product, fingerprint))
+        current_app.logger.info(f"DataSheet批量生成：共 {total_count} 个产品，需要生成 {len(pending)} 个，跳过 {skipped_count} 个")
+        
+        if pending:
+            app = current_app._get_current_object()
             
-            # 检查文件是否存在
-            if os.path.exists(output_path):
-                current_app.logger.info(f"DataSheet for product {product.name} ({product.model}) already exists, skipping.")
-                skipped_count += 1
-                continue
+            def fetch_content(snapshot):
+                # 线程中获取文案（generate_datasheet_content 需要应用上下文记录日志）
+                with app.app_context():
+                    fetch_started = time.monotonic()
+                    return self.generate_datasheet_content(snapshot), time.monotonic() - fetch_started
             
-            # 生成PDF
-            current_app.logger.info(f"Generating DataSheet for product {product.name} ({product.model})...")
-            if self.generate_pdf(product, output_path):
-                # 更新产品的datasheet_url
-                product.datasheet_url = f"/static/files/datasheets/{file_name}"
-                try:
-                    db.session.commit()
-                    generated_count += 1
-                    current_app.logger.info(f"DataSheet for product {product.name} ({product.model}) generated successfully.")
-                except Exception as e:
-                    current_app.logger.error(f"数据库更新失败: {str(e)}")
-                    db.session.rollback()
-                    failed_count += 1
-            else:
-                failed_count += 1
-                current_app.logger.error(f"Failed to generate DataSheet for product {product.name} ({product.model}).")
+            render_workers = min(render_workers or os.cpu_count() or 1, len(pending))
+            # 渲染进程以spawn方式启动并各自配置日志（见 RENDER_MP_CONTEXT），不继承本进程的日志队列和后台线程
+            with ProcessPoolExecutor(render_workers, mp_context=RENDER_MP_CONTEXT,
+                                     initializer=init_render_worker) as render_pool:
+                with ThreadPoolExecutor(content_workers or config.DATASHEET_CONTENT_WORKERS,
+                                        thread_name_prefix="datasheet-content") as content_pool:
+                    content_futures = {content_pool.submit(fetch_content, product_snapshot(product)): (product, fingerprint)
+                                       for product, fingerprint in pending}
+                    render_futures = {}
+                    waiting = set(content_futures)
+                    while waiting:
+                        done, waiting = wait(waiting, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            if future in content_futures:
+                                # 文案就绪：提交排版
+                                product, fingerprint = content_futures[future]
+                                try:
+                                    content, content_time = future.result()
+                                except Exception as e:
+                                    failed_count += 1
+                                    current_app.logger.error(f"获取DataSheet文案失败 {product.name} ({product.model}): {str(e)}")
+                                    continue
+                                render_future = render_pool.submit(timed_render_datasheet_pdf, content,
+                                                                   self.output_file(product)[1])
+                                render_futures[render_future] = (product, fingerprint, content_time)
+                                waiting.add(render_future)
+                                continue
+                            
+                            # 排版完成：记录结果和耗时
+                            product, fingerprint, content_time = render_futures[future]
+                            try:
+                                render_time = future.result()
+                            except Exception as e:
+                                failed_count += 1
+                                current_app.logger.error(f"Failed to generate DataSheet for product {product.name} ({product.model}): {str(e)}")
+                                continue
+                            product.datasheet_url = f"/static/files/datasheets/{self.output_file(product)[0]}"
+                            product.datasheet_hash = fingerprint
+                            generated_count += 1
+                            timings.append({
+                                "product_id": product.id,
+                                "model": product.model,
+                                "content": round(content_time, 3),
+                                "render": round(render_time, 3)
+                            })
+                            current_app.logger.info(
+                                f"[{generated_count + failed_count}/{len(pending)}] DataSheet for product {product.name} ({product.model}) "
+                                f"generated: 文案 {content_time:.2f}s，排版 {render_time:.2f}s")
         
         # 提交数据库更改
         try:
@@ -336,6 +513,9 @@ class DataSheetGenerator:
         except Exception as e:
             current_app.logger.error(f"最终数据库提交失败: {str(e)}")
             db.session.rollback()
+            return {"success": False, "message": f"数据库更新失败：{str(e)}", "total": total_count,
+                    "generated": 0, "skipped": skipped_count, "failed": failed_count + generated_count,
+                    "timings": timings, "elapsed": round(time.monotonic() - started, 3)}
         
         return {
             "success": True,
@@ -343,5 +523,7 @@ class DataSheetGenerator:
             "total": total_count,
             "generated": generated_count,
             "skipped": skipped_count,
-            "failed": failed_count
-        }
\ No newline at end of file
+            "failed": failed_count,
+            "timings": timings,
+            "elapsed": round(time.monotonic() - started, 3)
+        }
@@ -0,0 +1,213 @@
+"""
+DataSheet后台渲染服务
+- /api/datasheet/generate/<id> 不再在Web请求里同步调用大模型和排版PDF：提交后立即返回任务句柄（202），
+  通过 GET /api/datasheet/jobs/<job_id> 查询进度
+- 按输入指纹跳过重复生成：指纹（datasheet_fingerprint）与上次生成时记录的 Product.datasheet_hash 相同且文件存在时，
+  直接返回已有文件；同一产品同一指纹的任务正在执行时复用该任务
+- 大模型文案在后台线程中获取（等待网络），PDF排版在进程池中执行（CPU密集，不占用Web进程）；
+  渲染进程以spawn方式启动，启动时配置日志、预先注册字体、构建样式，之后每个PDF直接复用
+- 任务状态保存在 datasheet_job 表中：任意Web进程都能查询，进程重启后仍然可查；
+  执行任务的进程退出后，超过 JOB_STALE_SECONDS 没有进展的任务视为失败，重新提交即可
+- 查询任务状态是只读的（轮询接口不抢SQLite写锁）：过期与中断在查询时按时间判断，
+  提交新任务时才把中断的任务落库为失败、清理过期任务
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateColumn
+
+from config import Config
+from .models import DatasheetJob, Product, db
+from .datasheet_generator import (RENDER_MP_CONTEXT, DataSheetGenerator, datasheet_fingerprint, init_render_worker,
+                                  product_snapshot, render_datasheet_pdf)
+
+logger = logging.getLogger(__name__)
+
+# 已结束的任务保留秒数（超过后提交新任务时清理）
+JOB_RETENTION = 7 * 24 * 3600
+# 未结束的任务超过这个时间没有进展，视为执行进程已退出（文案获取+排版远小于这个时间）
+JOB_STALE_SECONDS = 600
+STALE_JOB_ERROR = "任务中断（执行进程已退出），请重新提交"
+
+
+def ensure_datasheet_columns(session):
+    """启动时检查（旧数据库升级）：为product表补建 datasheet_hash 列"""
+    connection = session.connection()
+    table = Product.__table__
+    existing = {column["name"] for column in sa_inspect(connection).get_columns(table.name)}
+    if "datasheet_hash" not in existing:
+        ddl = CreateColumn(table.c.datasheet_hash).compile(dialect=connection.dialect)
+        connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+    session.commit()
+
+
+class DatasheetRenderService:
+    """
+    DataSheet后台渲染服务（线程安全，进程内使用全局实例 datasheet_service）
+    :param render_workers: PDF渲染进程数
+    :param content_workers: 获取大模型文案的线程数
+    """
+
+    def __init__(self, render_workers=None, content_workers=None):
+        self.render_workers = render_workers or Config.DATASHEET_RENDER_WORKERS
+        self.content_workers = content_workers or Config.DATASHEET_CONTENT_WORKERS
+        self._lock = threading.Lock()
+        self._content_executor = None
+        self._render_pool = None
+
+    def _content_pool(self):
+        with self._lock:
+            if self._content_executor is None:
+                self._content_executor = ThreadPoolExecutor(self.content_workers,
+                                                            thread_name_prefix="datasheet-content")
+            return self._content_executor
+
+    def render_pool(self):
+        """PDF渲染进程池（首次使用时创建，spawn方式启动，见 RENDER_MP_CONTEXT）"""
+        with self._lock:
+            if self._render_pool is None:
+                self._render_pool = ProcessPoolExecutor(self.render_workers, mp_context=RENDER_MP_CONTEXT,
+                                                        initializer=init_render_worker)
+            return self._render_pool
+
+    def render(self, content, output_path):
+        """在渲染进程池中排版PDF，等待完成（渲染进程异常退出后重建进程池）"""
+        pool = self.render_pool()
+        try:
+            return pool.submit(render_datasheet_pdf, content, output_path).result()
+        except BrokenProcessPool:
+            with self._lock:
+                if self._render_pool is pool:
+                    self._render_pool = None
+            raise
+
+    def submit(self, product, force=False):
+        """
+        提交产品的DataSheet生成
+        :param product: Product对象
+        :param force: 为True时即使产品没有变化也重新生成
+        :return: (DatasheetJob, 已有结果)；产品没有变化时不创建任务，返回 (None, 结果字典)
+        """
+        generator = DataSheetGenerator()
+        fingerprint = datasheet_fingerprint(product)
+        if not force and generator.is_up_to_date(product, fingerprint):
+            return None, generator.save_result(product, fingerprint, cached=True)
+
+        snapshot = product_snapshot(product)
+        self._expire_jobs()
+        job = self._inflight_job(product.id, fingerprint)
+        if job is not None:
+            return job, None
+        job = DatasheetJob(job_id=uuid.uuid4().hex, product_id=product.id, fingerprint=fingerprint)
+        db.session.add(job)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # 其他进程/线程刚提交了同一产品同一指纹的任务，复用它
+            db.session.rollback()
+            job = self._inflight_job(product.id, fingerprint)
+            if job is not None:
+                return job, None
+            raise
+        app = current_app._get_current_object()
+        self._content_pool().submit(self._run, app, job.id, snapshot)
+        return job, None
+
+    def get_job(self, job_id):
+        """
+        按任务ID查询任务（只读，不写数据库）
+        :return: DatasheetJob，不存在或已超过保留时间返回None；执行进程已退出的任务按失败返回
+        """
+        job = DatasheetJob.query.filter_by(job_id=job_id).first()
+        if job is None:
+            return None
+        now = datetime.utcnow()
+        if job.finish_time and job.finish_time < now - timedelta(seconds=JOB_RETENTION):
+            return None
+        if job.status in ("pending", "running") and job.update_time < now - timedelta(seconds=JOB_STALE_SECONDS):
+            # 只修改返回的对象（先脱离会话，不会写回），下次提交任务时由 _expire_jobs 落库
+            db.session.expunge(job)
+            job.status = "error"
+            job.error = STALE_JOB_ERROR
+        return job
+
+    @staticmethod
+    def _inflight_job(product_id, fingerprint):
+        return DatasheetJob.query.filter(
+            DatasheetJob.product_id == product_id,
+            DatasheetJob.fingerprint == fingerprint,
+            DatasheetJob.status.in_(("pending", "running"))
+        ).first()
+
+    def _run(self, app, job_pk, snapshot):
+        """后台线程：获取文案 -> 进程池排版 -> 写回产品记录和任务状态"""
+        with app.app_context():
+            job = db.session.get(DatasheetJob, job_pk)
+            job.status = "running"
+            job.worker = f"{socket.gethostname()}-{os.getpid()}"
+            db.session.commit()
+            timings = {}
+            try:
+                generator = DataSheetGenerator()
+                started = time.monotonic()
+                content = generator.generate_datasheet_content(snapshot)
+                timings["content"] = round(time.monotonic() - started, 3)
+                job.timings = dict(timings)
+                db.session.commit()
+
+                started = time.monotonic()
+                self.render(content, generator.output_file(snapshot)[1])
+                timings["render"] = round(time.monotonic() - started, 3)
+
+                product = db.session.get(Product, job.product_id)
+                if product is None:
+                    raise ValueError("产品不存在")
+                job.result = generator.save_result(product, job.fingerprint)
+                job.status = "success"
+                job.error = None
+                logger.info("DataSheet生成完成: 产品%s，耗时 %s", job.product_id, timings)
+            except Exception as e:
+                db.session.rollback()
+                job = db.session.get(DatasheetJob, job_pk)
+                job.error = str(e)
+                job.status = "error"
+                logger.error("DataSheet生成失败: 产品%s: %s", job.product_id, e)
+            job.timings = timings
+            job.finish_time = datetime.utcnow()
+            db.session.commit()
+
+    @staticmethod
+    def _expire_jobs():
+        """把执行进程已退出的任务标记为失败，清理超过保留时间的已结束任务"""
+        now = datetime.utcnow()
+        table = DatasheetJob.__table__
+        db.session.execute(table.update().where(
+            table.c.status.in_(("pending", "running")),
+            table.c.update_time < now - timedelta(seconds=JOB_STALE_SECONDS)
+        ).values(status="error", error=STALE_JOB_ERROR, finish_time=now, update_time=now))
+        db.session.execute(table.delete().where(table.c.finish_time < now - timedelta(seconds=JOB_RETENTION)))
+        db.session.commit()
+
+    def close(self):
+        """等待在途任务完成并关闭线程池和进程池"""
+        with self._lock:
+            content_executor, render_pool = self._content_executor, self._render_pool
+            self._content_executor = self._render_pool = None
+        if content_executor is not None:
+            content_executor.shutdown(wait=True)
+        if render_pool is not None:
+            render_pool.shutdown(wait=True)
+
+
+# 全局DataSheet渲染服务
+datasheet_service = DatasheetRenderService()
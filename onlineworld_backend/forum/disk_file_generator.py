@@ -105,13 +105,14 @@ class DiskFileGenerator:
         # 返回相对于应用根目录的文件路径，使用Web标准的正斜杠
         return "/" + "/".join(["static", "files", "online_disk", full_file_name])
     
-    def generate_disk_file(self, content, file_name=None, file_extension="txt", password=None):
+    def generate_disk_file(self, content, file_name=None, file_extension="txt", password=None, commit=True):
         """
         核心方法：生成网盘文件并在数据库中注册
         :param content: 文件内容
         :param file_name: 文件名（可选，不带扩展名）
         :param file_extension: 文件扩展名（默认txt）
         :param password: 密码（可选，不提供则自动生成）
+        :param commit: 为False时只flush分享记录，由调用方提交（与调用方的其他写入放在同一事务）
         :return: 字典形式的分享信息（share_id, password, file_name等）
         :raises ValueError: 缺少必填参数或参数非法
         :raises SQLAlchemyError: 数据库存储异常
@@ -145,7 +146,10 @@ class DiskFileGenerator:
             )
             
             self.db.session.add(share_record)
-            self.db.session.commit()
+            if commit:
+                self.db.session.commit()
+            else:
+                self.db.session.flush()
             
             # 7. 返回分享信息
             return {
@@ -24,9 +24,19 @@ class Post(db.Model):
     create_time = db.Column(db.DateTime, default=datetime.utcnow)
     view_count = db.Column(db.Integer, default=0)  # 浏览量（拟真用）
     board_id = db.Column(db.Integer, db.ForeignKey("board.id"), nullable=False)
+    # 回帖计数（反范式，由post_counters随回帖增删同步，列表页无需再统计回帖）
+    reply_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    last_reply_time = db.Column(db.DateTime)  # 最新回帖时间，无回帖时为空
     # 关联回帖
     replies = db.relationship("Reply", backref="post", lazy=True, cascade="all, delete-orphan")
 
+    # 游标分页用的复合索引：板块页、个人主页、搜索都按 (create_time, id) 倒序翻页
+    __table_args__ = (
+        db.Index("ix_post_board_create_time", "board_id", "create_time", "id"),
+        db.Index("ix_post_author_create_time", "author", "create_time", "id"),
+        db.Index("ix_post_create_time", "create_time", "id"),
+    )
+
     def __repr__(self):
         return f"<Post {self.title}>"
 
@@ -36,15 +46,21 @@ class Reply(db.Model):
     content = db.Column(db.Text, nullable=False)  # 回帖内容（可藏线索）
     author = db.Column(db.String(50), default="匿名用户")  # 回帖人
     create_time = db.Column(db.DateTime, default=datetime.utcnow)
-    post_id = db.Column(db.Integer, db.ForeignKey("post.id"), nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey("post.id"), nullable=False, index=True)
     signature = db.Column(db.String(200))  # 签名档（可藏线索）
 
+    # 个人主页回帖列表的游标分页索引
+    __table_args__ = (
+        db.Index("ix_reply_author_create_time", "author", "create_time", "id"),
+    )
+
     def __repr__(self):
         return f"<Reply {self.id}>"
 
 # 玩家状态表（记录已访问页面、收集线索，匿名）
 class PlayerStatus(db.Model):
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))  # 匿名ID
+    # 以下三个JSON字段为旧版记录方式，已由player_visit表取代，仅保留兼容（启动时迁移到新表）
     visited_boards = db.Column(db.JSON, default=[])  # 已访问板块ID列表
     visited_posts = db.Column(db.JSON, default=[])  # 已访问帖子ID列表
     collected_clues = db.Column(db.JSON, default=[])  # 已收集线索ID（后续扩展用）
@@ -53,6 +69,23 @@ class PlayerStatus(db.Model):
     def __repr__(self):
         return f"<PlayerStatus {self.id}>"
 
+# 玩家访问记录表（已访问板块/帖子、已收集线索，每个实体一行）
+class PlayerVisit(db.Model):
+    __tablename__ = "player_visit"
+    __table_args__ = (
+        # 唯一索引：重复访问用 INSERT OR IGNORE 忽略，"是否访问过"和进度统计都走索引
+        db.UniqueConstraint("player_id", "entity_type", "entity_id", name="uq_player_visit"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    player_id = db.Column(db.String(36), db.ForeignKey("player_status.id"), nullable=False)
+    entity_type = db.Column(db.String(20), nullable=False)  # board / post / clue
+    entity_id = db.Column(db.Integer, nullable=False)
+    create_time = db.Column(db.DateTime, default=datetime.utcnow)  # 首次访问时间
+
+    def __repr__(self):
+        return f"<PlayerVisit {self.player_id} {self.entity_type}:{self.entity_id}>"
+
 # -------------------------- 新增：大模型动态页面模型 --------------------------
 class DynamicPage(db.Model):
     """大模型自动生成的动态网页模型"""
@@ -126,6 +159,7 @@ class Product(db.Model):
     specifications = db.Column(db.Text, nullable=False)  # 产品规格（JSON格式存储）
     category_id = db.Column(db.Integer, db.ForeignKey("product_category.id"), nullable=False)  # 所属分类
     datasheet_url = db.Column(db.String(200))  # DataSheet PDF地址
+    datasheet_hash = db.Column(db.String(64))  # 生成DataSheet时的输入指纹（产品没有变化时跳过重新生成）
     image_url = db.Column(db.String(200))  # 产品图片地址
     price = db.Column(db.Float)  # 产品价格
     stock = db.Column(db.Integer, default=0)  # 库存数量
@@ -381,6 +415,9 @@ class ShopCategory(db.Model):
 class ShopMerchant(db.Model):
     """商城商家/店铺模型（独立）"""
     __tablename__ = 'shop_merchant'
+    __table_args__ = (
+        db.Index('ix_shop_merchant_rating', 'rating', 'id'),  # 商家列表按评分游标分页
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String(100), nullable=False)  # 商家名称
@@ -426,6 +463,14 @@ class ShopMerchant(db.Model):
 class ShopProduct(db.Model):
     """商城商品模型（独立）"""
     __tablename__ = 'shop_product'
+    __table_args__ = (
+        db.Index('ix_shop_product_create_time', 'create_time', 'id'),  # 商品列表按上架时间游标分页
+        db.Index('ix_shop_product_merchant_create_time', 'merchant_id', 'create_time', 'id'),
+        # 商品列表按价格/销量/评分排序时的游标分页
+        db.Index('ix_shop_product_price', 'price', 'id'),
+        db.Index('ix_shop_product_sold_count', 'sold_count', 'id'),
+        db.Index('ix_shop_product_rating', 'rating', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String(200), nullable=False)  # 商品名称
@@ -448,6 +493,13 @@ class ShopProduct(db.Model):
 
     def __repr__(self):
         return f"<ShopProduct {self.name}>"
+
+    @property
+    def thumbnail_url(self):
+        """列表页用的缩略图地址（/api/images 提供的图片取256像素WebP缩略图，其他地址原样返回）"""
+        if self.image_url and self.image_url.startswith('/api/images/'):
+            return f"{self.image_url}?size=small"
+        return self.image_url
     
     def to_dict(self):
         """转换为字典格式"""
@@ -456,6 +508,7 @@ class ShopProduct(db.Model):
             "name": self.name,
             "description": self.description,
             "image_url": self.image_url,
+            "thumbnail_url": self.thumbnail_url,
             "price": self.price,
             "original_price": self.original_price,
             "stock": self.stock,
@@ -508,6 +561,9 @@ class OnlineDiskShare(db.Model):
 class SearchIndex(db.Model):
     """搜索引擎索引表，存储所有可搜索的页面标题"""
     __tablename__ = 'search_index'
+    __table_args__ = (
+        db.Index('ix_search_index_entity', 'entity_type', 'entity_id'),  # 增量索引按实体定位记录
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     title = db.Column(db.String(200), nullable=False)  # 页面标题（搜索索引）
@@ -530,4 +586,135 @@ class SearchIndex(db.Model):
             "url": self.url,
             "create_time": self.create_time.strftime("%Y-%m-%d %H:%M:%S"),
             "update_time": self.update_time.strftime("%Y-%m-%d %H:%M:%S")
-        }
\ No newline at end of file
+        }
+class SearchPosting(db.Model):
+    """搜索倒排索引表（posting list），每行记录一个词元在某条SearchIndex标题中的出现情况"""
+    __tablename__ = 'search_posting'
+    __table_args__ = (
+        db.Index('ix_search_posting_token_index', 'token', 'index_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    token = db.Column(db.String(20), nullable=False)  # 词元（单字/二元组，已转小写）
+    index_id = db.Column(db.Integer, db.ForeignKey('search_index.id'), nullable=False, index=True)  # 对应SearchIndex的ID
+    tf = db.Column(db.Integer, default=1)  # 词频（该词元在标题中出现的次数）
+    doc_len = db.Column(db.Integer, default=0)  # 标题长度（BM25长度归一化用）
+    
+    def __repr__(self):
+        return f"<SearchPosting {self.token} -> {self.index_id}>"
+
+# ===================== 调度AI任务队列模型 =====================
+
+class AIJob(db.Model):
+    """调度AI任务（/api/ai/schedule 提交的任务，由独立的worker进程领取执行）"""
+    __tablename__ = 'ai_job'
+    __table_args__ = (
+        db.Index('ix_ai_job_status_id', 'status', 'id'),  # worker按提交顺序领取待执行任务
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    job_id = db.Column(db.String(32), unique=True, nullable=False)  # 对外的任务ID
+    task = db.Column(db.Text, nullable=False)  # 任务描述
+    parameters = db.Column(db.JSON, default=dict)  # 合并到每个步骤的参数
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending / running / success / error
+    plan = db.Column(db.JSON)  # 生成的执行计划（生成一次后保存，恢复执行时复用）
+    result = db.Column(db.JSON)  # 执行结果 {步骤ID: 结果}
+    error = db.Column(db.Text)  # 最后一次失败的错误信息
+    attempts = db.Column(db.Integer, nullable=False, default=0)  # 已执行次数
+    worker = db.Column(db.String(100))  # 领取该任务的worker
+    lease_until = db.Column(db.DateTime)  # 租约到期时间，worker崩溃后过期的running任务会被重新领取
+    available_at = db.Column(db.DateTime)  # 失败后退避到这个时间才能再次领取，为空表示立即可领取
+    create_time = db.Column(db.DateTime, default=datetime.utcnow)
+    update_time = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finish_time = db.Column(db.DateTime)
+    
+    steps = db.relationship('AIJobStep', backref='job', lazy='dynamic', cascade='all, delete-orphan')
+    
+    def __repr__(self):
+        return f"<AIJob {self.job_id} {self.status}>"
+    
+    def to_dict(self):
+        """转换为字典格式（不含结果，结果走单独的接口）"""
+        total_steps = len((self.plan or {}).get("steps", []))
+        checkpoints = self.steps.all()
+        return {
+            "job_id": self.job_id,
+            "task": self.task,
+            "status": self.status,
+            "attempts": self.attempts,
+            "error": self.error,
+            "progress": {"completed": len(checkpoints), "total": total_steps},
+            "timings": {step.step_id: step.timing for step in checkpoints},
+            "create_time": self.create_time.strftime("%Y-%m-%d %H:%M:%S"),
+            "update_time": self.update_time.strftime("%Y-%m-%d %H:%M:%S"),
+            "finish_time": self.finish_time.strftime("%Y-%m-%d %H:%M:%S") if self.finish_time else None
+        }
+
+class AIJobStep(db.Model):
+    """任务步骤检查点：每完成一个步骤写一行，任务失败后重新执行时跳过已完成的步骤"""
+    __tablename__ = 'ai_job_step'
+    __table_args__ = (
+        db.UniqueConstraint('job_id', 'step_id', name='uq_ai_job_step'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('ai_job.id'), nullable=False)
+    step_id = db.Column(db.String(50), nullable=False)  # 计划中的步骤ID（如 step_1）
+    result = db.Column(db.JSON)  # 步骤结果（即资源池中的资源）
+    timing = db.Column(db.JSON)  # 耗时信息
+    create_time = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<AIJobStep {self.job_id}:{self.step_id}>"
+
+class DatasheetJob(db.Model):
+    """DataSheet生成任务（/api/datasheet/generate 提交，任意Web进程都能查询进度，重启后仍可查询）"""
+    __tablename__ = 'datasheet_job'
+    __table_args__ = (
+        # 同一产品同一指纹同时只有一个未结束的任务，多个Web进程并发提交时由数据库去重
+        db.Index('uq_datasheet_job_inflight', 'product_id', 'fingerprint', unique=True,
+                 sqlite_where=db.text("status IN ('pending', 'running')")),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    job_id = db.Column(db.String(32), unique=True, nullable=False)  # 对外的任务ID
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False)  # 提交时的输入指纹
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending / running / success / error
+    result = db.Column(db.JSON)  # 生成结果（文件信息）
+    error = db.Column(db.Text)  # 失败原因
+    timings = db.Column(db.JSON, default=dict)  # 各阶段耗时 {content: 秒, render: 秒}
+    worker = db.Column(db.String(100))  # 执行该任务的进程
+    create_time = db.Column(db.DateTime, default=datetime.utcnow)
+    update_time = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finish_time = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f"<DatasheetJob {self.job_id} {self.status}>"
+
+    def to_dict(self):
+        """转换为字典格式"""
+        return {
+            "job_id": self.job_id,
+            "product_id": self.product_id,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "timings": self.timings or {},
+            "create_time": self.create_time.strftime("%Y-%m-%d %H:%M:%S"),
+            "finish_time": self.finish_time.strftime("%Y-%m-%d %H:%M:%S") if self.finish_time else None
+        }
+
+class CacheVersion(db.Model):
+    """响应缓存的表写入版本号（存在数据库里，Web进程、生成器进程、任务worker共享同一份版本号）"""
+    __tablename__ = 'cache_version'
+
+    table_name = db.Column(db.String(100), primary_key=True)  # 被写入的表名
+    version = db.Column(db.Integer, nullable=False, default=0)  # 写入版本号，每次有ORM写入的flush+1
+
+    def __repr__(self):
+        return f"<CacheVersion {self.table_name}={self.version}>"
+
+# 注册倒排索引、回帖计数的同步监听器（放在模型定义之后，避免循环导入）
+from . import search_index  # noqa: E402,F401
+from . import post_counters  # noqa: E402,F401
@@ -0,0 +1,139 @@
+"""
+游标分页（keyset pagination）
+列表按 (排序列..., id) 排序，游标记录上一页最后一条的排序键，下一页用
+WHERE (排序列, id) < (游标值) 直接从复合索引定位，不需要OFFSET，翻到多深都只扫描 limit+1 行。
+
+接口约定：
+- 请求参数 cursor（上一页返回的next_cursor，首页不传）、limit（每页条数，默认20，最大100）
+- 响应中附带 {"next_cursor": ..., "has_more": ..., "limit": ...}，next_cursor为空表示没有下一页
+"""
+import base64
+import json
+from datetime import datetime
+
+from flask import request
+from sqlalchemy import literal, tuple_
+
+DEFAULT_PAGE_LIMIT = 20
+MAX_PAGE_LIMIT = 100
+
+
+class InvalidCursor(ValueError):
+    """分页游标被篡改或与当前列表不匹配"""
+
+
+def encode_cursor(values):
+    """排序键 -> 不透明的URL安全游标字符串（datetime转为ISO格式）"""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    游标字符串 -> 排序键列表（datetime仍为ISO字符串，由调用方按列类型还原）
+    游标被篡改或格式不对时抛出InvalidCursor
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw.decode("utf-8"))
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor("无效的分页游标")
+    if not isinstance(values, list):
+        raise InvalidCursor("无效的分页游标")
+    return values
+
+
+def get_page_args(prefix="", default_limit=DEFAULT_PAGE_LIMIT):
+    """
+    从请求参数读取游标和每页条数
+    :param prefix: 参数名前缀，同一页面有多个列表时区分（如 "post_" 读取 post_cursor / post_limit）
+    :return: (cursor, limit)
+    """
+    cursor = request.args.get(f"{prefix}cursor") or None
+    limit = request.args.get(f"{prefix}limit", default_limit, type=int)
+    return cursor, max(1, min(limit, MAX_PAGE_LIMIT))
+
+
+class KeysetPage:
+    """一页查询结果"""
+
+    def __init__(self, items, next_cursor, limit):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.limit = limit
+
+    @property
+    def has_more(self):
+        return self.next_cursor is not None
+
+    def to_dict(self):
+        return {"next_cursor": self.next_cursor, "has_more": self.has_more, "limit": self.limit}
+
+
+def _restore_value(column, value):
+    """游标里的值按列类型还原（目前只有DateTime需要）"""
+    if value is not None and column.type.python_type is datetime:
+        try:
+            return datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise InvalidCursor("无效的分页游标")
+    return value
+
+
+def keyset_paginate(query, columns, cursor=None, limit=DEFAULT_PAGE_LIMIT, descending=True):
+    """
+    对ORM查询做游标分页（会覆盖查询原有的order_by）
+    :param query: 已加好过滤条件的查询
+    :param columns: 排序列，最后一列必须唯一（通常是主键id），如 (Post.create_time, Post.id)
+    :param cursor: 上一页的next_cursor，None表示第一页
+    :param limit: 每页条数
+    :param descending: True为倒序（最新在前）
+    :return: KeysetPage
+    """
+    columns = list(columns)
+    query = query.order_by(None).order_by(*[c.desc() if descending else c.asc() for c in columns])
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(columns):
+            raise InvalidCursor("无效的分页游标")
+        bound = tuple_(*[literal(_restore_value(c, v), type_=c.type) for c, v in zip(columns, values)])
+        key = tuple_(*columns)
+        query = query.filter(key < bound if descending else key > bound)
+
+    # 多取一条用于判断是否还有下一页
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], c.key) for c in columns])
+    return KeysetPage(rows, next_cursor, limit)
+
+
+def keyset_slice(keyed_items, cursor=None, limit=DEFAULT_PAGE_LIMIT):
+    """
+    对已在内存中按排序键升序排好的结果做游标分页（如搜索引擎按相关度排序的结果）
+    :param keyed_items: [(排序键元组, 对象), ...]，排序键须唯一且只含JSON可序列化的值
+    :return: KeysetPage
+    """
+    start = 0
+    if cursor:
+        after = tuple(decode_cursor(cursor))
+        try:
+            start = next((i for i, (key, _) in enumerate(keyed_items) if key > after), len(keyed_items))
+        except TypeError:
+            raise InvalidCursor("无效的分页游标")
+    page = keyed_items[start:start + limit]
+    next_cursor = None
+    if start + limit < len(keyed_items):
+        next_cursor = encode_cursor(page[-1][0])
+    return KeysetPage([item for _, item in page], next_cursor, limit)
+
+
+def ensure_pagination_indexes(session, models):
+    """启动时为已有表补建分页用的复合索引（create_all不会给已有表加索引）"""
+    connection = session.connection()
+    for model in models:
+        for index in model.__table__.indexes:
+            index.create(connection, checkfirst=True)
+    session.commit()
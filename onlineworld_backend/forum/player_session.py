@@ -0,0 +1,124 @@
+"""
+匿名玩家会话
+玩家ID保存在Flask签名cookie里，进程内用LRU记住已确认存在的玩家，
+读页面时不再查询PlayerStatus；last_visit先记在内存里，定时批量写回（write-behind），
+同一玩家在一个写回周期内无论访问多少次只写一次。
+"""
+import atexit
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from flask import session
+from sqlalchemy import bindparam, update
+
+from .models import db, PlayerStatus
+
+# last_visit写回周期（秒）：每个玩家每个周期最多写一次
+TOUCH_INTERVAL = 60
+# LRU最多记住的玩家数
+MAX_TRACKED_PLAYERS = 10000
+
+
+class PlayerSessionTracker:
+    """
+    匿名玩家会话跟踪（线程安全）
+    :param touch_interval: last_visit写回周期（秒）
+    :param max_players: LRU容量
+    """
+
+    def __init__(self, touch_interval=TOUCH_INTERVAL, max_players=MAX_TRACKED_PLAYERS):
+        self.touch_interval = touch_interval
+        self.max_players = max_players
+        self._known = OrderedDict()  # 已确认存在于数据库的玩家ID（LRU）
+        self._pending = {}  # {玩家ID: 待写回的last_visit}
+        self._lock = threading.Lock()
+        self._engine = None
+        self._timer = None
+
+    def init_app(self, app):
+        """绑定数据库引擎并启动定时写回线程，进程退出前写回剩余的last_visit"""
+        with app.app_context():
+            self._engine = db.engine
+        if self._timer is None:
+            self._timer = threading.Thread(target=self._run_timer, name="player-session-flush", daemon=True)
+            self._timer.start()
+            atexit.register(self.flush)
+
+    def current_player_id(self):
+        """
+        获取当前请求的玩家ID，不存在或已失效时新建匿名玩家
+        已知玩家只在内存里记一次访问，不访问数据库
+        :return: 玩家ID
+        """
+        player_id = session.get("player_id")
+        if player_id and self._is_known(player_id):
+            self._touch(player_id)
+            return player_id
+
+        # 本进程第一次见到该玩家（或LRU已淘汰）：确认一次数据库里确实存在
+        if player_id and db.session.query(PlayerStatus.id).filter_by(id=player_id).first():
+            self._remember(player_id)
+            self._touch(player_id)
+            return player_id
+
+        # 新建匿名玩家（last_visit由默认值写入，无需再记访问）
+        player = PlayerStatus()
+        db.session.add(player)
+        db.session.commit()
+        session["player_id"] = player.id
+        self._remember(player.id)
+        return player.id
+
+    def _is_known(self, player_id):
+        with self._lock:
+            if player_id not in self._known:
+                return False
+            self._known.move_to_end(player_id)
+            return True
+
+    def _remember(self, player_id):
+        with self._lock:
+            self._known[player_id] = True
+            self._known.move_to_end(player_id)
+            while len(self._known) > self.max_players:
+                self._known.popitem(last=False)
+
+    def _touch(self, player_id):
+        with self._lock:
+            self._pending[player_id] = datetime.utcnow()
+
+    def flush(self):
+        """把待写回的last_visit批量写入数据库（一条executemany的UPDATE）"""
+        if self._engine is None:
+            return 0
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        table = PlayerStatus.__table__
+        stmt = update(table).where(table.c.id == bindparam("b_id")).values(last_visit=bindparam("b_last_visit"))
+        try:
+            with self._engine.begin() as connection:
+                connection.execute(stmt, [
+                    {"b_id": player_id, "b_last_visit": last_visit} for player_id, last_visit in pending.items()
+                ])
+        except Exception as e:
+            # 写回失败时放回缓冲（期间更新的访问时间优先）
+            with self._lock:
+                for player_id, last_visit in pending.items():
+                    self._pending.setdefault(player_id, last_visit)
+            print(f"❌ 玩家访问时间写回失败，稍后重试: {str(e)}")
+            return 0
+        return len(pending)
+
+    def _run_timer(self):
+        while True:
+            time.sleep(self.touch_interval)
+            self.flush()
+
+
+# 全局玩家会话跟踪
+player_sessions = PlayerSessionTracker()
@@ -0,0 +1,87 @@
+"""
+玩家访问记录（已访问板块/帖子、已收集线索）
+每个 (玩家, 实体类型, 实体ID) 在player_visit表中一行，唯一索引保证不重复：
+- 是否访问过：按唯一索引点查，不再反序列化整段JSON数组做O(n)判断
+- 记录访问：INSERT OR IGNORE，只追加一行，不再整段重写JSON
+"""
+from sqlalchemy import String, and_, or_, select, type_coerce
+from sqlalchemy.dialects.sqlite import insert
+
+from .models import PlayerStatus, PlayerVisit
+
+# 实体类型
+VISIT_BOARD = "board"
+VISIT_POST = "post"
+VISIT_CLUE = "clue"
+
+# 旧版PlayerStatus的JSON字段 -> 实体类型（启动时迁移用）
+LEGACY_JSON_FIELDS = {
+    "visited_boards": VISIT_BOARD,
+    "visited_posts": VISIT_POST,
+    "collected_clues": VISIT_CLUE,
+}
+
+
+def has_visited(session, player_id, entity_type, entity_id):
+    """玩家是否访问过某个实体（唯一索引点查）"""
+    table = PlayerVisit.__table__
+    stmt = select(table.c.id).where(
+        table.c.player_id == player_id,
+        table.c.entity_type == entity_type,
+        table.c.entity_id == entity_id
+    ).limit(1)
+    return session.execute(stmt).first() is not None
+
+
+def record_visit(session, player_id, entity_type, entity_id):
+    """
+    记录一次访问（已访问过则什么都不写，不提交事务）
+    先做一次只读点查，绝大多数重复访问不会开写事务；并发下的重复插入由 INSERT OR IGNORE 兜底
+    :return: 是否为首次访问
+    """
+    if has_visited(session, player_id, entity_type, entity_id):
+        return False
+    stmt = insert(PlayerVisit.__table__).values(
+        player_id=player_id, entity_type=entity_type, entity_id=entity_id
+    ).on_conflict_do_nothing(index_elements=["player_id", "entity_type", "entity_id"])
+    return session.execute(stmt).rowcount > 0
+
+
+def _has_legacy_records():
+    """PlayerStatus旧JSON字段里还有记录（迁移后会清空为 []，新玩家也是 []）"""
+    return or_(*(
+        and_(column.isnot(None), type_coerce(column, String) != "[]")
+        for column in (getattr(PlayerStatus, field) for field in LEGACY_JSON_FIELDS)
+    ))
+
+
+def ensure_player_visits(session):
+    """
+    启动时检查（旧数据库升级）：把PlayerStatus旧JSON字段里的记录迁移到player_visit表，迁移过的玩家清空旧字段，
+    之后启动时只有一条 LIMIT 1 的检查，不再逐个读取玩家记录
+    :return: 迁移的行数
+    """
+    legacy = _has_legacy_records()
+    if session.query(PlayerStatus.id).filter(legacy).first() is None:
+        return 0
+
+    rows = []
+    player_ids = []
+    for player in session.query(PlayerStatus).filter(legacy).all():
+        player_ids.append(player.id)
+        for field, entity_type in LEGACY_JSON_FIELDS.items():
+            for entity_id in dict.fromkeys(getattr(player, field) or []):
+                rows.append({"player_id": player.id, "entity_type": entity_type, "entity_id": entity_id})
+
+    if rows:
+        stmt = insert(PlayerVisit.__table__).on_conflict_do_nothing(
+            index_elements=["player_id", "entity_type", "entity_id"]
+        )
+        session.execute(stmt, rows)
+    # 与迁移写入同一事务清空旧字段，作为"已迁移"的标记
+    session.query(PlayerStatus).filter(PlayerStatus.id.in_(player_ids)).update(
+        {getattr(PlayerStatus, field): [] for field in LEGACY_JSON_FIELDS}, synchronize_session=False
+    )
+    session.commit()
+    print(f"🔄 已把旧版访问记录迁移到player_visit表：{len(rows)} 条")
+    return len(rows)
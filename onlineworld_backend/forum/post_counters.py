@@ -0,0 +1,112 @@
+"""
+帖子回帖计数（反范式字段）
+Post.reply_count / Post.last_reply_time 由Reply的增删改事件在同一事务内维护，
+板块页、个人主页等列表直接读取这两个字段，不再逐帖统计回帖（避免N+1和加载全部回帖）。
+"""
+from sqlalchemy import case, event, func, inspect as sa_inspect, select, update
+from sqlalchemy.schema import CreateColumn
+
+from .models import Post, Reply
+
+# 需要补建的反范式字段（create_all不会给已有表加列）
+COUNTER_COLUMNS = ("reply_count", "last_reply_time")
+
+
+def _reply_stats_values(post_id_column):
+    """按回帖表重新计算计数的相关子查询"""
+    reply = Reply.__table__
+    return {
+        "reply_count": select(func.count(reply.c.id))
+        .where(reply.c.post_id == post_id_column).scalar_subquery(),
+        "last_reply_time": select(func.max(reply.c.create_time))
+        .where(reply.c.post_id == post_id_column).scalar_subquery(),
+    }
+
+
+def _recount_post(connection, post_id):
+    """
+    重新统计某个帖子的回帖数和最新回帖时间
+    删除/移动回帖后最新回帖时间无法增量推算，只能回表（reply.post_id有索引，只扫该帖回帖）
+    """
+    post = Post.__table__
+    connection.execute(
+        update(post).where(post.c.id == post_id).values(**_reply_stats_values(post.c.id))
+    )
+
+
+def _after_reply_insert(mapper, connection, target):
+    """新增回帖：计数+1，最新回帖时间取较大值"""
+    post = Post.__table__
+    reply_time = target.create_time
+    connection.execute(
+        update(post).where(post.c.id == target.post_id).values(
+            reply_count=func.coalesce(post.c.reply_count, 0) + 1,
+            last_reply_time=case(
+                (post.c.last_reply_time.is_(None), reply_time),
+                (post.c.last_reply_time < reply_time, reply_time),
+                else_=post.c.last_reply_time
+            )
+        )
+    )
+
+
+def _after_reply_update(mapper, connection, target):
+    """回帖换帖或修改时间：重新统计涉及的帖子"""
+    state = sa_inspect(target)
+    post_history = state.attrs.post_id.history
+    if not post_history.has_changes() and not state.attrs.create_time.history.has_changes():
+        return  # 只改了内容/签名，不影响计数
+    post_ids = {target.post_id}
+    post_ids.update(post_id for post_id in post_history.deleted if post_id is not None)
+    for post_id in post_ids:
+        _recount_post(connection, post_id)
+
+
+def _after_reply_delete(mapper, connection, target):
+    """删除回帖（包括随帖子/板块级联删除）：重新统计所属帖子"""
+    _recount_post(connection, target.post_id)
+
+
+def _load_previous_post_id(target, value, oldvalue, initiator):
+    """仅用于 active_history：回帖属性已过期（如提交后）再换帖时，先加载原帖子ID，换帖后才能重新统计原帖"""
+
+
+event.listen(Reply.post_id, "set", _load_previous_post_id, active_history=True)
+event.listen(Reply, "after_insert", _after_reply_insert)
+event.listen(Reply, "after_update", _after_reply_update)
+event.listen(Reply, "after_delete", _after_reply_delete)
+
+
+# -------------------------- 迁移与对账 --------------------------
+def backfill_post_counters(session):
+    """
+    用一条UPDATE按回帖表回填全部帖子的计数（不提交事务）
+    :return: 更新的帖子数
+    """
+    post = Post.__table__
+    result = session.connection().execute(update(post).values(**_reply_stats_values(post.c.id)))
+    return result.rowcount
+
+
+def ensure_post_counters(session):
+    """
+    启动时检查（旧数据库升级）：
+    1. 为post表补建 reply_count / last_reply_time 列，并为reply.post_id补建索引
+    2. 新加列时回填一次计数
+    """
+    connection = session.connection()
+    existing = {column["name"] for column in sa_inspect(connection).get_columns(Post.__tablename__)}
+    missing = [name for name in COUNTER_COLUMNS if name not in existing]
+    for name in missing:
+        ddl = CreateColumn(Post.__table__.c[name]).compile(dialect=connection.dialect)
+        connection.exec_driver_sql(f"ALTER TABLE {Post.__tablename__} ADD COLUMN {ddl}")
+    for index in Reply.__table__.indexes:
+        index.create(connection, checkfirst=True)
+    session.commit()
+
+    if not missing:
+        return 0
+    total = backfill_post_counters(session)
+    session.commit()
+    print(f"🔄 已为现有帖子回填回帖计数：{total} 个帖子")
+    return total
@@ -0,0 +1,222 @@
+"""
+读多写少页面的响应缓存
+- 后端可插拔（只存缓存项）：默认进程内LRU+TTL；配置 RESPONSE_CACHE_URL=redis://... 时使用Redis兼容服务（多进程共享）
+- 缓存键 = 端点名 + 参数 + 依赖表的"版本号"
+- 失效：任何会话对某张表有ORM写入（增删改）时，flush后在同一事务里把 cache_version 表中该表的版本号+1，
+  依赖它的缓存键自然失效，不需要逐个删除缓存项。版本号存在数据库里，与数据一起提交、一起回滚，
+  生成器进程和任务worker的写入同样能让所有Web进程的缓存立即失效（与缓存后端无关）
+- 绕过ORM的Core批量写（如浏览量缓冲写回）不触发失效，这类数据依赖TTL兜底
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, has_request_context, request, Response
+from sqlalchemy import event, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from .models import CacheVersion, db
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# 默认缓存时间（秒）
+DEFAULT_TTL = 300
+# 进程内缓存最多保留的条目数
+MAX_ENTRIES = 1024
+
+
+class MemoryCacheBackend:
+    """进程内 LRU + TTL 缓存（线程安全）"""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # {key: (过期时间, 值)}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCacheBackend:
+    """Redis兼容服务作为缓存后端（值以JSON存储，过期交给Redis）"""
+
+    def __init__(self, url, prefix="rc:"):
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self._client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self._client.set(self.prefix + key, json.dumps(value, ensure_ascii=False), ex=int(ttl))
+
+    def clear(self):
+        for key in self._client.scan_iter(f"{self.prefix}*"):
+            self._client.delete(key)
+
+
+class ResponseCache:
+    """按端点+参数缓存视图数据，依赖表有写入时自动失效"""
+
+    def __init__(self):
+        self.backend = MemoryCacheBackend()
+        self.default_ttl = DEFAULT_TTL
+
+    def init_app(self, app):
+        """
+        根据配置选择后端：
+        RESPONSE_CACHE_URL 为空用进程内缓存，redis:// 开头用Redis；RESPONSE_CACHE_TTL 为默认缓存秒数
+        """
+        self.default_ttl = app.config.get("RESPONSE_CACHE_TTL", DEFAULT_TTL)
+        url = app.config.get("RESPONSE_CACHE_URL")
+        if not url:
+            return
+        if redis is None:
+            print("⚠️  未安装redis库，响应缓存退回进程内LRU")
+            return
+        try:
+            backend = RedisCacheBackend(url)
+            backend.get("ping")
+            self.backend = backend
+        except Exception as e:
+            print(f"⚠️  无法连接缓存服务 {url}，响应缓存退回进程内LRU: {str(e)}")
+
+    @staticmethod
+    def read_versions(tables, session=None):
+        """
+        从 cache_version 表读取各表当前的写入版本号（读取失败时抛出异常）
+        :param session: 数据库会话，默认 db.session（需要应用上下文）
+        :return: 与 tables 顺序一致的版本号列表，没有写入过的表为0
+        """
+        if not tables:
+            return []
+        table = CacheVersion.__table__
+        rows = dict((session or db.session).execute(
+            select(table.c.table_name, table.c.version).where(table.c.table_name.in_(tables))
+        ).all())
+        return [rows.get(name, 0) for name in tables]
+
+    def table_versions(self, tables):
+        """各表当前的写入版本号（读取失败时返回空列表，不影响调用方）"""
+        try:
+            return self.read_versions(tables)
+        except Exception as e:
+            print(f"❌ 读取缓存版本号失败: {str(e)}")
+            return []
+
+    def cached(self, name, models, ttl=None, vary_on_query=False):
+        """
+        缓存装饰器，可用于 BasePageView.get_data（缓存返回的字典）和直接返回jsonify的路由函数
+        （只缓存200响应；返回 (响应, 状态码) 元组的错误分支不缓存）
+        :param name: 缓存名（端点标识）
+        :param models: 数据来源的模型类，任一模型有写入时缓存失效
+        :param ttl: 缓存秒数，默认取 RESPONSE_CACHE_TTL
+        :param vary_on_query: 是否把URL查询参数纳入缓存键
+        """
+        tables = sorted(model.__table__.name for model in models)
+
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                try:
+                    key = self._make_key(name, tables, args, kwargs, vary_on_query)
+                    hit = self.backend.get(key)
+                except Exception as e:
+                    print(f"❌ 读取响应缓存失败: {str(e)}")
+                    return func(*args, **kwargs)
+                if hit is not None:
+                    return _restore(hit)
+
+                result = func(*args, **kwargs)
+                stored = _dump(result)
+                if stored is not None:
+                    try:
+                        self.backend.set(key, stored, ttl or self.default_ttl)
+                    except Exception as e:
+                        print(f"❌ 写入响应缓存失败: {str(e)}")
+                return result
+            return wrapper
+        return decorator
+
+    def _make_key(self, name, tables, args, kwargs, vary_on_query):
+        # 位置参数里的self等对象不参与缓存键，Flask的URL参数都以关键字参数传入
+        parts = [repr(a) for a in args if isinstance(a, (int, str, float))]
+        parts += [f"{k}={kwargs[k]!r}" for k in sorted(kwargs)]
+        if vary_on_query and has_request_context():
+            parts.append(request.query_string.decode("utf-8", "replace"))
+        versions = ".".join(str(v) for v in self.read_versions(tables))
+        return f"{name}:{versions}:{'&'.join(parts)}"
+
+
+def _dump(result):
+    """视图返回值 -> 可存入缓存的JSON结构；不可缓存时返回None"""
+    if isinstance(result, Response):
+        if result.status_code != 200 or result.direct_passthrough:
+            return None
+        return {"kind": "response", "body": result.get_data(as_text=True), "mimetype": result.mimetype}
+    if isinstance(result, (dict, list)):
+        return {"kind": "data", "value": result}
+    return None
+
+
+def _restore(stored):
+    if stored["kind"] == "response":
+        return current_app.response_class(stored["body"], mimetype=stored["mimetype"])
+    return stored["value"]
+
+
+# 全局响应缓存
+response_cache = ResponseCache()
+
+
+# -------------------------- 写入事件驱动的失效 --------------------------
+def _bump_written_tables(session, flush_context):
+    """flush后在同一事务里把本次写过的表的版本号+1（随事务提交生效，回滚则一起撤销）"""
+    tables = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, "__table__", None)
+        if table is not None and table.name != CacheVersion.__tablename__:
+            tables.add(table.name)
+    if not tables:
+        return
+    table = CacheVersion.__table__
+    stmt = insert(table).values([{"table_name": name, "version": 1} for name in sorted(tables)])
+    stmt = stmt.on_conflict_do_update(index_elements=[table.c.table_name], set_={"version": table.c.version + 1})
+    try:
+        session.connection().execute(stmt)
+    except Exception as e:
+        # 版本号表还没建（旧数据库上先启动了生成器进程）时不影响本次写入，缓存依赖TTL兜底
+        print(f"❌ 更新缓存版本号失败: {str(e)}")
+
+
+# 会话级监听器，兼容 forum.models 与 onlineworld_backend.forum.models 两种导入路径（只注册一次）
+if not getattr(Session, "_response_cache_registered", False):
+    event.listen(Session, "after_flush", _bump_written_tables)
+    Session._response_cache_registered = True
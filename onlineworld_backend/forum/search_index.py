@@ -0,0 +1,534 @@
+"""
+搜索引擎倒排索引
+可搜索模型的增删改通过SQLAlchemy事件在同一事务内增量更新SearchIndex，全量重建仅作为离线对账。
+把SearchIndex标题切分为单字+二元组（n-gram）词元，写入search_posting表，
+查询时先按词元取posting list求交集，再用BM25打分，原有的三级匹配（完全/开头/包含）作为同分时的次级排序。
+CJK和拉丁文字统一按字符n-gram切分，因此不依赖分词器，也不要求SQLite编译FTS5。
+"""
+import math
+import re
+import time
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import MetaData, case, event, func, select
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session
+
+from .models import (
+    SearchIndex, SearchPosting, Board, Post, ShopProduct, DynamicPage,
+    ShopCategory, ShopMerchant, Product, ProductCategory
+)
+
+# BM25参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+# 语料统计（文档数、平均标题长度）的缓存时间（秒），避免每次搜索都全表统计
+CORPUS_STATS_TTL = 60
+# 每次搜索最多取出的候选文档数：在SQL中按BM25得分取前N个，只加载这些SearchIndex对象
+MAX_CANDIDATES = 500
+# 重建posting list时每批写入的行数
+REBUILD_BATCH_SIZE = 1000
+# 全量重建时影子表的表名后缀
+SHADOW_SUFFIX = "_shadow"
+
+# 连续的文字/数字片段（Python的\w同时匹配CJK字符）
+_WORD_RUN = re.compile(r'\w+')
+
+_corpus_stats = {"expires_at": 0.0, "doc_count": 0, "avg_doc_len": 0.0}
+
+
+# -------------------------- 分词 --------------------------
+def tokenize_title(title):
+    """
+    将标题切分为词元并统计词频（单字 + 相邻二元组）
+    :param title: 页面标题
+    :return: Counter({词元: 出现次数})
+    """
+    counts = Counter()
+    for run in _WORD_RUN.findall((title or "").lower()):
+        counts.update(run)
+        counts.update(run[i:i + 2] for i in range(len(run) - 1))
+    return counts
+
+
+def keyword_tokens(keyword):
+    """
+    将单个搜索关键词切分为必须全部命中的词元集合
+    长度>=2的片段只需二元组即可覆盖，单字片段使用单字词元
+    :param keyword: 搜索关键词（不含空白）
+    :return: 词元集合
+    """
+    tokens = set()
+    for run in _WORD_RUN.findall(keyword.lower()):
+        if len(run) == 1:
+            tokens.add(run)
+        else:
+            tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def get_sort_level(title, keyword_string):
+    """获取排序级别：1级=完全匹配，2级=开头匹配，3级=包含匹配"""
+    title_lower = title.lower()
+    keyword_lower = keyword_string.lower()
+    if title_lower == keyword_lower:
+        return 1
+    if title_lower.startswith(keyword_lower):
+        return 2
+    return 3
+
+
+# -------------------------- 查询 --------------------------
+def _get_corpus_stats(session):
+    """获取（带缓存的）语料统计：文档总数和平均标题长度"""
+    now = time.time()
+    if now >= _corpus_stats["expires_at"]:
+        doc_count, avg_doc_len = session.query(
+            func.count(SearchIndex.id), func.avg(func.length(SearchIndex.title))
+        ).one()
+        _corpus_stats.update(
+            expires_at=now + CORPUS_STATS_TTL,
+            doc_count=doc_count or 0,
+            avg_doc_len=float(avg_doc_len or 0.0)
+        )
+    return _corpus_stats["doc_count"], _corpus_stats["avg_doc_len"]
+
+
+def _bm25_top_candidates(session, tokens, keyword, limit):
+    """
+    在SQL中求posting list交集并计算BM25得分，按与search_titles相同的排序取前limit个候选
+    :param tokens: 查询词元集合（候选文档必须包含全部词元）
+    :param keyword: 原始搜索字符串（三级匹配的次级排序用）
+    :param limit: 最多返回的候选数
+    :return: [(index_id, score), ...]，得分降序
+    """
+    doc_count, avg_doc_len = _get_corpus_stats(session)
+    avg_doc_len = avg_doc_len or 1.0
+
+    doc_freq = dict(
+        session.query(SearchPosting.token, func.count(SearchPosting.id))
+        .filter(SearchPosting.token.in_(tokens))
+        .group_by(SearchPosting.token)
+        .all()
+    )
+    if len(doc_freq) < len(tokens):
+        return []  # 有词元没有任何文档包含，交集为空
+    doc_count = max(doc_count, max(doc_freq.values()))
+    idf = {
+        token: math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+        for token, df in doc_freq.items()
+    }
+
+    # 每条posting的得分：idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_len / avgdl))，按文档求和
+    tf = func.coalesce(SearchPosting.tf, 0)
+    norm = BM25_K1 * (1 - BM25_B) + (BM25_K1 * BM25_B / avg_doc_len) * func.coalesce(SearchPosting.doc_len, 0)
+    weight = case(idf, value=SearchPosting.token, else_=0.0) * tf * (BM25_K1 + 1) / (tf + norm)
+    score = func.sum(weight).label("score")
+
+    # 排序与search_titles_ranked一致（得分 > 三级匹配 > 更新时间 > id），截断处同分的文档取舍也一致
+    title = func.lower(SearchIndex.title)
+    keyword_lower = keyword.lower()
+    safe_keyword = keyword_lower.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    sort_level = case((title == keyword_lower, 1), (title.like(f"{safe_keyword}%", escape='\\'), 2), else_=3)
+    rows = session.query(SearchPosting.index_id, score).join(
+        SearchIndex, SearchIndex.id == SearchPosting.index_id
+    ).filter(
+        SearchPosting.token.in_(tokens)
+    ).group_by(SearchPosting.index_id, SearchIndex.title, SearchIndex.update_time).having(
+        func.count(SearchPosting.token) == len(tokens)
+    ).order_by(
+        func.round(score, 6).desc(), sort_level, SearchIndex.update_time.desc(), SearchPosting.index_id
+    ).limit(limit)
+    return [(index_id, float(value or 0.0)) for index_id, value in rows]
+
+
+def search_titles(session, keyword):
+    """
+    在搜索索引中检索标题，多个关键词（空白分隔）之间为"且"关系
+    排序：BM25得分降序 > 三级匹配（完全/开头/包含） > 更新时间降序 > id
+    :param session: SQLAlchemy会话（Flask中传db.session）
+    :param keyword: 原始搜索字符串
+    :return: 排好序的SearchIndex对象列表
+    """
+    return [r for _, r in search_titles_ranked(session, keyword)]
+
+
+def search_titles_ranked(session, keyword):
+    """
+    同search_titles，但同时返回每条结果的排序键（升序、唯一、可JSON序列化），供游标分页使用
+    结果最多 MAX_CANDIDATES 条（BM25得分最高的部分）
+    :return: [(排序键元组, SearchIndex对象), ...]
+    """
+    keywords = [k.strip() for k in keyword.split() if k.strip()]
+    if not keywords:
+        return []
+
+    tokens = set()
+    for k in keywords:
+        tokens |= keyword_tokens(k)
+
+    if tokens:
+        # 1. 求posting list交集并打分：候选文档必须包含全部查询词元，只加载得分最高的 MAX_CANDIDATES 个
+        scores = dict(_bm25_top_candidates(session, tokens, keyword, MAX_CANDIDATES))
+        candidates = session.query(SearchIndex).filter(SearchIndex.id.in_(scores)).all() if scores else []
+    else:
+        # 关键词全部是标点等无法切分的字符，退回LIKE匹配（最近更新的 MAX_CANDIDATES 条）
+        scores = {}
+        query = session.query(SearchIndex)
+        for k in keywords:
+            safe_k = k.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            query = query.filter(SearchIndex.title.ilike(f'%{safe_k}%', escape='\\'))
+        candidates = query.order_by(SearchIndex.update_time.desc(), SearchIndex.id.desc()).limit(MAX_CANDIDATES).all()
+
+    # 2. 校验子串（n-gram命中只是必要条件）
+    results = [
+        r for r in candidates
+        if all(k.lower() in r.title.lower() for k in keywords)
+    ]
+    if not results:
+        return []
+
+    # 3. 排序（id兜底保证排序键唯一）
+    ranked = [(
+        (
+            -round(scores.get(r.id, 0.0), 6),
+            get_sort_level(r.title, keyword),
+            -(r.update_time.timestamp() if r.update_time else 0.0),
+            r.id
+        ),
+        r
+    ) for r in results]
+    ranked.sort(key=lambda item: item[0])
+    return ranked
+
+
+# -------------------------- 索引维护 --------------------------
+def _posting_rows(index_id, title):
+    """生成某条索引记录的posting行"""
+    doc_len = len(title or "")
+    return [
+        {"token": token, "index_id": index_id, "tf": tf, "doc_len": doc_len}
+        for token, tf in tokenize_title(title).items()
+    ]
+
+
+def _is_search_index(obj):
+    # 按表名判断，兼容 forum.models 与 onlineworld_backend.forum.models 两种导入路径
+    return getattr(obj, "__tablename__", None) == SearchIndex.__tablename__
+
+
+def _drop_deleted_postings(session, flush_context, instances):
+    """flush前先删除将被删除的索引记录的posting，避免外键约束冲突"""
+    deleted_ids = [obj.id for obj in session.deleted if _is_search_index(obj) and obj.id is not None]
+    if deleted_ids:
+        table = SearchPosting.__table__
+        session.connection().execute(table.delete().where(table.c.index_id.in_(deleted_ids)))
+
+
+def _sync_postings(session, flush_context):
+    """flush后为新增/标题变更的索引记录写入posting（同一事务内）"""
+    changed = [obj for obj in session.new if _is_search_index(obj)]
+    changed += [
+        obj for obj in session.dirty
+        if _is_search_index(obj) and sa_inspect(obj).attrs.title.history.has_changes()
+    ]
+    if not changed:
+        return
+
+    table = SearchPosting.__table__
+    connection = session.connection()
+    stale_ids = [obj.id for obj in changed if obj not in session.new]
+    if stale_ids:
+        connection.execute(table.delete().where(table.c.index_id.in_(stale_ids)))
+
+    rows = []
+    for obj in changed:
+        rows.extend(_posting_rows(obj.id, obj.title))
+    if rows:
+        connection.execute(table.insert(), rows)
+
+
+def _write_postings(connection, index_ids, title):
+    """用Core语句替换若干索引记录的posting（绕过ORM写SearchIndex时使用）"""
+    table = SearchPosting.__table__
+    connection.execute(table.delete().where(table.c.index_id.in_(index_ids)))
+    rows = []
+    for index_id in index_ids:
+        rows.extend(_posting_rows(index_id, title))
+    if rows:
+        connection.execute(table.insert(), rows)
+
+
+# -------------------------- 可搜索实体 --------------------------
+class IndexedEntity:
+    """
+    描述一种需要进入搜索索引的实体
+    :param model: 模型类
+    :param entity_type: SearchIndex.entity_type
+    :param title_attr: 作为标题的字段名
+    :param url: 根据实体对象生成页面URL的函数
+    :param filters: 进入索引的条件（如 {"is_active": True}），全量重建时用作filter_by
+    :param extra_fields: 除标题和条件字段外，变化时也需要刷新索引的字段（如URL用到的slug）
+    """
+
+    def __init__(self, model, entity_type, title_attr, url, filters=None, extra_fields=()):
+        self.model = model
+        self.entity_type = entity_type
+        self.title_attr = title_attr
+        self.url = url
+        self.filters = filters or {}
+        self.watched_fields = (title_attr,) + tuple(self.filters) + tuple(extra_fields)
+
+    def is_visible(self, obj):
+        """实体当前是否应出现在搜索结果中"""
+        return all(getattr(obj, field) == value for field, value in self.filters.items())
+
+    def to_entry(self, obj):
+        """实体 -> SearchIndex字段"""
+        return {
+            "title": getattr(obj, self.title_attr),
+            "entity_type": self.entity_type,
+            "entity_id": obj.id,
+            "url": self.url(obj)
+        }
+
+
+# 各模块首页（固定条目，只在全量重建时写入）
+HOME_ENTRIES = [
+    {"title": "论坛首页", "entity_type": "forum_home", "entity_id": 0, "url": "/forum"},
+    {"title": "商城首页", "entity_type": "shop_home", "entity_id": 0, "url": "/shop"},
+    {"title": "产品首页", "entity_type": "product_home", "entity_id": 0, "url": "/products"},
+    {"title": "动态页面首页", "entity_type": "dynamic_home", "entity_id": 0, "url": "/dynamic"},
+]
+
+INDEXED_ENTITIES = [
+    IndexedEntity(Board, "forum_board", "name", lambda o: f"/forum/board/{o.id}"),
+    IndexedEntity(Post, "forum_post", "title", lambda o: f"/forum/post/{o.id}"),
+    IndexedEntity(ShopProduct, "shop_product", "name", lambda o: f"/shop/product/{o.id}", {"is_active": True}),
+    IndexedEntity(DynamicPage, "dynamic_page", "title", lambda o: f"/dynamic/{o.slug}",
+                  {"is_active": True, "is_public": True}, extra_fields=("slug",)),
+    IndexedEntity(ShopCategory, "shop_category", "name", lambda o: f"/shop/category/{o.id}", {"is_active": True}),
+    IndexedEntity(ShopMerchant, "shop_merchant", "name", lambda o: f"/shop/merchant/{o.id}", {"is_active": True}),
+    IndexedEntity(Product, "product", "name", lambda o: f"/products/{o.id}", {"is_active": True}),
+    IndexedEntity(ProductCategory, "product_category", "name", lambda o: f"/products/category/{o.id}"),
+]
+
+
+# -------------------------- 增量索引（模型写入事件驱动） --------------------------
+def _upsert_entry(connection, entry):
+    """按 (entity_type, entity_id) 更新或插入一条索引记录，并同步posting"""
+    table = SearchIndex.__table__
+    match = (table.c.entity_type == entry["entity_type"]) & (table.c.entity_id == entry["entity_id"])
+    now = datetime.utcnow()
+
+    index_ids = [row.id for row in connection.execute(select(table.c.id).where(match))]
+    if index_ids:
+        connection.execute(table.update().where(match).values(
+            title=entry["title"], url=entry["url"], update_time=now
+        ))
+    else:
+        result = connection.execute(table.insert().values(create_time=now, update_time=now, **entry))
+        index_ids = [result.inserted_primary_key[0]]
+    _write_postings(connection, index_ids, entry["title"])
+
+
+def _remove_entry(connection, entity_type, entity_id):
+    """删除某个实体对应的索引记录及其posting"""
+    table = SearchIndex.__table__
+    posting_table = SearchPosting.__table__
+    match = (table.c.entity_type == entity_type) & (table.c.entity_id == entity_id)
+    connection.execute(posting_table.delete().where(
+        posting_table.c.index_id.in_(select(table.c.id).where(match))
+    ))
+    connection.execute(table.delete().where(match))
+
+
+def _make_listeners(spec):
+    """为某种实体生成 insert/update/delete 事件处理函数（与实体写入处于同一事务）"""
+
+    def after_insert(mapper, connection, target):
+        if spec.is_visible(target):
+            _upsert_entry(connection, spec.to_entry(target))
+
+    def after_update(mapper, connection, target):
+        state = sa_inspect(target)
+        if not any(state.attrs[field].history.has_changes() for field in spec.watched_fields):
+            return  # 浏览量等无关字段变化，不触碰索引
+        if spec.is_visible(target):
+            _upsert_entry(connection, spec.to_entry(target))
+        else:
+            _remove_entry(connection, spec.entity_type, target.id)
+
+    def after_delete(mapper, connection, target):
+        _remove_entry(connection, spec.entity_type, target.id)
+
+    return after_insert, after_update, after_delete
+
+
+for _spec in INDEXED_ENTITIES:
+    _after_insert, _after_update, _after_delete = _make_listeners(_spec)
+    event.listen(_spec.model, "after_insert", _after_insert)
+    event.listen(_spec.model, "after_update", _after_update)
+    event.listen(_spec.model, "after_delete", _after_delete)
+
+
+# -------------------------- 全量重建（离线对账） --------------------------
+def collect_index_entries(session):
+    """
+    从所有可搜索模型收集索引条目，用于全量重建/对账
+    :return: (条目列表, {entity_type: 条数})
+    """
+    entries = list(HOME_ENTRIES)
+    counts = {"home": len(HOME_ENTRIES)}
+    for spec in INDEXED_ENTITIES:
+        objects = session.query(spec.model).filter_by(**spec.filters).all()
+        entries.extend(spec.to_entry(obj) for obj in objects)
+        counts[spec.entity_type] = len(objects)
+    return entries, counts
+
+
+def _shadow_tables():
+    """
+    构造与search_index/search_posting结构相同的影子表
+    影子表不带索引：批量写入更快，且索引名在库内全局唯一，交换时再按正式名称建索引
+    :return: (索引影子表, posting影子表)
+    """
+    metadata = MetaData()
+    # posting的外键引用search_index.id，影子元数据里需要能解析到该表（不会被创建）
+    SearchIndex.__table__.to_metadata(metadata)
+    index_shadow = SearchIndex.__table__.to_metadata(
+        metadata, name=SearchIndex.__tablename__ + SHADOW_SUFFIX)
+    posting_shadow = SearchPosting.__table__.to_metadata(
+        metadata, name=SearchPosting.__tablename__ + SHADOW_SUFFIX)
+    index_shadow.indexes.clear()
+    posting_shadow.indexes.clear()
+    return index_shadow, posting_shadow
+
+
+def _insert_batches(connection, table, rows):
+    """按REBUILD_BATCH_SIZE分批executemany写入"""
+    for i in range(0, len(rows), REBUILD_BATCH_SIZE):
+        connection.execute(table.insert(), rows[i:i + REBUILD_BATCH_SIZE])
+
+
+def _swap_in_shadow_tables(connection, index_shadow, posting_shadow):
+    """删除正式表、把影子表改名为正式表并重建索引（须在同一事务内调用）"""
+    index_table = SearchIndex.__table__
+    posting_table = SearchPosting.__table__
+    posting_table.drop(connection)
+    index_table.drop(connection)
+    connection.exec_driver_sql(
+        f"ALTER TABLE {index_shadow.name} RENAME TO {index_table.name}")
+    connection.exec_driver_sql(
+        f"ALTER TABLE {posting_shadow.name} RENAME TO {posting_table.name}")
+    for index in list(index_table.indexes) + list(posting_table.indexes):
+        index.create(connection)
+
+
+def _swap_atomically(engine, index_shadow, posting_shadow):
+    """
+    在一个事务内完成表交换，读者要么看到旧索引，要么看到新索引，不会看到空表
+    pysqlite默认只在DML前隐式开启事务，DDL会各自自动提交，
+    所以SQLite下改为AUTOCOMMIT模式并手动 BEGIN IMMEDIATE / COMMIT
+    """
+    if engine.dialect.name != "sqlite":
+        with engine.begin() as connection:
+            _swap_in_shadow_tables(connection, index_shadow, posting_shadow)
+        return
+
+    with engine.execution_options(isolation_level="AUTOCOMMIT").connect() as connection:
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            _swap_in_shadow_tables(connection, index_shadow, posting_shadow)
+        except Exception:
+            connection.exec_driver_sql("ROLLBACK")
+            raise
+        connection.exec_driver_sql("COMMIT")
+
+
+def build_search_index(session):
+    """
+    全量重建搜索索引（增量索引之外的离线对账手段）
+    先把全部条目和posting用Core批量写入影子表，再在一个事务内把影子表换成正式表，
+    重建期间搜索照常读取旧索引。
+    注意：会结束session当前事务；收集条目之后、交换之前的增量写入会被覆盖，等下次对账补齐
+    :return: {entity_type: 条数}
+    """
+    entries, counts = collect_index_entries(session)
+    # 释放session持有的连接/锁，后续写入走独立连接
+    session.commit()
+
+    now = datetime.utcnow()
+    # 预先分配主键，posting可以直接引用，无需回读
+    index_rows = [
+        dict(entry, id=index_id, create_time=now, update_time=now)
+        for index_id, entry in enumerate(entries, start=1)
+    ]
+    posting_rows = []
+    for row in index_rows:
+        posting_rows.extend(_posting_rows(row["id"], row["title"]))
+
+    engine = session.get_bind()
+    index_shadow, posting_shadow = _shadow_tables()
+    with engine.begin() as connection:
+        posting_shadow.drop(connection, checkfirst=True)
+        index_shadow.drop(connection, checkfirst=True)
+        index_shadow.create(connection)
+        posting_shadow.create(connection)
+        _insert_batches(connection, index_shadow, index_rows)
+        _insert_batches(connection, posting_shadow, posting_rows)
+
+    _swap_atomically(engine, index_shadow, posting_shadow)
+    _corpus_stats["expires_at"] = 0.0
+    return counts
+
+
+def rebuild_postings(session):
+    """
+    根据现有SearchIndex记录全量重建posting list（不提交事务）
+    :return: 写入的posting行数
+    """
+    table = SearchPosting.__table__
+    connection = session.connection()
+    connection.execute(table.delete())
+
+    total = 0
+    batch = []
+    for index_id, title in session.query(SearchIndex.id, SearchIndex.title).all():
+        batch.extend(_posting_rows(index_id, title))
+        if len(batch) >= REBUILD_BATCH_SIZE:
+            connection.execute(table.insert(), batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        connection.execute(table.insert(), batch)
+        total += len(batch)
+    return total
+
+
+def ensure_search_index(session):
+    """
+    启动时检查（旧数据库升级）：
+    1. 为search_index补建按实体定位的索引（create_all不会给已有表加索引）
+    2. 已有索引记录但posting list为空时自动补建
+    """
+    for index in SearchIndex.__table__.indexes:
+        index.create(session.connection(), checkfirst=True)
+    session.commit()
+
+    if session.query(SearchPosting.id).first() is not None:
+        return 0
+    if session.query(SearchIndex.id).first() is None:
+        return 0
+    total = rebuild_postings(session)
+    session.commit()
+    print(f"🔄 已为现有搜索索引补建倒排索引：{total} 条posting")
+    return total
+
+
+# 注册会话级监听器：任何会话（Flask-SQLAlchemy或原生sessionmaker）写SearchIndex时都会同步posting
+if not getattr(Session, "_search_posting_sync_registered", False):
+    event.listen(Session, "before_flush", _drop_deleted_postings)
+    event.listen(Session, "after_flush", _sync_postings)
+    Session._search_posting_sync_registered = True
@@ -0,0 +1,88 @@
+"""
+静态文件发送（图片、DataSheet、网盘文件共用）
+- 条件请求：ETag（修改时间+大小+路径）/ Last-Modified，客户端缓存的副本仍有效时返回304
+- 断点续传：GET/HEAD 请求支持 Range（含 If-Range），返回206，下载中断后只补传剩下的部分
+- 反向代理接管：STATIC_SENDFILE 设为 x-accel-redirect（nginx）或 x-sendfile（Apache/lighttpd）时，
+  应用只返回带内部跳转头的空响应，文件内容、Range 和条件请求都由本机代理处理，worker 不再被大文件占住
+- 缓存策略：内容不会变化的文件（按内容哈希命名）标记 immutable 长期缓存；会被覆盖的文件每次使用前重新验证
+"""
+import os
+from urllib.parse import quote
+
+from flask import current_app, request, send_file
+from werkzeug.utils import send_file as werkzeug_send_file
+from werkzeug.security import safe_join
+
+from config import Config
+
+# immutable 文件默认缓存一年
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def resolve_path(root, relative_path):
+    """
+    在 root 目录下解析相对路径
+    :return: 文件绝对路径；路径跳出 root 或文件不存在时返回None
+    """
+    path = safe_join(root, (relative_path or "").lstrip("/"))
+    return path if path and os.path.isfile(path) else None
+
+
+def cache_control(max_age=None, immutable=False):
+    """
+    Cache-Control 取值
+    :param max_age: 允许直接使用缓存的秒数，不传时每次使用前重新验证（no-cache + ETag）
+    :param immutable: 内容永不变化（按内容哈希命名的文件）
+    """
+    if immutable:
+        return f"public, max-age={max_age or IMMUTABLE_MAX_AGE}, immutable"
+    if max_age:
+        return f"public, max-age={max_age}"
+    return "no-cache"
+
+
+def _proxy_response(path, as_attachment, download_name, mimetype):
+    """
+    交给反向代理发送的空响应（不支持的路径返回None，由应用直接发送）
+    x-accel-redirect：STATIC_ACCEL_ROOT 下的文件映射到 nginx 的 internal location STATIC_ACCEL_PREFIX（URL编码，nginx会解码）
+    x-sendfile：头里直接放文件路径，路径含非latin-1字符（中文文件名）时无法放进响应头，由应用直接发送
+    """
+    mode = Config.STATIC_SENDFILE
+    if mode not in ("x-sendfile", "x-accel-redirect"):
+        return None
+    if mode == "x-accel-redirect":
+        relative = os.path.relpath(path, Config.STATIC_ACCEL_ROOT)
+        if relative.startswith(".."):
+            return None
+    elif not path.isascii():
+        return None
+    # werkzeug send_file 的 X-Sendfile 模式：生成 Content-Type / Content-Disposition，响应体为空
+    response = werkzeug_send_file(path, request.environ, mimetype=mimetype, as_attachment=as_attachment,
+                                  download_name=download_name, conditional=False, etag=False, use_x_sendfile=True,
+                                  response_class=current_app.response_class)
+    if mode == "x-accel-redirect":
+        response.headers.pop("X-Sendfile", None)
+        response.headers["X-Accel-Redirect"] = Config.STATIC_ACCEL_PREFIX.rstrip("/") + "/" + quote(relative.replace(os.sep, "/"))
+    return response
+
+
+def send_static(path, as_attachment=False, download_name=None, mimetype=None, max_age=None, immutable=False):
+    """
+    发送文件
+    :param path: 文件绝对路径（调用方已用 resolve_path 校验）
+    :param as_attachment: 是否作为附件下载
+    :param download_name: 下载文件名，默认取路径中的文件名
+    :param mimetype: 内容类型，默认按文件名推断
+    :param max_age: 见 cache_control
+    :param immutable: 见 cache_control
+    :return: 响应（200 / 206 / 304 / 416，或交给代理的空响应）
+    """
+    response = _proxy_response(path, as_attachment, download_name, mimetype)
+    if response is None:
+        response = send_file(path, mimetype=mimetype, as_attachment=as_attachment, download_name=download_name,
+                             conditional=True, etag=True)
+        # Range 只对 GET/HEAD 生效，POST 下载不声明
+        if request.method in ("GET", "HEAD"):
+            response.headers["Accept-Ranges"] = "bytes"
+    response.headers["Cache-Control"] = cache_control(max_age, immutable)
+    return response
@@ -0,0 +1,121 @@
+"""
+浏览量缓冲计数
+页面访问只在内存里累加浏览量，每隔 FLUSH_INTERVAL 秒或累计 FLUSH_THRESHOLD 次访问后，
+用一条批量 UPDATE ... SET view_count = view_count + ? 写回数据库，
+读页面不再各自开写事务（SQLite写锁会让并发读者排队）。
+响应里展示的浏览量 = 数据库值 + 尚未写回的增量。
+"""
+import atexit
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import bindparam, func, update
+
+from .models import db
+
+# 定时写回间隔（秒）
+FLUSH_INTERVAL = 10
+# 累计多少次访问后立即写回
+FLUSH_THRESHOLD = 500
+
+
+class ViewCounterBuffer:
+    """
+    进程内浏览量缓冲（线程安全）
+    :param flush_interval: 定时写回间隔（秒）
+    :param flush_threshold: 累计访问次数达到该值时立即写回
+    """
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, flush_threshold=FLUSH_THRESHOLD):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._pending = {}  # {表对象: Counter({实体id: 增量})}
+        self._events = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._engine = None
+        self._timer = None
+
+    def init_app(self, app):
+        """绑定数据库引擎并启动定时写回线程，进程退出前写回剩余增量"""
+        with app.app_context():
+            self._engine = db.engine
+        if self._timer is None:
+            self._timer = threading.Thread(target=self._run_timer, name="view-counter-flush", daemon=True)
+            self._timer.start()
+            atexit.register(self.flush)
+
+    def incr(self, model, entity_ids):
+        """
+        记录一次或多次访问
+        :param model: 带view_count字段的模型类（Post、ShopProduct等）
+        :param entity_ids: 实体id或id列表
+        """
+        if isinstance(entity_ids, int):
+            entity_ids = [entity_ids]
+        with self._lock:
+            counter = self._pending.setdefault(model.__table__, Counter())
+            counter.update(entity_ids)
+            self._events += len(entity_ids)
+            due = (self._events >= self.flush_threshold
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def pending(self, model, entity_ids):
+        """
+        查询尚未写回的增量，用于和数据库读出的浏览量合并
+        :return: {实体id: 增量}
+        """
+        with self._lock:
+            counter = self._pending.get(model.__table__)
+            if not counter:
+                return {}
+            return {entity_id: counter[entity_id] for entity_id in entity_ids if entity_id in counter}
+
+    def view_count(self, obj):
+        """实体当前应展示的浏览量（数据库值 + 未写回增量）"""
+        return (obj.view_count or 0) + self.pending(type(obj), [obj.id]).get(obj.id, 0)
+
+    def flush(self):
+        """把缓冲的增量批量写回数据库（每张表一条executemany的UPDATE）"""
+        if self._engine is None:
+            return 0
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._events = 0
+                self._last_flush = time.monotonic()
+            if not pending:
+                return 0
+
+            total = 0
+            try:
+                with self._engine.begin() as connection:
+                    for table, counter in pending.items():
+                        stmt = update(table).where(table.c.id == bindparam("b_id")).values(
+                            view_count=func.coalesce(table.c.view_count, 0) + bindparam("b_delta")
+                        )
+                        connection.execute(stmt, [
+                            {"b_id": entity_id, "b_delta": delta} for entity_id, delta in counter.items()
+                        ])
+                        total += len(counter)
+            except Exception as e:
+                # 写回失败时把增量放回缓冲，等下次再试，避免丢计数
+                with self._lock:
+                    for table, counter in pending.items():
+                        self._pending.setdefault(table, Counter()).update(counter)
+                print(f"❌ 浏览量写回失败，稍后重试: {str(e)}")
+                return 0
+            return total
+
+    def _run_timer(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+# 全局浏览量缓冲
+view_counter = ViewCounterBuffer()
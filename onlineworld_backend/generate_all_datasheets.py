@@ -1,33 +1,66 @@
 import os
 import sys
+import argparse
 from app import app, db
 from forum.datasheet_generator import DataSheetGenerator
 
-try:
-    with app.app_context():
-        # 创建DataSheetGenerator实例
-        generator = DataSheetGenerator()
-        
-        # 批量生成所有产品的DataSheet
-        result = generator.generate_all_datasheets()
-        
-        # 打印生成结果
-        print(f"批量生成DataSheet结果：")
-        print(f"总产品数：{result.get('total', 'N/A')}")
-        print(f"成功生成：{result.get('generated', 'N/A')}")
-        print(f"已存在跳过：{result.get('skipped', 'N/A')}")
-        print(f"生成失败：{result.get('failed', 'N/A')}")
-        print(f"状态：{'成功' if result.get('success', False) else '失败'}")
-        print(f"消息：{result.get('message', '无消息')}")
-        
-        # 如果有失败，设置退出码
-        if result.get('failed', 0) > 0 or not result.get('success', False):
-            sys.exit(1)
-except ImportError as e:
-    print(f"导入模块失败: {str(e)}", file=sys.stderr)
-    sys.exit(1)
-except Exception as e:
-    print(f"执行过程中发生错误: {str(e)}", file=sys.stderr)
-    import traceback
-    traceback.print_exc()
-    sys.exit(1)
\ No newline at end of file
+
+def main():
+    # 渲染进程池以spawn方式启动子进程，子进程会重新导入本脚本，入口必须放在 __main__ 判断中
+    parser = argparse.ArgumentParser(description="批量生成所有产品的DataSheet（文案并发获取，PDF多进程排版）")
+    parser.add_argument("--force", action="store_true", help="产品没有变化也重新生成")
+    parser.add_argument("--content-workers", type=int, default=None, help="并发获取文案的线程数")
+    parser.add_argument("--render-workers", type=int, default=None, help="PDF渲染进程数（默认CPU核数）")
+    parser.add_argument("--adopt-existing", action="store_true",
+                        help="已有文件但没有指纹的产品（旧版本生成）不重新生成，直接记录当前指纹")
+    args = parser.parse_args()
+
+    try:
+        with app.app_context():
+            # 创建DataSheetGenerator实例
+            generator = DataSheetGenerator()
+
+            # 批量生成所有产品的DataSheet
+            result = generator.generate_all_datasheets(
+                force=args.force,
+                content_workers=args.content_workers,
+                render_workers=args.render_workers,
+                adopt_existing=args.adopt_existing
+            )
+
+            # 打印生成结果
+            print(f"批量生成DataSheet结果：")
+            print(f"总产品数：{result.get('total', 'N/A')}")
+            print(f"成功生成：{result.get('generated', 'N/A')}")
+            print(f"无变化跳过：{result.get('skipped', 'N/A')}")
+            print(f"生成失败：{result.get('failed', 'N/A')}")
+            print(f"总耗时：{result.get('elapsed', 0):.2f}秒")
+
+            # 每个产品的耗时（按总耗时从长到短）
+            timings = sorted(result.get('timings', []), key=lambda t: t['content'] + t['render'], reverse=True)
+            if timings:
+                avg_content = sum(t['content'] for t in timings) / len(timings)
+                avg_render = sum(t['render'] for t in timings) / len(timings)
+                print(f"平均耗时：文案 {avg_content:.2f}秒，排版 {avg_render:.2f}秒")
+                print("各产品耗时：")
+                for t in timings:
+                    print(f"  {t['model']}: 文案 {t['content']:.2f}秒，排版 {t['render']:.2f}秒")
+
+            print(f"状态：{'成功' if result.get('success', False) else '失败'}")
+            print(f"消息：{result.get('message', '无消息')}")
+
+            # 如果有失败，设置退出码
+            if result.get('failed', 0) > 0 or not result.get('success', False):
+                sys.exit(1)
+    except ImportError as e:
+        print(f"导入模块失败: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+    except Exception as e:
+        print(f"执行过程中发生错误: {str(e)}", file=sys.stderr)
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
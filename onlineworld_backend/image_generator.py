@@ -3,11 +3,16 @@ import base64
 import os
 import time
 import random
-import json
+import logging
 from datetime import datetime
 from onlineworld_backend.config import Config
+from onlineworld_backend.image_store import image_store
 from PIL import Image
 import io
+from concurrent.futures import Future, ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
 
 # 配置API信息
 SILICON_FLOW_API_KEY = Config.SILICON_FLOW_API_KEY
@@ -15,36 +20,31 @@ SILICON_FLOW_API_URL = Config.SILICON_FLOW_IMAGE_API_URL
 
 # 确保保存目录存在
 def ensure_directory_exists(directory):
-    if not os.path.exists(directory):
-        os.makedirs(directory)
+    os.makedirs(directory, exist_ok=True)
     return directory
 
 # 保存图片到文件
 def save_image(image_data, width, height):
-    # 确保保存目录存在
-    save_dir = ensure_directory_exists(os.path.join(os.path.dirname(__file__), 'static', 'images'))
-    
-    # 生成唯一文件名
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
-    filename = f"generated_image_{timestamp}.png"
-    filepath = os.path.join(save_dir, filename)
+    """
+    保存图片到内容寻址存储（相同内容只存一份，同时生成WebP和缩略图）
     
-    # 保存图片
+    返回:
+        str: 原图保存路径
+    """
     try:
-        # 如果是字节数据，直接写入文件
+        # 如果是字节数据，直接入库
         if isinstance(image_data, bytes):
-            with open(filepath, 'wb') as f:
-                f.write(image_data)
-        # 如果是PIL Image对象，保存为PNG
+            filepath = image_store.put(image_data)
+        # 如果是PIL Image对象，转成PNG后入库
         elif hasattr(image_data, 'save'):
-            image_data.save(filepath, 'PNG')
+            filepath = image_store.put_image(image_data)
         else:
             raise TypeError("无法识别的图像数据类型")
         
-        print(f"图片已保存: {filepath}")
+        logger.info("图片已保存: %s", filepath)
         return filepath
     except Exception as e:
-        print(f"保存图片失败: {str(e)}")
+        logger.error("保存图片失败: %s", e)
         raise
 
 # 验证尺寸是否为支持的格式
@@ -54,10 +54,152 @@ def validate_dimensions(width, height):
         raise ValueError(f"不支持的图片尺寸: {width}x{height}。请使用以下尺寸之一: {valid_dimensions}")
     return True
 
+# 图片生成接口单次请求最多返回的图片数
+MAX_BATCH_SIZE = 4
+
+
+class ImagePipeline:
+    """
+    并发图片生成流水线（线程安全，进程内使用全局实例 image_pipeline）
+    - 生成请求在请求线程池中并发发出，同一提示词的多张图片合并为一次 batch_size>1 的请求
+    - 响应中的图片URL通过共享连接池并发下载，base64解码和入库（去重、生成WebP/缩略图）放到IO线程池，不占用请求线程
+    - submit / submit_batch / submit_many 立即返回 Future，结果为图片保存路径
+    :param max_requests: 同时在途的生成请求数
+    :param max_io: 下载、解码、保存图片的线程数
+    :param timeout: 生成请求超时秒数
+    :param fetch_timeout: 下载图片URL超时秒数
+    """
+
+    def __init__(self, max_requests=None, max_io=None, timeout=None, fetch_timeout=None):
+        self.max_requests = max_requests or Config.IMAGE_MAX_CONCURRENCY
+        self.max_io = max_io or Config.IMAGE_IO_WORKERS
+        self.timeout = timeout or Config.IMAGE_API_TIMEOUT
+        self.fetch_timeout = fetch_timeout or Config.IMAGE_FETCH_TIMEOUT
+
+        pool_size = self.max_requests + self.max_io
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._request_executor = ThreadPoolExecutor(self.max_requests, thread_name_prefix="image-request")
+        self._io_executor = ThreadPoolExecutor(self.max_io, thread_name_prefix="image-io")
+
+    def submit(self, prompt, width=512, height=512):
+        """
+        提交一张图片的生成
+        :return: Future，结果为图片保存路径
+        """
+        return self.submit_batch(prompt, 1, width, height)[0]
+
+    def submit_batch(self, prompt, count, width=512, height=512):
+        """
+        同一提示词生成多张图片，每 MAX_BATCH_SIZE 张合并为一次请求
+        :return: Future列表（count个）
+        """
+        futures = [Future() for _ in range(count)]
+        for i in range(0, count, MAX_BATCH_SIZE):
+            self._request_executor.submit(self._request, prompt, width, height, futures[i:i + MAX_BATCH_SIZE])
+        return futures
+
+    def submit_many(self, prompts, width=512, height=512):
+        """
+        批量提交多个提示词（相同的提示词合并请求）
+        :return: 与 prompts 一一对应的Future列表
+        """
+        positions = {}
+        for i, prompt in enumerate(prompts):
+            positions.setdefault(prompt, []).append(i)
+        futures = [None] * len(prompts)
+        for prompt, indexes in positions.items():
+            for i, future in zip(indexes, self.submit_batch(prompt, len(indexes), width, height)):
+                futures[i] = future
+        return futures
+
+    def _request(self, prompt, width, height, futures):
+        """请求线程：发出一次生成请求，把返回的每张图片交给IO线程池下载/解码并保存"""
+        # 调用方已取消的Future不再生成
+        futures = [future for future in futures if future.set_running_or_notify_cancel()]
+        if not futures:
+            return
+        try:
+            headers = {
+                "Authorization": f"Bearer {SILICON_FLOW_API_KEY}",
+                "Content-Type": "application/json"
+            }
+            payload = {
+                "model": Config.AI_IMAGE_MODEL_NAME,  # 使用Stable Diffusion模型
+                "prompt": "真实世界实拍，冷色调，" + prompt,
+                "image_size": f"{width}x{height}",
+                "batch_size": len(futures),
+                "num_inference_steps": 20,
+                "guidance_scale": 7.5,
+                "cfg": 10.05,
+            }
+            logger.info("正在生成图片: %s (%sx%s) x%s", prompt, width, height, len(futures))
+            response = self._session.post(SILICON_FLOW_API_URL, headers=headers, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+
+            images = data.get('data') or []
+            if not images:
+                logger.error("API响应中不包含图片数据，响应字段: %s", sorted(data))
+                logger.debug("响应数据结构: %s", data)
+                raise ValueError("API响应中不包含图片数据")
+        except Exception as e:
+            logger.error("图片生成请求失败: %s", e)
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        for i, future in enumerate(futures):
+            if i < len(images):
+                self._io_executor.submit(self._resolve, future, images[i])
+            else:
+                future.set_exception(ValueError(f"API只返回了 {len(images)} 张图片，少于请求的 {len(futures)} 张"))
+
+    def _resolve(self, future, item):
+        """IO线程：取得一张图片的数据并保存，结果写入Future"""
+        try:
+            filepath = image_store.put(self._image_bytes(item))
+            logger.info("图片已保存: %s", filepath)
+            future.set_result(filepath)
+        except Exception as e:
+            logger.error("保存生成的图片失败: %s", e)
+            future.set_exception(e)
+
+    def _image_bytes(self, item):
+        """从响应中的一项取出图片字节（base64解码或下载URL）"""
+        if 'b64_json' in item:
+            return base64.b64decode(item['b64_json'])
+        if 'b64' in item:
+            base64_image = item['b64']
+            # 移除可能的前缀
+            if base64_image.startswith('data:image/'):
+                base64_image = base64_image.split(',')[1]
+            return base64.b64decode(base64_image)
+        if 'url' in item:
+            image_response = self._session.get(item['url'], timeout=self.fetch_timeout)
+            image_response.raise_for_status()
+            return image_response.content
+        logger.error("API响应中不包含可识别的图片数据格式，字段: %s", sorted(item))
+        logger.debug("响应数据结构: %s", item)
+        raise ValueError("API响应中不包含可识别的图片数据格式")
+
+    def close(self):
+        """等待在途任务完成并关闭线程池和连接池"""
+        self._request_executor.shutdown(wait=True)
+        self._io_executor.shutdown(wait=True)
+        self._session.close()
+
+
+# 全局图片生成流水线
+image_pipeline = ImagePipeline()
+
+
 # 生成单张图片
 def generate_image(prompt, width=512, height=512):
     """
-    使用硅基流动大模型生成一张图片
+    使用硅基流动大模型生成一张图片（阻塞等待结果；需要并发生成时用 image_pipeline.submit）
     
     参数:
         prompt (str): 图像生成提示词
@@ -65,97 +207,12 @@ def generate_image(prompt, width=512, height=512):
     返回:
         str: 生成的图片保存路径
     """
-    
-    try:
-        # 构建请求头
-        headers = {
-            "Authorization": f"Bearer {SILICON_FLOW_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        # 构建请求体
-        payload = {
-            "model": Config.AI_IMAGE_MODEL_NAME,  # 使用Stable Diffusion模型
-            "prompt": "真实世界实拍，冷色调，" + prompt,
-            "image_size": f"{width}x{height}",
-            "batch_size": 1,  # 生成1张图片
-            "num_inference_steps": 20,
-            "guidance_scale": 7.5,
-            "cfg": 10.05,
-        }
-        
-        # 发送请求
-        print(f"正在生成图片: {prompt} ({width}x{height})")
-        response = requests.post(SILICON_FLOW_API_URL, headers=headers, json=payload)
-        
-        # 打印完整的API响应内容，帮助调试
-        # print("\n=== API响应详情 ===")
-        # print(f"状态码: {response.status_code}")
-        # print(f"响应头: {response.headers}")
-        # print(f"响应内容: {response.text}")
-        # print("==================\n")
-        
-        response.raise_for_status()
-        
-        # 解析响应数据
-        data = response.json()
-        
-        # 处理响应
-        # 检查响应是否包含图片数据 - 尝试多种可能的数据结构
-        if 'data' in data and len(data['data']) > 0:
-            if 'b64_json' in data['data'][0]:
-                # 解码base64图片数据
-                image_data = base64.b64decode(data['data'][0]['b64_json'])
-            elif 'b64' in data['data'][0]:
-                base64_image = data['data'][0]['b64']
-                # 移除可能的前缀
-                if base64_image.startswith('data:image/'):
-                    base64_image = base64_image.split(',')[1]
-                image_data = base64.b64decode(base64_image)
-            elif 'url' in data['data'][0]:
-                # 从URL获取图片数据
-                # print(f"从URL获取图片: {data['data'][0]['url']}")
-                image_response = requests.get(data['data'][0]['url'])
-                image_response.raise_for_status()
-                image_data = image_response.content
-            else:
-                # 打印响应数据结构，帮助调试
-                print("错误: API响应中不包含可识别的图片数据格式！")
-                print(f"响应数据结构: {json.dumps(data, ensure_ascii=False, indent=2)}")
-                raise ValueError("API响应中不包含可识别的图片数据格式")
-        else:
-            # 打印响应数据结构，帮助调试
-            print("错误: API响应中不包含图片数据！")
-            print(f"响应数据结构: {json.dumps(data, ensure_ascii=False, indent=2)}")
-            raise ValueError("API响应中不包含图片数据")
-        
-        # 生成唯一文件名
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
-        filename = f"generated_image_{timestamp}.png"
-        
-        # 确保保存目录存在
-        save_dir = ensure_directory_exists(os.path.join(os.path.dirname(__file__), 'static', 'images'))
-        filepath = os.path.join(save_dir, filename)
-        
-        # 保存图片
-        with open(filepath, 'wb') as f:
-            f.write(image_data)
-            
-        print(f"图片已保存: {filepath}")
-        return filepath
-    
-    except requests.exceptions.RequestException as e:
-        print(f"API请求失败: {str(e)}")
-        raise
-    
-    except Exception as e:
-        print(f"图片生成过程中发生未知错误: {str(e)}")
-        raise
+    return image_pipeline.submit(prompt, width, height).result()
 
 # 批量生成多张图片
 def generate_multiple_images(prompts, width=512, height=512):
     """
-    批量生成多张图片
+    批量生成多张图片（所有图片同时提交，总耗时接近最慢的一张而不是各张之和）
     
     参数:
         prompts (list): 提示词列表，每个提示词生成一张图片
@@ -165,14 +222,13 @@ def generate_multiple_images(prompts, width=512, height=512):
     """
     
     image_paths = []
-    for i, prompt in enumerate(prompts):
+    futures = image_pipeline.submit_many(prompts, width, height)
+    for i, future in enumerate(futures):
         try:
-            print(f"正在生成图片: {prompt} (image {i+1}/{len(prompts)})")
-            image_path = generate_image(prompt, width, height)
-            image_paths.append(image_path)
+            image_paths.append(future.result())
         except Exception as e:
-            print(f"生成图片失败 (image {i+1}): {str(e)}")
-            # 继续尝试生成其他图片
+            logger.error("生成图片失败 (image %s): %s", i + 1, e)
+            # 继续收集其他图片
     
     return image_paths
 
@@ -0,0 +1,135 @@
+"""
+内容寻址的图片存储（static/images）
+- 原图按内容的SHA-256命名（<哈希>.png），同样的图片只存一份，重复写入直接返回已有文件
+- 入库时同时生成WebP原尺寸图和多个尺寸的WebP缩略图，放在 static/images/variants/ 下
+- 文件名由内容决定、写入后不再修改，/api/images/<文件名> 可以返回长期有效的 immutable 缓存头
+- 旧的按时间戳命名的图片没有预生成的衍生图，第一次请求时按需生成
+"""
+import hashlib
+import io
+import logging
+import os
+import re
+import uuid
+
+from PIL import Image
+
+try:
+    from config import Config
+except ImportError:
+    from onlineworld_backend.config import Config
+
+logger = logging.getLogger(__name__)
+
+# 衍生图：名称 -> 最长边像素（None 表示原尺寸），统一输出WebP
+VARIANTS = {
+    "webp": None,
+    "thumb": 128,
+    "small": 256,
+    "medium": 512,
+}
+WEBP_QUALITY = 80
+# 内容寻址文件名：64位十六进制哈希 + 扩展名
+HASHED_NAME = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]+$")
+
+
+def is_content_addressed(filename):
+    """文件名是否由内容哈希生成（内容不会变化，可以永久缓存）"""
+    return bool(HASHED_NAME.match(os.path.basename(filename)))
+
+
+class ImageStore:
+    """
+    内容寻址的图片存储（线程安全：所有写入都是临时文件+原子改名）
+    :param root: 图片目录，默认 static/images
+    """
+
+    def __init__(self, root=None):
+        self.root = root or Config.IMAGE_STORE_DIR
+        self.variant_dir = os.path.join(self.root, "variants")
+
+    def put(self, data, ext="png"):
+        """
+        保存图片并生成衍生图
+        :param data: 图片字节
+        :param ext: 原图扩展名
+        :return: 原图保存路径（内容相同的图片返回同一路径）
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        filename = f"{digest}.{ext}"
+        path = os.path.join(self.root, filename)
+        if os.path.exists(path):
+            logger.debug("图片已存在，复用: %s", path)
+            return path
+
+        os.makedirs(self.root, exist_ok=True)
+        # 先写临时文件再改名，并发写入同一图片时读方不会看到写了一半的文件
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        try:
+            self.make_variants(filename, data)
+        except Exception as e:
+            # 衍生图生成失败不影响原图，请求时会按需重新生成
+            logger.warning("生成衍生图失败: %s: %s", filename, e)
+        return path
+
+    def put_image(self, image):
+        """保存PIL图片对象（转成PNG字节后入库）"""
+        buffer = io.BytesIO()
+        image.save(buffer, "PNG")
+        return self.put(buffer.getvalue())
+
+    def make_variants(self, filename, data=None):
+        """
+        生成全部衍生图（已存在的跳过）
+        :param data: 原图字节，不传时从文件读取
+        """
+        if data is None:
+            with open(os.path.join(self.root, filename), "rb") as f:
+                data = f.read()
+        with Image.open(io.BytesIO(data)) as image:
+            image.load()
+            for variant in VARIANTS:
+                self._write_variant(image, filename, variant)
+
+    def variant_path(self, filename, variant):
+        """
+        衍生图路径，不存在时从原图生成
+        :param filename: 原图文件名（相对图片目录）
+        :param variant: VARIANTS 中的名称
+        :return: 衍生图路径，原图不存在时返回None
+        """
+        path = self._variant_file(filename, variant)
+        if os.path.exists(path):
+            return path
+        original = os.path.join(self.root, filename)
+        if not os.path.isfile(original):
+            return None
+        with Image.open(original) as image:
+            image.load()
+            self._write_variant(image, filename, variant)
+        return path
+
+    def _variant_file(self, filename, variant):
+        stem = os.path.splitext(filename)[0].replace("/", "_").replace(os.sep, "_")
+        return os.path.join(self.variant_dir, f"{stem}_{variant}.webp")
+
+    def _write_variant(self, image, filename, variant):
+        path = self._variant_file(filename, variant)
+        if os.path.exists(path):
+            return path
+        size = VARIANTS[variant]
+        copy = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+        if size:
+            copy.thumbnail((size, size), Image.LANCZOS)
+        os.makedirs(self.variant_dir, exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        copy.save(tmp_path, "WEBP", quality=WEBP_QUALITY, method=4)
+        os.replace(tmp_path, path)
+        return path
+
+
+# 全局图片存储
+image_store = ImageStore()
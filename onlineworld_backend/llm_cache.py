@@ -0,0 +1,208 @@
+"""
+大模型响应缓存（本地SQLite文件，多个进程共享）
+生成器反复发送几乎相同的提示词（执行计划模板、DataSheet文案、动态页面等），命中缓存时不再付出接口延迟和费用
+- 缓存键 = 模型 + 规范化后的消息（折叠空白，三引号缩进不同的同一提示词视为相同）+ 温度档位（保留1位小数）
+  + 工具定义 + max_tokens 等其他请求字段
+- 淘汰：条目超过TTL即失效；条目数超过上限时按最近访问时间淘汰最久未用的（LRU）
+- 温度不低于 LLM_CACHE_MAX_TEMPERATURE 的调用默认不缓存；需要每次结果都不同的调用（发帖、商品、DataSheet文案生成）传 cache=False，
+  结果可以复用的调用（执行计划、动态页面）传 cache=True
+- 命中率统计：stats() 返回本进程的命中/未命中次数，以及缓存文件中累计的命中次数
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+try:
+    from config import Config
+except ImportError:
+    from onlineworld_backend.config import Config
+
+# 每写入多少次检查一次淘汰
+PRUNE_INTERVAL = 100
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_messages(messages):
+    """
+    规范化消息：字符串消息转成单条用户消息，文本内容折叠连续空白并去掉首尾空白
+    其他字段（tool_calls、tool_call_id、name 等）原样保留
+    """
+    if isinstance(messages, str):
+        messages = [{"role": "user", "content": messages}]
+    normalized = []
+    for message in messages:
+        message = dict(message)
+        if isinstance(message.get("content"), str):
+            message["content"] = _WHITESPACE.sub(" ", message["content"]).strip()
+        normalized.append(message)
+    return normalized
+
+
+def make_cache_key(payload):
+    """
+    请求体 -> 缓存键
+    :param payload: chat/completions 请求体（model、messages、temperature、tools 等）
+    """
+    keyed = dict(payload)
+    keyed["messages"] = normalize_messages(payload.get("messages") or [])
+    keyed["temperature"] = f"{float(payload.get('temperature') or 0):.1f}"
+    raw = json.dumps(keyed, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def is_cacheable(result):
+    """只缓存有实际内容（文本或工具调用）的响应"""
+    try:
+        message = result["choices"][0]["message"]
+    except (KeyError, IndexError, TypeError):
+        return False
+    return bool((message.get("content") or "").strip() or message.get("reasoning_content") or message.get("tool_calls"))
+
+
+class LLMResponseCache:
+    """
+    大模型响应缓存（线程安全）
+    :param path: SQLite文件路径
+    :param ttl: 条目有效秒数
+    :param max_entries: 最多保留的条目数
+    :param max_temperature: cache参数未指定时，温度不高于此值的调用才缓存
+    :param enabled: 为False时 get/set 都不生效
+    """
+
+    def __init__(self, path=None, ttl=None, max_entries=None, max_temperature=None, enabled=None):
+        self.path = path or Config.LLM_CACHE_PATH
+        self.ttl = Config.LLM_CACHE_TTL if ttl is None else ttl
+        self.max_entries = max_entries or Config.LLM_CACHE_MAX_ENTRIES
+        self.max_temperature = Config.LLM_CACHE_MAX_TEMPERATURE if max_temperature is None else max_temperature
+        self.enabled = Config.LLM_CACHE_ENABLED if enabled is None else enabled
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        """首次使用时打开缓存文件并建表（调用方持有锁）"""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT,
+                    response TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_last_access ON llm_cache (last_access)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def should_cache(self, temperature, cache=None):
+        """
+        本次调用是否走缓存
+        :param cache: 调用方指定（True/False），None 时按温度判断
+        """
+        if not self.enabled:
+            return False
+        if cache is not None:
+            return bool(cache)
+        return (temperature or 0) < self.max_temperature
+
+    def get(self, key):
+        """取缓存的响应，不存在或已过期返回None"""
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connection()
+                row = conn.execute("SELECT response, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is None or row[1] + self.ttl < now:
+                    if row is not None:
+                        conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                        conn.commit()
+                    self.misses += 1
+                    return None
+                conn.execute("UPDATE llm_cache SET last_access = ?, hits = hits + 1 WHERE key = ?", (now, key))
+                conn.commit()
+                self.hits += 1
+            return json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            print(f"❌ 读取大模型响应缓存失败: {str(e)}")
+            return None
+
+    def set(self, key, result, model=None):
+        """写入响应（没有实际内容的响应不缓存）"""
+        if not is_cacheable(result):
+            return
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, model, response, created, last_access, hits) "
+                    "VALUES (?, ?, ?, ?, ?, 0)",
+                    (key, model, json.dumps(result, ensure_ascii=False), now, now)
+                )
+                conn.commit()
+                self.stores += 1
+                if self.stores % PRUNE_INTERVAL == 0:
+                    self._prune(conn, now)
+        except sqlite3.Error as e:
+            print(f"❌ 写入大模型响应缓存失败: {str(e)}")
+
+    def _prune(self, conn, now):
+        """删除过期条目，超出上限时按最近访问时间淘汰（调用方持有锁）"""
+        conn.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl,))
+        conn.execute("""
+            DELETE FROM llm_cache WHERE key IN (
+                SELECT key FROM llm_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+        conn.commit()
+
+    def prune(self):
+        """立即执行一次淘汰"""
+        with self._lock:
+            self._prune(self._connection(), time.time())
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._connection().execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def stats(self):
+        """
+        命中率统计
+        :return: 本进程的 hits / misses / hit_rate / stores，以及缓存文件中的条目数和累计命中次数
+        """
+        lookups = self.hits + self.misses
+        data = {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores
+        }
+        try:
+            with self._lock:
+                entries, total_hits = self._connection().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM llm_cache").fetchone()
+            data.update(entries=entries, total_hits=total_hits)
+        except sqlite3.Error as e:
+            print(f"❌ 读取大模型响应缓存统计失败: {str(e)}")
+        return data
+
+
+# 全局响应缓存
+llm_cache = LLMResponseCache()
@@ -0,0 +1,403 @@
+"""
+大模型API共享客户端（硅基流动 OpenAI兼容的 chat/completions 接口）
+所有生成器（论坛内容、动态页面、商城商品、DataSheet）共用一个客户端：
+- 同步调用共享一个 requests.Session：连接池 + keep-alive，不再每次调用重新做TCP+TLS握手
+- 异步调用 achat()：安装了aiohttp时走原生异步HTTP，否则放到线程池里执行同步调用
+- 并发上限：同时在途的请求数不超过 LLM_MAX_CONCURRENCY
+- 按主机限速：令牌桶，每个主机每秒最多 LLM_RATE_LIMIT 个请求（<=0 表示不限速）
+- 重试：网络错误、429、5xx 按指数退避 + 随机抖动重试，服务端给了 Retry-After 时按它等待
+- 响应缓存：相同（规范化后）的请求直接返回本地缓存的响应，见 llm_cache.py；cache=False 跳过
+- 流式输出 stream_chat()：边接收边检查，调用方给的 stop_when 判断结构已完整时立即断开，不等模型写满 max_tokens
+- 日志：每次调用一行结构化记录（模型、提示词长度、耗时、首token耗时、输出长度、结束原因），
+  成功的调用按 LLM_LOG_SAMPLE_RATE 抽样记录，失败的调用总是记录；不再打印完整的请求/响应
+"""
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+import weakref
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+try:
+    from config import Config
+    from llm_cache import llm_cache, make_cache_key
+except ImportError:
+    from onlineworld_backend.config import Config
+    from onlineworld_backend.llm_cache import llm_cache, make_cache_key
+
+logger = logging.getLogger(__name__)
+
+# 可重试的HTTP状态码
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# 退避基数与上限（秒）
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+
+
+class LLMError(Exception):
+    """大模型调用最终失败（已用完重试次数或遇到不可重试的错误）"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class HostRateLimiter:
+    """
+    按主机的令牌桶限速（线程安全）
+    采用预约方式：取令牌时直接扣减，返回需要等待的秒数，由调用方同步sleep或异步await
+    也可用作token预算（rate为每秒token数，每次预约按预估token数扣减）
+    :param rate: 每秒允许的请求数，<=0 表示不限速
+    :param burst: 桶容量（允许的瞬时突发），默认等于rate
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self._buckets = {}  # {主机: (剩余令牌, 上次补充时间)}
+        self._lock = threading.Lock()
+
+    def reserve(self, host, cost=1):
+        """预约cost个令牌，返回需要等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            tokens, last = self._buckets.get(host, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - last) * self.rate) - cost
+            self._buckets[host] = (tokens, now)
+        return 0.0 if tokens >= 0 else -tokens / self.rate
+
+
+def backoff_delay(attempt, retry_after=None):
+    """
+    第attempt次重试前的等待时间：指数退避 + 随机抖动（避免多个并发请求同时重试）
+    服务端返回了 Retry-After 时优先使用
+    """
+    if retry_after:
+        try:
+            return min(BACKOFF_MAX, float(retry_after))
+        except ValueError:
+            pass
+    return min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)) * random.uniform(0.5, 1.5)
+
+
+def message_content(result):
+    """从chat/completions响应里取出文本（content为空时取reasoning_content），没有时返回空字符串"""
+    if not result or not result.get("choices"):
+        return ""
+    message = result["choices"][0].get("message") or {}
+    return (message.get("content") or "").strip() or (message.get("reasoning_content") or "").strip()
+
+
+def log_call(payload, start, result=None, error=None, **fields):
+    """
+    记录一次调用（结构化、抽样）
+    :param payload: 请求体（只记录长度等摘要，不记录内容）
+    :param start: 调用开始时间（time.monotonic()）
+    :param result: 接口返回的JSON
+    :param error: 失败原因，失败的调用不抽样总是记录
+    """
+    if error is None and random.random() >= Config.LLM_LOG_SAMPLE_RATE:
+        return
+    if not logger.isEnabledFor(logging.WARNING if error is not None else logging.INFO):
+        return
+    record = {
+        "model": payload.get("model"),
+        "messages": len(payload.get("messages") or []),
+        "prompt_chars": sum(len(m.get("content") or "") for m in payload.get("messages") or []
+                            if isinstance(m.get("content"), str)),
+        "max_tokens": payload.get("max_tokens"),
+        "tools": len(payload.get("tools") or []),
+        "stream": bool(payload.get("stream")),
+        "latency_ms": round((time.monotonic() - start) * 1000),
+        **fields
+    }
+    if result is not None:
+        choice = (result.get("choices") or [{}])[0]
+        record["completion_chars"] = len(message_content(result))
+        record["finish_reason"] = choice.get("finish_reason")
+        record["completion_tokens"] = (result.get("usage") or {}).get("completion_tokens")
+    if error is not None:
+        record["error"] = str(error)[:200]
+        logger.warning("llm_call %s", json.dumps(record, ensure_ascii=False))
+    else:
+        logger.info("llm_call %s", json.dumps(record, ensure_ascii=False))
+
+
+def read_event_stream(response, stop_when=None):
+    """
+    读取SSE流式响应，拼成与非流式接口相同结构的JSON
+    :param stop_when: stop_when(已收到的文本) 返回True时立即停止读取，finish_reason 记为 "cutoff"
+    :return: (结果JSON, 首个token的到达时间 time.monotonic())
+    """
+    content, reasoning = "", ""
+    finish_reason, usage, first_token_at = None, None, None
+    # chunk_size=None：数据到达即处理，不等凑满缓冲区
+    for line in response.iter_lines(chunk_size=None):
+        # 按行解码：一行是一个完整的事件，不会截断多字节字符
+        line = line.decode("utf-8").strip() if line else ""
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            break
+        chunk = json.loads(data)
+        usage = chunk.get("usage") or usage
+        choice = (chunk.get("choices") or [{}])[0]
+        delta = choice.get("delta") or {}
+        finish_reason = choice.get("finish_reason") or finish_reason
+        reasoning += delta.get("reasoning_content") or ""
+        piece = delta.get("content") or ""
+        if not piece:
+            continue
+        first_token_at = first_token_at or time.monotonic()
+        content += piece
+        if stop_when and stop_when(content):
+            finish_reason = "cutoff"
+            break
+    message = {"role": "assistant", "content": content}
+    if reasoning:
+        message["reasoning_content"] = reasoning
+    return {"choices": [{"message": message, "finish_reason": finish_reason}], "usage": usage}, first_token_at
+
+
+class LLMClient:
+    """
+    共享的大模型客户端（线程安全，进程内使用全局实例 llm_client）
+    api_url / api_key / model 可按调用覆盖，默认取 Config
+    :param max_concurrency: 同时在途的请求数上限
+    :param rate_limit: 每个主机每秒请求数上限
+    :param max_retries: 可重试错误的最大重试次数
+    :param pool_size: 连接池大小
+    :param cache: 响应缓存，默认用全局 llm_cache
+    """
+
+    def __init__(self, max_concurrency=None, rate_limit=None, max_retries=None, pool_size=None, cache=None):
+        self.max_concurrency = max_concurrency or Config.LLM_MAX_CONCURRENCY
+        self.max_retries = Config.LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.pool_size = pool_size or max(self.max_concurrency, 10)
+        self.rate_limiter = HostRateLimiter(Config.LLM_RATE_LIMIT if rate_limit is None else rate_limit)
+        self.cache = cache or llm_cache
+
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        # 异步状态按事件循环隔离：{事件循环: (asyncio.Semaphore, aiohttp.ClientSession)}
+        self._async_states = weakref.WeakKeyDictionary()
+
+    def _build_request(self, messages, temperature, max_tokens, tools, api_url, api_key, model, extra):
+        if isinstance(messages, str):
+            messages = [{"role": "user", "content": messages}]
+        payload = {
+            "model": model or Config.AI_MODEL_NAME,
+            "messages": messages,
+            "temperature": temperature,
+            **extra
+        }
+        if max_tokens:
+            payload["max_tokens"] = max_tokens
+        if tools:
+            payload["tools"] = tools
+            payload.setdefault("tool_choice", "auto")
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key or Config.SILICON_FLOW_API_KEY}"
+        }
+        return api_url or Config.SILICON_FLOW_API_URL, headers, payload
+
+    # -------------------------- 同步调用 --------------------------
+    def chat(self, messages, temperature=0.7, max_tokens=None, tools=None, timeout=60,
+             api_url=None, api_key=None, model=None, cache=None, **extra):
+        """
+        调用 chat/completions 接口
+        :param messages: 消息列表（或单条用户消息字符串）
+        :param tools: OpenAI格式的工具定义列表
+        :param cache: 是否使用响应缓存，None 时按温度决定（见 llm_cache.py），需要每次结果不同的调用传 False
+        :param extra: 其他请求字段（如 response_format）
+        :return: 接口返回的JSON
+        :raises LLMError: 重试用完仍失败或遇到不可重试的错误
+        """
+        url, headers, payload = self._build_request(messages, temperature, max_tokens, tools,
+                                                    api_url, api_key, model, extra)
+        start = time.monotonic()
+        cache_key = None
+        if self.cache.should_cache(temperature, cache):
+            cache_key = make_cache_key(payload)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                log_call(payload, start, cached, cached=True)
+                return cached
+        try:
+            result = self._post(url, headers, payload, timeout)
+        except LLMError as e:
+            log_call(payload, start, error=e)
+            raise
+        log_call(payload, start, result)
+        if cache_key:
+            self.cache.set(cache_key, result, payload["model"])
+        return result
+
+    def stream_chat(self, messages, temperature=0.7, max_tokens=None, timeout=60,
+                    api_url=None, api_key=None, model=None, stop_when=None, cache=None, **extra):
+        """
+        流式调用 chat/completions 接口（不支持工具调用），返回值结构与 chat() 相同
+        :param max_tokens: 本次输出的token上限（按用途设置，如一条回复只需要几百token）
+        :param stop_when: stop_when(已收到的文本) 返回True时立即断开，不再等待剩余输出
+        :param cache: 同 chat()；被提前截断的结果不写入缓存
+        :raises LLMError: 重试用完仍失败或遇到不可重试的错误（已开始接收输出后断流也会整体重试）
+        """
+        url, headers, payload = self._build_request(messages, temperature, max_tokens, None,
+                                                    api_url, api_key, model, extra)
+        start = time.monotonic()
+        cache_key = None
+        if self.cache.should_cache(temperature, cache):
+            # 与非流式调用共用缓存键
+            cache_key = make_cache_key(payload)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                log_call(payload, start, cached, cached=True)
+                return cached
+        payload = {**payload, "stream": True}
+        try:
+            result, first_token_at = self._post(url, headers, payload, timeout,
+                                                reader=lambda response: read_event_stream(response, stop_when))
+        except LLMError as e:
+            log_call(payload, start, error=e)
+            raise
+        log_call(payload, start, result,
+                 first_token_ms=round((first_token_at - start) * 1000) if first_token_at else None)
+        if cache_key and result["choices"][0]["finish_reason"] != "cutoff":
+            self.cache.set(cache_key, result, payload["model"])
+        return result
+
+    def _post(self, url, headers, payload, timeout, reader=None):
+        """
+        发送请求（限速、并发上限、退避重试）
+        :param reader: 流式读取函数 reader(响应)，读取期间一直占用并发名额；为None时返回响应JSON
+        """
+        host = urlparse(url).netloc
+        for attempt in range(self.max_retries + 1):
+            time.sleep(self.rate_limiter.reserve(host))
+            retry_after = None
+            try:
+                with self._semaphore:
+                    with self._session.post(url, headers=headers, json=payload, timeout=timeout,
+                                            stream=reader is not None) as response:
+                        if response.status_code == 200:
+                            return reader(response) if reader else response.json()
+                        error = LLMError(f"API调用失败: {response.status_code}, {response.text[:200]}",
+                                         response.status_code)
+                        retry_after = response.headers.get("Retry-After")
+                if response.status_code not in RETRYABLE_STATUS:
+                    raise error
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                error = LLMError(f"API请求异常: {str(e)}")
+            except ValueError as e:
+                raise LLMError(f"API响应不是合法JSON: {str(e)}")
+
+            if attempt < self.max_retries:
+                delay = backoff_delay(attempt, retry_after)
+                logger.warning("🔁 %s，%.1f秒后重试（%s/%s）", error, delay, attempt + 1, self.max_retries)
+                time.sleep(delay)
+        raise error
+
+    def chat_text(self, messages, **kwargs):
+        """调用接口并只返回文本内容"""
+        return message_content(self.chat(messages, **kwargs))
+
+    def stream_text(self, messages, **kwargs):
+        """流式调用并只返回文本内容"""
+        return message_content(self.stream_chat(messages, **kwargs))
+
+    # -------------------------- 异步调用 --------------------------
+    def _async_state(self):
+        loop = asyncio.get_running_loop()
+        state = self._async_states.get(loop)
+        if state is None:
+            session = None
+            if aiohttp is not None:
+                session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.pool_size))
+            state = (asyncio.Semaphore(self.max_concurrency), session)
+            self._async_states[loop] = state
+        return state
+
+    async def achat(self, messages, temperature=0.7, max_tokens=None, tools=None, timeout=60,
+                    api_url=None, api_key=None, model=None, cache=None, **extra):
+        """chat() 的异步版本，参数和返回值相同"""
+        semaphore, session = self._async_state()
+        if session is None:
+            # 未安装aiohttp：在线程池里执行同步调用（并发仍受同步信号量约束）
+            return await asyncio.to_thread(self.chat, messages, temperature, max_tokens, tools, timeout,
+                                           api_url, api_key, model, cache, **extra)
+
+        url, headers, payload = self._build_request(messages, temperature, max_tokens, tools,
+                                                    api_url, api_key, model, extra)
+        cache_key = None
+        if self.cache.should_cache(temperature, cache):
+            cache_key = make_cache_key(payload)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        result = await self._apost(session, semaphore, url, headers, payload, timeout)
+        if cache_key:
+            self.cache.set(cache_key, result, payload["model"])
+        return result
+
+    async def _apost(self, session, semaphore, url, headers, payload, timeout):
+        """异步发送请求（限速、并发上限、退避重试）"""
+        host = urlparse(url).netloc
+        for attempt in range(self.max_retries + 1):
+            await asyncio.sleep(self.rate_limiter.reserve(host))
+            retry_after = None
+            try:
+                async with semaphore:
+                    async with session.post(url, headers=headers, json=payload,
+                                            timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                        if response.status == 200:
+                            return await response.json(content_type=None)
+                        text = await response.text()
+                        retry_after = response.headers.get("Retry-After")
+                error = LLMError(f"API调用失败: {response.status}, {text[:200]}", response.status)
+                if response.status not in RETRYABLE_STATUS:
+                    raise error
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                error = LLMError(f"API请求异常: {str(e)}")
+            except ValueError as e:
+                raise LLMError(f"API响应不是合法JSON: {str(e)}")
+
+            if attempt < self.max_retries:
+                delay = backoff_delay(attempt, retry_after)
+                logger.warning("🔁 %s，%.1f秒后重试（%s/%s）", error, delay, attempt + 1, self.max_retries)
+                await asyncio.sleep(delay)
+        raise error
+
+    async def achat_text(self, messages, **kwargs):
+        """achat() 并只返回文本内容"""
+        return message_content(await self.achat(messages, **kwargs))
+
+    async def aclose(self):
+        """关闭当前事件循环上的aiohttp会话（在事件循环结束前调用）"""
+        state = self._async_states.pop(asyncio.get_running_loop(), None)
+        if state and state[1] is not None:
+            await state[1].close()
+
+    def close(self):
+        """关闭同步连接池"""
+        self._session.close()
+
+
+# 全局共享客户端
+llm_client = LLMClient()
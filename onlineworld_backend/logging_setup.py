@@ -0,0 +1,91 @@
+"""
+日志配置（Web应用、内容生成器、任务worker共用）
+- 各模块用 logging.getLogger(__name__) 记录，按模块名单独设置级别：
+  LOG_LEVELS="forum.blueprints.api=DEBUG,llm_client=WARNING"
+- 惰性格式化：日志参数用 %s 占位传入（logger.debug("关键词: %s", keyword)），级别未开启时不做任何字符串拼接
+- 输出放到后台队列：请求线程只把日志记录放进队列，由 QueueListener 线程写stdout/文件，慢IO不占用请求时间
+- LOG_FORMAT=json 时每条日志一行JSON（时间、级别、模块、消息、extra字段），便于收集分析
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+from datetime import datetime, timezone
+
+try:
+    from config import Config
+except ImportError:
+    from onlineworld_backend.config import Config
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+# LogRecord 自带的属性，其余属性视为 extra 字段
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志格式化为一行JSON，logger.info(..., extra={...}) 传入的字段一并输出"""
+
+    def format(self, record):
+        data = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def parse_levels(spec):
+    """
+    解析按模块设置的级别
+    :param spec: "模块名=级别,模块名=级别"
+    :return: {模块名: 级别}
+    """
+    levels = {}
+    for item in (spec or "").split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(level=None, module_levels=None, log_format=None, log_file=None):
+    """
+    配置根日志器（重复调用只生效一次）
+    :param level: 全局级别，默认 LOG_LEVEL
+    :param module_levels: {模块名: 级别}，默认解析 LOG_LEVELS
+    :param log_format: "text" 或 "json"，默认 LOG_FORMAT
+    :param log_file: 额外写入的日志文件，默认 LOG_FILE（为空时只输出到stdout）
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    formatter = JsonFormatter() if (log_format or Config.LOG_FORMAT) == "json" else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler()]
+    log_file = log_file or Config.LOG_FILE
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level or Config.LOG_LEVEL)
+    for name, module_level in (module_levels or parse_levels(Config.LOG_LEVELS)).items():
+        logging.getLogger(name).setLevel(module_level)
@@ -8,20 +8,24 @@ from apscheduler.schedulers.blocking import BlockingScheduler
 from config import Config
 
 # 导入模型（直接导入，无Flask依赖）
-from forum.models import db, SearchIndex, Board, Post, ShopProduct, DynamicPage, ShopCategory, ShopMerchant, Product, ProductCategory
+from forum.models import db
+from forum.search_index import build_search_index as rebuild_search_index
 
 # -------------------------- 配置 --------------------------
 # 数据库配置
 DATABASE_URL = Config.SQLALCHEMY_DATABASE_URI
 
 # 更新频率配置
-UPDATE_INTERVAL_HOURS = 1  # 每小时更新一次
+# 增删改已由模型写入事件增量同步，这里的全量重建只是离线对账，不需要频繁执行
+UPDATE_INTERVAL_HOURS = 24  # 每天对账一次
 
 # -------------------------- 数据库初始化（无Flask依赖！）--------------------------
 # 创建数据库引擎
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})  # SQLite需加此参数
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 独立运行时确保倒排索引等新表存在（Flask应用启动时由db.create_all()完成）
+db.metadata.create_all(bind=engine)
 
 # -------------------------- 工具函数 --------------------------
 def get_db():
@@ -32,151 +36,35 @@ def get_db():
     finally:
         db.close()
 
+# 各实体类型在日志中的名称
+ENTITY_TYPE_NAMES = {
+    "home": "模块首页",
+    "forum_board": "论坛板块",
+    "forum_post": "论坛帖子",
+    "shop_product": "商城商品",
+    "dynamic_page": "动态页面",
+    "shop_category": "商城分类",
+    "shop_merchant": "商城商家",
+    "product": "产品",
+    "product_category": "产品分类",
+}
+
 def build_search_index():
     """
-    构建搜索索引，从所有可搜索的模型中提取标题并存储到SearchIndex表
+    全量重建搜索索引（离线对账）
+    日常的增删改已由模型写入事件增量同步，这里只负责修复漂移（如绕过ORM的批量写入）
     """
     print(f"\n{'='*60}")
-    print(f"🔄 开始构建搜索索引 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"🔄 开始对账搜索索引 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     
+    db = next(get_db())
     try:
-        db = next(get_db())
-        
-        # 首先清空现有的索引
-        db.query(SearchIndex).delete()
-        db.commit()
-        
-        # 从各个模型中提取标题并创建索引
-        search_indexes = []
-        
-        # 0. 各个模块的首页
-        # 论坛首页
-        search_indexes.append(SearchIndex(
-            title="论坛首页", entity_type="forum_home", 
-            entity_id=0, url="/forum"
-        ))
-        
-        # 商城首页
-        search_indexes.append(SearchIndex(
-            title="商城首页", entity_type="shop_home", 
-            entity_id=0, url="/shop"
-        ))
-        
-        # 产品首页
-        search_indexes.append(SearchIndex(
-            title="产品首页", entity_type="product_home", 
-            entity_id=0, url="/products"
-        ))
-        
-        # 动态页面首页
-        search_indexes.append(SearchIndex(
-            title="动态页面首页", entity_type="dynamic_home", 
-            entity_id=0, url="/dynamic"
-        ))
-        
-        print(f"📋 已处理模块首页: {len([i for i in search_indexes if i.entity_type.endswith('_home')])}条")
-        
-        # 1. 论坛板块 (Board)
-        boards = db.query(Board).all()
-        for board in boards:
-            index = SearchIndex(
-                title=board.name,
-                entity_type="forum_board",
-                entity_id=board.id,
-                url=f"/forum/board/{board.id}"
-            )
-            search_indexes.append(index)
-        print(f"📋 已处理论坛板块: {len(boards)}条")
+        counts = rebuild_search_index(db)
         
-        # 2. 论坛帖子 (Post)
-        posts = db.query(Post).all()
-        for post in posts:
-            index = SearchIndex(
-                title=post.title,
-                entity_type="forum_post",
-                entity_id=post.id,
-                url=f"/forum/post/{post.id}"
-            )
-            search_indexes.append(index)
-        print(f"📋 已处理论坛帖子: {len(posts)}条")
+        for entity_type, count in counts.items():
+            print(f"📋 已处理{ENTITY_TYPE_NAMES.get(entity_type, entity_type)}: {count}条")
         
-        # 3. 商城商品 (ShopProduct)
-        products = db.query(ShopProduct).filter_by(is_active=True).all()
-        for product in products:
-            index = SearchIndex(
-                title=product.name,
-                entity_type="shop_product",
-                entity_id=product.id,
-                url=f"/shop/product/{product.id}"
-            )
-            search_indexes.append(index)
-        print(f"📋 已处理商城商品: {len(products)}条")
-        
-        # 4. 动态页面 (DynamicPage)
-        pages = db.query(DynamicPage).filter_by(is_active=True, is_public=True).all()
-        for page in pages:
-            index = SearchIndex(
-                title=page.title,
-                entity_type="dynamic_page",
-                entity_id=page.id,
-                url=f"/dynamic/{page.slug}"
-            )
-            search_indexes.append(index)
-        print(f"📋 已处理动态页面: {len(pages)}条")
-        
-        # 5. 商城分类 (ShopCategory)
-        shop_categories = db.query(ShopCategory).filter_by(is_active=True).all()
-        for category in shop_categories:
-            index = SearchIndex(
-                title=category.name,
-                entity_type="shop_category",
-                entity_id=category.id,
-                url=f"/shop/category/{category.id}"
-            )
-            search_indexes.append(index)
-        print(f"📋 已处理商城分类: {len(shop_categories)}条")
-        
-        # 6. 商城商家 (ShopMerchant)
-        shop_merchants = db.query(ShopMerchant).filter_by(is_active=True).all()
-        for merchant in shop_merchants:
-            index = SearchIndex(
-                title=merchant.name,
-                entity_type="shop_merchant",
-                entity_id=merchant.id,
-                url=f"/shop/merchant/{merchant.id}"
-            )
-            search_indexes.append(index)
-        print(f"📋 已处理商城商家: {len(shop_merchants)}条")
-        
-        # 7. 产品 (Product)
-        products = db.query(Product).filter_by(is_active=True).all()
-        for product in products:
-            index = SearchIndex(
-                title=product.name,
-                entity_type="product",
-                entity_id=product.id,
-                url=f"/products/{product.id}"
-            )
-            search_indexes.append(index)
-        print(f"📋 已处理产品: {len(products)}条")
-        
-        # 8. 产品分类 (ProductCategory)
-        product_categories = db.query(ProductCategory).all()
-        for category in product_categories:
-            index = SearchIndex(
-                title=category.name,
-                entity_type="product_category",
-                entity_id=category.id,
-                url=f"/products/category/{category.id}"
-            )
-            search_indexes.append(index)
-        print(f"📋 已处理产品分类: {len(product_categories)}条")
-        
-        # 批量添加索引
-        db.add_all(search_indexes)
-        db.commit()
-        
-        total_records = len(search_indexes)
+        total_records = sum(counts.values())
         print(f"✅ 搜索索引构建完成！共添加 {total_records} 条记录")
         print(f"{'='*60}\n")
         
@@ -187,6 +75,7 @@ def build_search_index():
         }
         
     except Exception as e:
+        db.rollback()
         print(f"❌ 构建索引失败: {str(e)}")
         print(f"{'='*60}\n")
         return {
@@ -194,6 +83,8 @@ def build_search_index():
             "message": f"构建索引失败：{str(e)}",
             "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
+    finally:
+        db.close()
 
 def main():
     """主程序入口"""
@@ -213,7 +104,7 @@ def main():
         trigger="interval",
         hours=UPDATE_INTERVAL_HOURS,
         id="auto_update_search_index",
-        name="自动更新搜索索引"
+        name="搜索索引离线对账"
     )
     
     # 立即执行一次索引构建
@@ -1,12 +1,12 @@
 from datetime import datetime, timedelta
 import random
 import json
-import requests
 import os
 from config import Config
+from llm_client import llm_client, LLMError, message_content
 
 # 导入图像生成模块
-from image_generator import generate_image
+from image_generator import image_pipeline
 
 class ShopAIGenerator:
     def __init__(self, db, config=None):
@@ -54,39 +54,27 @@ class ShopAIGenerator:
             return default_data
             
         # 真实API调用逻辑
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
         prompt = f"""请生成一个{category_name}类别的二手商品数据，商家名称是{merchant_name}。
         返回格式必须是JSON，包含：name（商品名称）、description（商品描述）、price（价格，100-1000之间）、
         image_count（图片数量，1-3张）、tags（标签数组，3-5个）。
         请确保JSON格式正确，不要包含任何其他文本。"""
         
+        # 网络错误、限流、5xx由共享客户端退避重试；这里的多次尝试只针对返回内容不是合法JSON的情况
         for attempt in range(retries):
             try:
-                data = {
-                    "model": self.model_name,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.7
-                }
-                
                 print(f"[API调用] 尝试生成{category_name}类商品... (尝试 {attempt+1}/{retries})")
-                response = requests.post(self.api_url, headers=headers, json=data, timeout=60)
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    product_content = result['choices'][0]['message']['content']
-                    print(f"[API响应] 成功获取响应: {product_content[:50]}...")
-                    product_data = json.loads(product_content)
-                    return product_data
-                else:
-                    error_msg = f"API调用失败: {response.status_code}, {response.text}"
-                    print(error_msg)
-                    # 尝试从错误响应中提取有用信息
-                    if attempt == retries - 1:  # 如果是最后一次尝试失败，记录更详细的错误
-                        print(f"[错误] 所有尝试均失败，返回默认数据: {error_msg}")
+                result = llm_client.chat(
+                    [{"role": "user", "content": prompt}], temperature=0.7, timeout=60,
+                    api_url=self.api_url, api_key=self.api_key, model=self.model_name,
+                    cache=False  # 同一类别要生成不同的商品，不走响应缓存
+                )
+                product_content = message_content(result)
+                print(f"[API响应] 成功获取响应: {product_content[:50]}...")
+                product_data = json.loads(product_content)
+                return product_data
+            except LLMError as e:
+                print(f"[错误] 所有尝试均失败，返回默认数据: {str(e)}")
+                break
             except json.JSONDecodeError as e:
                 print(f"[错误] JSON解析失败: {str(e)}")
             except Exception as e:
@@ -96,7 +84,7 @@ class ShopAIGenerator:
     
     def generate_product_image(self, product_name, description, category_name):
         """
-        为商品生成图片
+        为商品生成图片（阻塞等待结果）
         
         参数:
             product_name (str): 商品名称
@@ -106,45 +94,75 @@ class ShopAIGenerator:
         返回:
             str: 图片的相对URL路径，用于存储到数据库
         """
+        future = self.submit_product_image(product_name, description, category_name)
+        return self.product_image_url(future) if future else None
+
+    def submit_product_image(self, product_name, description, category_name):
+        """
+        提交商品图片生成，立即返回
+        
+        返回:
+            Future: 结果为图片保存路径；不生成图片（测试模式或禁用）时返回None
+        """
         # 如果不生成图片或者处于测试模式，则返回None
         if not self.generate_images or self.test_mode:
             print(f"[图像生成] 跳过图片生成 (测试模式或禁用图片生成)")
             return None
             
+        # 构建适合图像生成的提示词
+        # 从描述中提取关键词，最多取前50个字符作为提示词的一部分
+        short_desc = description[:50] + '...' if len(description) > 50 else description
+        prompt = f"二手{category_name}商品: {product_name}, {short_desc}"
+        
+        print(f"[图像生成] 为商品 '{product_name}' 提交图片生成...")
+        return image_pipeline.submit(prompt, width=self.image_width, height=self.image_height)
+
+    def product_image_url(self, future):
+        """
+        等待图片生成完成，把保存路径转换为相对URL路径
+        
+        返回:
+            str: 图片URL，生成失败时返回None
+        """
         try:
-            # 构建适合图像生成的提示词
-            # 从描述中提取关键词，最多取前50个字符作为提示词的一部分
-            short_desc = description[:50] + '...' if len(description) > 50 else description
-            prompt = f"二手{category_name}商品: {product_name}, {short_desc}"
-            
-            print(f"[图像生成] 为商品 '{product_name}' 生成图片...")
-            
-            # 调用图像生成函数
-            image_path = generate_image(
-                prompt=prompt,
-                width=self.image_width,
-                height=self.image_height
-            )
-            
-            # 将完整路径转换为相对URL路径
-            # 假设图片保存在static/images目录下
-            base_dir = os.path.dirname(os.path.abspath(__file__))
-            static_dir = os.path.join(base_dir, 'static')
-            
-            if image_path.startswith(static_dir):
-                # 获取文件名部分（去掉完整路径）
-                image_filename = os.path.basename(image_path)
-                # 生成指向通用API端点的URL
-                image_url = f'/api/images/{image_filename}'
-                print(f"[图像生成] 图片URL: {image_url}")
-                return image_url
-            else:
-                print(f"[图像生成] 无法转换图片路径为URL: {image_path}")
-                return None
-                
+            image_path = future.result()
         except Exception as e:
             print(f"[图像生成] 生成图片时出错: {str(e)}")
             return None
+            
+        # 将完整路径转换为相对URL路径
+        # 假设图片保存在static/images目录下
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        static_dir = os.path.join(base_dir, 'static')
+        
+        if image_path.startswith(static_dir):
+            # 获取文件名部分（去掉完整路径）
+            image_filename = os.path.basename(image_path)
+            # 生成指向通用API端点的URL
+            image_url = f'/api/images/{image_filename}'
+            print(f"[图像生成] 图片URL: {image_url}")
+            return image_url
+        else:
+            print(f"[图像生成] 无法转换图片路径为URL: {image_path}")
+            return None
+
+    def attach_product_images(self, pending):
+        """
+        等待已提交的商品图片全部生成完成，更新商品的image_url字段
+        
+        参数:
+            pending (list): [(商品, 图片Future)]
+        """
+        for product, future in pending:
+            image_url = self.product_image_url(future)
+            if image_url:
+                product.image_url = image_url
+        try:
+            self.db.session.commit()
+            print(f"更新 {len(pending)} 个商品的图片URL")
+        except Exception as e:
+            self.db.session.rollback()
+            print(f"更新商品图片URL时出错: {str(e)}")
     
     def ensure_merchant_exists(self, merchant_name):
         """确保商家存在，如果不存在则创建"""
@@ -169,8 +187,11 @@ class ShopAIGenerator:
         
         return merchant
     
-    def create_product(self, product_data, merchant, category):
-        """创建商品记录"""
+    def create_product(self, product_data, merchant, category, with_image=True):
+        """
+        创建商品记录
+        with_image为False时不生成图片（批量生成时由调用方统一提交图片生成）
+        """
         from forum.models import ShopProduct
         
         try:
@@ -190,7 +211,7 @@ class ShopAIGenerator:
             print(f"创建新商品: {product_data['name']}")
             
             # 尝试为商品生成图片
-            if self.generate_images:
+            if with_image and self.generate_images:
                 image_url = self.generate_product_image(
                     product_name=product_data['name'],
                     description=product_data['description'],
@@ -219,6 +240,8 @@ class ShopAIGenerator:
         from forum.models import ShopCategory
         
         new_products = []
+        # 已提交图片生成的商品：[(商品, 图片Future)]，图片在后台生成，与后续商品的文案生成重叠
+        pending_images = []
         merchant_names = self.get_merchant_names_from_forum()
         
         if not merchant_names:
@@ -246,15 +269,20 @@ class ShopAIGenerator:
             product_data = self.generate_product_data(category.name, merchant_name)
             
             # 创建商品
-            product = self.create_product(product_data, merchant, category)
+            product = self.create_product(product_data, merchant, category, with_image=False)
             if product:
                 new_products.append(product)
+                image_future = self.submit_product_image(product.name, product.description, category.name)
+                if image_future:
+                    pending_images.append((product, image_future))
                 # 每生成5个商品后暂停一小段时间，避免API限流
                 if (i + 1) % 5 == 0 and i + 1 < count:
                     print(f"已生成 {i + 1} 个商品，休息2秒...")
                     import time
                     time.sleep(2)
         
+        if pending_images:
+            self.attach_product_images(pending_images)
         return new_products
     
     def deactivate_old_products(self, days_threshold=7):
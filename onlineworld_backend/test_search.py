@@ -13,6 +13,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from config import Config
 from forum.models import SearchIndex, Board, Post, ShopProduct, DynamicPage, ShopCategory, ShopMerchant, Product, ProductCategory
+from forum.search_index import search_titles, get_sort_level
 
 # 数据库配置
 DATABASE_URL = Config.SQLALCHEMY_DATABASE_URI
@@ -40,59 +41,11 @@ def test_search(keyword):
             print("❌ 请输入有效搜索关键词")
             return
         
-        # 2. 基本搜索（包含所有关键词）
-        # 使用原生SQLAlchemy查询，避免Flask上下文问题
-        from sqlalchemy import and_
-        from sqlalchemy.sql import text
+        # 2. 倒排索引检索 + BM25排序（与SearchEngineView使用同一实现）
+        sorted_results = search_titles(db, keyword)
+        print(f"[调试] 查询结果数量: {len(sorted_results)}")
         
-        # 构建查询条件
-        print(f"[调试] 开始构建查询")
-        query = db.query(SearchIndex)
-        for k in keywords:
-            # 转义特殊字符，避免SQL注入
-            safe_k = k.replace('%', '\\%').replace('_', '\\_')
-            print(f"[调试] 添加关键词过滤: '{k}' (转义后: '{safe_k}')")
-            print(f"[调试] 过滤条件: SearchIndex.title.ilike('%{safe_k}%')")
-            query = query.filter(SearchIndex.title.ilike(f'%{safe_k}%', escape='\\'))
-        
-        results = query.all()
-        print(f"[调试] 查询结果数量: {len(results)}")
-        print(f"[调试] 查询结果详情: {[(r.id, r.title, r.entity_type) for r in results]}")
-        
-        # 4. 三级排序：完全相符 > 开头匹配 > 包含匹配
-        def get_sort_level(title, keyword_string):
-            """获取排序级别：1级=完全匹配，2级=开头匹配，3级=包含匹配"""
-            title_lower = title.lower()
-            keyword_lower = keyword_string.lower()
-            
-            # 调试：排序级别计算
-            print(f"[调试] 标题: '{title_lower}', 关键词: '{keyword_lower}'")
-            
-            # 1级：完全匹配
-            if title_lower == keyword_lower:
-                print(f"[调试]  完全匹配，返回级别1")
-                return 1
-            
-            # 2级：开头匹配（标题以搜索词开头）
-            if title_lower.startswith(keyword_lower):
-                print(f"[调试]  开头匹配，返回级别2")
-                return 2
-            
-            # 3级：包含匹配（标题包含搜索词）
-            print(f"[调试]  包含匹配，返回级别3")
-            return 3
-        
-        # 按级别排序，同一级别内按更新时间降序
-        print(f"[调试] 开始三级排序，结果数量: {len(results)}")
-        sorted_results = sorted(
-            results, 
-            key=lambda r: (get_sort_level(r.title, keyword), r.update_time), 
-            reverse=True
-        )
-        print(f"[调试] 排序完成，排序后结果数量: {len(sorted_results)}")
-        print(f"[调试] 排序后结果详情: {[(r.id, r.title, r.entity_type) for r in sorted_results]}")
-        
-        # 5. 输出结果
+        # 3. 输出结果
         print(f"找到 {len(sorted_results)} 条相关结果:")
         print('-'*60)
         
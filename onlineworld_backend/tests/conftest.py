@@ -0,0 +1,49 @@
+"""
+pytest公共夹具
+- 导入app之前把 DATABASE_URL 指向临时SQLite文件，测试不会读写 instance/forum.db
+- 每个测试结束后清空所有表，测试之间互不影响
+运行：cd onlineworld_backend && python -m pytest -q tests
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(BACKEND_DIR))
+sys.path.insert(0, BACKEND_DIR)
+
+_tmp_dir = tempfile.mkdtemp(prefix="onlineworld-tests-")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_tmp_dir, "forum.db").replace("\\", "/")
+os.environ["LLM_CACHE_ENABLED"] = "false"
+os.environ["LLM_CACHE_PATH"] = os.path.join(_tmp_dir, "llm_cache.db")
+
+
+@pytest.fixture(scope="session")
+def app():
+    """Flask应用（导入时已在临时数据库上建表）"""
+    from app import app as flask_app
+    flask_app.config["TESTING"] = True
+    return flask_app
+
+
+@pytest.fixture
+def session(app):
+    """应用上下文中的 db.session，测试结束后清空所有表"""
+    from forum.models import db
+    from forum import search_index
+
+    with app.app_context():
+        search_index._corpus_stats["expires_at"] = 0.0
+        yield db.session
+        db.session.rollback()
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app, session):
+    return app.test_client()
@@ -0,0 +1,223 @@
+"""调度AI任务队列：原子领取与租约过期接手、步骤检查点与数据同一事务提交、从检查点恢复不重复发帖"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+import ai_job_queue
+from ai_job_queue import claim_job, enqueue_job, retry_job, run_job
+from ai_scheduler import AIScheduler, ExecutionContext, StepExecutor
+from forum.models import AIJob, AIJobStep, Board, Post, db
+
+
+class RecordingPostExecutor(StepExecutor):
+    """只写数据库的发帖执行器（不调用大模型），记录执行过的步骤"""
+
+    def __init__(self, fail_steps=()):
+        self.calls = []
+        self.fail_steps = set(fail_steps)
+
+    def execute(self, step, resource_pool, context=None):
+        self.calls.append(step['id'])
+        if step['id'] in self.fail_steps:
+            raise RuntimeError(f"{step['id']} 执行失败")
+        params = step['params']
+        post = Post(title=params['title'], content="正文", board_id=params['board_id'])
+        db.session.add(post)
+        db.session.flush()
+        result = {"post_id": post.id, "title": post.title}
+        (context or ExecutionContext()).commit_step(db.session, step['id'], result)
+        return result
+
+
+class CrashAfterFirstStep(AIScheduler):
+    """第一个步骤提交后模拟worker崩溃（步骤数据和检查点已提交，记录耗时之前退出）"""
+
+    def execute_plan(self, plan, completed=None, on_step_done=None, **kwargs):
+        def crash(step_id, result, timing):
+            raise RuntimeError("worker崩溃")
+        return super().execute_plan(plan, completed=completed, on_step_done=crash, **kwargs)
+
+
+@pytest.fixture
+def board(session):
+    board = Board(name="测试板块")
+    session.add(board)
+    session.commit()
+    return board
+
+
+@pytest.fixture
+def executor():
+    return RecordingPostExecutor()
+
+
+@pytest.fixture
+def scheduler(executor):
+    scheduler = AIScheduler(max_threads=2)
+    scheduler.register_executor('post', executor)
+    yield scheduler
+    scheduler.close()
+
+
+def _plan(board):
+    # step_2 依赖 step_1，保证执行顺序
+    return {"steps": [
+        {"id": "step_1", "type": "post", "params": {"title": "第一帖", "board_id": board.id}},
+        {"id": "step_2", "type": "post",
+         "params": {"title": "第二帖", "board_id": board.id, "use_resources": ["step_1"]}},
+    ]}
+
+
+def _enqueue_with_plan(board):
+    job = enqueue_job("发两个帖子")
+    job.plan = _plan(board)
+    db.session.commit()
+    return job
+
+
+# -------------------------- 领取 --------------------------
+def test_claim_is_exclusive_and_in_order(session):
+    first = enqueue_job("任务一")
+    second = enqueue_job("任务二")
+
+    claimed = claim_job("worker-a")
+    assert claimed.id == first.id
+    assert (claimed.status, claimed.worker, claimed.attempts) == ("running", "worker-a", 1)
+    assert claimed.lease_until > datetime.utcnow()
+
+    assert claim_job("worker-b").id == second.id
+    assert claim_job("worker-c") is None
+
+
+def test_expired_lease_is_reclaimed(session):
+    job = enqueue_job("任务")
+    claim_job("worker-a")
+    assert claim_job("worker-b") is None
+
+    job.lease_until = datetime.utcnow() - timedelta(seconds=1)
+    session.commit()
+    reclaimed = claim_job("worker-b")
+    assert reclaimed.id == job.id
+    assert (reclaimed.worker, reclaimed.attempts) == ("worker-b", 2)
+
+
+def test_finished_jobs_are_not_claimed(session):
+    for status in ("success", "error"):
+        job = enqueue_job(status)
+        job.status = status
+    session.commit()
+    assert claim_job("worker-a") is None
+
+
+# -------------------------- 执行与检查点 --------------------------
+def test_checkpoint_and_step_data_commit_together(session, board):
+    job = enqueue_job("任务")
+    session.add(AIJobStep(job_id=job.id, step_id="step_1"))
+    session.commit()
+    context = ExecutionContext(job.job_id, checkpoint=lambda s, step_id, result: s.add(
+        AIJobStep(job_id=job.id, step_id=step_id, result=result)))
+
+    # 检查点写入失败（同一步骤重复）时，步骤写入的帖子一起回滚
+    session.add(Post(title="帖子", content="正文", board_id=board.id))
+    session.flush()
+    with pytest.raises(IntegrityError):
+        context.commit_step(session, "step_1", {"title": "帖子"})
+    session.rollback()
+    assert Post.query.count() == 0
+
+
+def test_run_job_checkpoints_each_step(session, board, scheduler, executor):
+    job = _enqueue_with_plan(board)
+    claim_job("worker-a")
+
+    assert run_job(job, "worker-a", scheduler=scheduler) == "success"
+    job = db.session.get(AIJob, job.id)
+    assert executor.calls == ["step_1", "step_2"]
+    assert set(job.result) == {"step_1", "step_2"}
+    assert job.lease_until is None and job.finish_time is not None
+
+    steps = {step.step_id: step for step in job.steps}
+    assert set(steps) == {"step_1", "step_2"}
+    # 检查点结果与写入的帖子一致，耗时在步骤完成后补记
+    assert steps["step_1"].result == job.result["step_1"]
+    assert steps["step_1"].timing["status"] == "success"
+    assert [p.title for p in Post.query.order_by(Post.id)] == ["第一帖", "第二帖"]
+
+
+def test_plan_generated_once_with_parameters(session, board, scheduler, monkeypatch):
+    job = enqueue_job("发两个帖子", parameters={"board_id": board.id})
+    monkeypatch.setattr(scheduler, "generate_execution_plan", lambda task: {"steps": [
+        {"id": "step_1", "type": "post", "params": {"title": "第一帖"}},
+    ]})
+    claim_job("worker-a")
+
+    assert run_job(job, "worker-a", scheduler=scheduler) == "success"
+    job = db.session.get(AIJob, job.id)
+    assert job.plan["steps"][0]["params"] == {"title": "第一帖", "board_id": board.id}
+
+
+def test_resume_after_crash_does_not_repeat_steps(session, board, executor):
+    job = _enqueue_with_plan(board)
+    crashing = CrashAfterFirstStep(max_threads=2)
+    crashing.register_executor('post', executor)
+    try:
+        claim_job("worker-a")
+        assert run_job(job, "worker-a", scheduler=crashing) == "pending"
+    finally:
+        crashing.close()
+
+    # 崩溃前已提交的步骤：帖子和检查点要么都在，要么都不在
+    job = db.session.get(AIJob, job.id)
+    assert [step.step_id for step in job.steps] == ["step_1"]
+    assert Post.query.count() == 1
+    assert "worker崩溃" in job.error
+    job.available_at = None
+    session.commit()
+
+    resumed = RecordingPostExecutor()
+    scheduler = AIScheduler(max_threads=2)
+    scheduler.register_executor('post', resumed)
+    try:
+        job = claim_job("worker-b")
+        assert run_job(job, "worker-b", scheduler=scheduler) == "success"
+    finally:
+        scheduler.close()
+
+    job = db.session.get(AIJob, job.id)
+    assert resumed.calls == ["step_2"]
+    assert Post.query.count() == 2
+    # 已完成步骤的结果从检查点恢复
+    assert job.result["step_1"]["title"] == "第一帖"
+    assert sorted(step.step_id for step in job.steps) == ["step_1", "step_2"]
+
+
+def test_failed_step_writes_no_checkpoint_and_retries(session, board, scheduler, executor, monkeypatch):
+    monkeypatch.setattr(ai_job_queue, "MAX_JOB_ATTEMPTS", 2)
+    executor.fail_steps.add("step_2")
+    job = _enqueue_with_plan(board)
+
+    job = claim_job("worker-a")
+    assert run_job(job, "worker-a", scheduler=scheduler) == "pending"
+    # 失败后退避，到 available_at 之前不能再次领取
+    job = db.session.get(AIJob, job.id)
+    assert job.available_at > datetime.utcnow()
+    assert claim_job("worker-a") is None
+
+    job.available_at = datetime.utcnow() - timedelta(seconds=1)
+    session.commit()
+    job = claim_job("worker-a")
+    assert job.attempts == 2
+    assert run_job(job, "worker-a", scheduler=scheduler) == "error"
+
+    job = db.session.get(AIJob, job.id)
+    assert [step.step_id for step in job.steps] == ["step_1"]
+    assert Post.query.count() == 1
+    assert executor.calls == ["step_1", "step_2", "step_2"]
+    assert job.finish_time is not None
+
+    # 重新入队后从检查点继续
+    assert retry_job(job)
+    assert (job.status, job.attempts, job.available_at, job.finish_time) == ("pending", 0, None, None)
+    assert not retry_job(job)
+    assert claim_job("worker-b").id == job.id
@@ -0,0 +1,30 @@
+"""页面条件GET：数据没变时返回304，相关数据变化后ETag失效"""
+from datetime import datetime
+
+from forum.models import Board, Post, Reply
+
+
+def _get(client, url, etag=None):
+    headers = {"If-None-Match": etag} if etag else {}
+    return client.get(url, headers=headers)
+
+
+def test_profile_etag_changes_when_others_reply(client, session):
+    board = Board(name="测试板块")
+    session.add(board)
+    session.flush()
+    post = Post(title="我的帖子", content="正文", author="楼主", board_id=board.id)
+    session.add(post)
+    session.commit()
+
+    first = _get(client, "/user/楼主")
+    assert first.status_code == 200
+    etag = first.headers["ETag"].strip('"')
+    assert _get(client, "/user/楼主", etag).status_code == 304
+
+    # 其他用户回复该用户的帖子：作者本人的帖子和回帖行数都没变，但页面上的回帖数变了
+    session.add(Reply(content="沙发", author="路人", post_id=post.id, create_time=datetime.utcnow()))
+    session.commit()
+    second = _get(client, "/user/楼主", etag)
+    assert second.status_code == 200
+    assert second.get_json()["data"]["posts"][0]["reply_count"] == 1
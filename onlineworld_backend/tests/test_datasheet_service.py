@@ -0,0 +1,45 @@
+"""DataSheet任务查询：轮询只读，执行进程已退出、已过期的任务在查询时按时间判断"""
+import uuid
+from datetime import datetime, timedelta
+
+from forum.datasheet_service import JOB_RETENTION, JOB_STALE_SECONDS, STALE_JOB_ERROR, datasheet_service
+from forum.models import DatasheetJob, db
+
+
+def _add_job(session, status, update_time, finish_time=None):
+    job = DatasheetJob(job_id=uuid.uuid4().hex, product_id=1, fingerprint=uuid.uuid4().hex, status=status,
+                       update_time=update_time, finish_time=finish_time)
+    session.add(job)
+    session.commit()
+    return job.job_id
+
+
+def test_get_job_reports_stale_job_without_writing(session):
+    job_id = _add_job(session, "running", datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS + 1))
+
+    job = datasheet_service.get_job(job_id)
+    assert (job.status, job.error) == ("error", STALE_JOB_ERROR)
+    assert not session.new and not session.dirty
+    session.commit()
+    stored = db.session.execute(db.select(DatasheetJob.status).filter_by(job_id=job_id)).scalar()
+    assert stored == "running"
+
+
+def test_get_job_keeps_active_job(session):
+    job_id = _add_job(session, "running", datetime.utcnow())
+    assert datasheet_service.get_job(job_id).status == "running"
+
+
+def test_get_job_hides_expired_job(session):
+    old = datetime.utcnow() - timedelta(seconds=JOB_RETENTION + 1)
+    job_id = _add_job(session, "success", old, finish_time=old)
+    assert datasheet_service.get_job(job_id) is None
+    assert datasheet_service.get_job("missing") is None
+
+
+def test_expire_jobs_persists_stale_jobs(session):
+    job_id = _add_job(session, "pending", datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS + 1))
+    datasheet_service._expire_jobs()
+    stored = DatasheetJob.query.filter_by(job_id=job_id).one()
+    assert (stored.status, stored.error) == ("error", STALE_JOB_ERROR)
+    assert stored.finish_time is not None
@@ -0,0 +1,96 @@
+"""游标分页：游标编解码、keyset_paginate / keyset_slice 翻页、无效游标返回400"""
+from datetime import datetime
+
+import pytest
+
+from forum.models import Board, Post
+from forum.pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_paginate, keyset_slice
+
+
+def test_cursor_round_trip():
+    values = [datetime(2025, 1, 2, 3, 4, 5, 678000), 42, "中文", None, 1.5]
+    cursor = encode_cursor(values)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == ["2025-01-02T03:04:05.678000", 42, "中文", None, 1.5]
+
+
+@pytest.mark.parametrize("cursor", ["zzz", "!!!", encode_cursor([1])[:-1] + "@"])
+def test_decode_garbage_cursor(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+def test_decode_non_list_cursor():
+    import base64
+    cursor = base64.urlsafe_b64encode(b'{"id": 1}').decode("ascii")
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+def _make_posts(session, count, create_time):
+    board = Board(name="测试板块")
+    session.add(board)
+    session.flush()
+    posts = [Post(title=f"帖子{i}", content="正文", board_id=board.id, create_time=create_time) for i in range(count)]
+    session.add_all(posts)
+    session.commit()
+    return board, posts
+
+
+def test_keyset_paginate_walks_all_rows_with_ties(session):
+    # 创建时间全部相同，靠 id 区分，翻页不能重复或漏掉
+    _, posts = _make_posts(session, 5, datetime(2025, 1, 1))
+    columns = (Post.create_time, Post.id)
+    seen, cursor = [], None
+    while True:
+        page = keyset_paginate(Post.query, columns, cursor=cursor, limit=2)
+        seen.extend(p.id for p in page.items)
+        if not page.has_more:
+            break
+        cursor = page.next_cursor
+    assert seen == sorted((p.id for p in posts), reverse=True)
+
+
+def test_keyset_paginate_ascending(session):
+    _, posts = _make_posts(session, 3, datetime(2025, 1, 1))
+    first = keyset_paginate(Post.query, (Post.create_time, Post.id), limit=2, descending=False)
+    second = keyset_paginate(Post.query, (Post.create_time, Post.id), cursor=first.next_cursor, limit=2,
+                             descending=False)
+    assert [p.id for p in first.items + second.items] == [p.id for p in posts]
+    assert second.next_cursor is None
+    assert second.to_dict() == {"next_cursor": None, "has_more": False, "limit": 2}
+
+
+def test_keyset_paginate_rejects_mismatched_cursor(session):
+    _make_posts(session, 1, datetime(2025, 1, 1))
+    with pytest.raises(InvalidCursor):
+        keyset_paginate(Post.query, (Post.create_time, Post.id), cursor=encode_cursor([1]))
+    with pytest.raises(InvalidCursor):
+        keyset_paginate(Post.query, (Post.create_time, Post.id), cursor=encode_cursor(["不是时间", 1]))
+
+
+def test_keyset_slice():
+    items = [((i, f"k{i}"), f"item{i}") for i in range(5)]
+    first = keyset_slice(items, limit=2)
+    assert first.items == ["item0", "item1"]
+    second = keyset_slice(items, cursor=first.next_cursor, limit=2)
+    assert second.items == ["item2", "item3"]
+    third = keyset_slice(items, cursor=second.next_cursor, limit=2)
+    assert third.items == ["item4"]
+    assert not third.has_more
+
+
+def test_keyset_slice_rejects_mismatched_cursor():
+    items = [((i, f"k{i}"), i) for i in range(3)]
+    with pytest.raises(InvalidCursor):
+        keyset_slice(items, cursor=encode_cursor(["a", None]))
+
+
+@pytest.mark.parametrize("url", [
+    "/api/search?keyword=x&cursor=zzz",
+    "/api/search-engine?keyword=x&cursor=zzz",
+])
+def test_invalid_cursor_returns_400(client, url):
+    response = client.get(url)
+    assert response.status_code == 400
+    assert response.get_json()["status"] == "error"
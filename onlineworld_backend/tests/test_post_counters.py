@@ -0,0 +1,97 @@
+"""帖子回帖计数：回帖增删改时 reply_count / last_reply_time 在同一事务内同步，回填与实际回帖一致"""
+from datetime import datetime, timedelta
+
+from forum.models import Board, Post, Reply
+from forum.post_counters import backfill_post_counters
+
+T0 = datetime(2025, 1, 1, 12, 0, 0)
+
+
+def _make_posts(session, count=1):
+    board = Board(name="测试板块")
+    session.add(board)
+    session.flush()
+    posts = [Post(title=f"帖子{i}", content="正文", board_id=board.id) for i in range(count)]
+    session.add_all(posts)
+    session.commit()
+    return posts
+
+
+def _reply(session, post, create_time):
+    reply = Reply(content="回帖", post_id=post.id, create_time=create_time)
+    session.add(reply)
+    session.commit()
+    return reply
+
+
+def test_new_post_has_no_replies(session):
+    post, = _make_posts(session)
+    assert post.reply_count == 0
+    assert post.last_reply_time is None
+
+
+def test_insert_updates_count_and_latest_time(session):
+    post, = _make_posts(session)
+    _reply(session, post, T0)
+    assert (post.reply_count, post.last_reply_time) == (1, T0)
+
+    # 更早的回帖只增加计数，不改最新回帖时间
+    _reply(session, post, T0 - timedelta(hours=1))
+    assert (post.reply_count, post.last_reply_time) == (2, T0)
+
+    _reply(session, post, T0 + timedelta(hours=1))
+    assert (post.reply_count, post.last_reply_time) == (3, T0 + timedelta(hours=1))
+
+
+def test_delete_recounts(session):
+    post, = _make_posts(session)
+    first = _reply(session, post, T0)
+    latest = _reply(session, post, T0 + timedelta(hours=1))
+
+    session.delete(latest)
+    session.commit()
+    assert (post.reply_count, post.last_reply_time) == (1, T0)
+
+    session.delete(first)
+    session.commit()
+    assert (post.reply_count, post.last_reply_time) == (0, None)
+
+
+def test_move_reply_recounts_both_posts(session):
+    source, target = _make_posts(session, 2)
+    _reply(session, source, T0)
+    moved = _reply(session, source, T0 + timedelta(hours=1))
+
+    moved.post_id = target.id
+    session.commit()
+    assert (source.reply_count, source.last_reply_time) == (1, T0)
+    assert (target.reply_count, target.last_reply_time) == (1, T0 + timedelta(hours=1))
+
+
+def test_edit_create_time_recounts(session):
+    post, = _make_posts(session)
+    reply = _reply(session, post, T0)
+    reply.create_time = T0 - timedelta(days=1)
+    session.commit()
+    assert (post.reply_count, post.last_reply_time) == (1, T0 - timedelta(days=1))
+
+
+def test_rollback_discards_counter_update(session):
+    post, = _make_posts(session)
+    session.add(Reply(content="回帖", post_id=post.id, create_time=T0))
+    session.flush()
+    session.rollback()
+    assert (post.reply_count, post.last_reply_time) == (0, None)
+
+
+def test_backfill_matches_replies(session):
+    post, = _make_posts(session)
+    _reply(session, post, T0)
+    _reply(session, post, T0 + timedelta(hours=2))
+    # 模拟旧数据库：计数列与回帖不一致
+    session.execute(Post.__table__.update().values(reply_count=0, last_reply_time=None))
+    session.commit()
+
+    backfill_post_counters(session)
+    session.commit()
+    assert (post.reply_count, post.last_reply_time) == (2, T0 + timedelta(hours=2))
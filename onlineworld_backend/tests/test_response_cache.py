@@ -0,0 +1,55 @@
+"""响应缓存：表写入版本号存在数据库里，其他进程（独立的引擎和会话）的写入同样让缓存失效"""
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from forum.models import Board, CacheVersion
+from forum.response_cache import ResponseCache
+
+
+def _counting_view(cache):
+    calls = []
+
+    @cache.cached("test_boards", [Board])
+    def view():
+        calls.append(1)
+        return {"boards": len(calls)}
+
+    return view, calls
+
+
+def test_cache_hit_until_table_written(session):
+    view, calls = _counting_view(ResponseCache())
+    assert view() == view() == {"boards": 1}
+
+    session.add(Board(name="新板块"))
+    session.commit()
+    assert view() == {"boards": 2}
+    assert session.get(CacheVersion, "board").version == 1
+
+
+def test_write_from_another_process_invalidates(app, session):
+    view, calls = _counting_view(ResponseCache())
+    view()
+
+    # 生成器进程：独立的引擎和会话（不经过Flask-SQLAlchemy）
+    engine = create_engine(app.config["SQLALCHEMY_DATABASE_URI"])
+    try:
+        with Session(engine) as other:
+            other.add(Board(name="生成器写入"))
+            other.commit()
+    finally:
+        engine.dispose()
+    session.rollback()
+    view()
+    assert len(calls) == 2
+
+
+def test_rollback_discards_version_bump(session):
+    view, calls = _counting_view(ResponseCache())
+    view()
+    session.add(Board(name="回滚"))
+    session.flush()
+    session.rollback()
+    view()
+    assert len(calls) == 1
+    assert session.get(CacheVersion, "board") is None
@@ -0,0 +1,106 @@
+"""搜索索引：分词、BM25排序、候选数上限、posting随索引记录同步"""
+from collections import Counter
+from datetime import datetime, timedelta
+
+from forum import search_index
+from forum.models import SearchIndex, SearchPosting
+from forum.search_index import get_sort_level, keyword_tokens, search_titles, search_titles_ranked, tokenize_title
+
+
+def _add_titles(session, *titles, update_time=None):
+    entries = []
+    for i, title in enumerate(titles):
+        entry = SearchIndex(title=title, entity_type="forum_post", entity_id=i + 1, url=f"/post/{i + 1}")
+        if update_time is not None:
+            entry.update_time = update_time
+        entries.append(entry)
+    session.add_all(entries)
+    session.commit()
+    return entries
+
+
+def test_tokenize_title_unigrams_and_bigrams():
+    assert tokenize_title("Ab测试") == Counter({"a": 1, "b": 1, "测": 1, "试": 1, "ab": 1, "b测": 1, "测试": 1})
+    # 空白和标点切断词串，不跨词串组二元组
+    assert tokenize_title("测试, 测试") == Counter({"测": 2, "试": 2, "测试": 2})
+    assert tokenize_title(None) == Counter()
+
+
+def test_keyword_tokens():
+    assert keyword_tokens("服务器") == {"服务", "务器"}
+    assert keyword_tokens("A") == {"a"}
+    assert keyword_tokens("C++") == {"c"}
+    assert keyword_tokens("++") == set()
+
+
+def test_get_sort_level():
+    assert get_sort_level("服务器", "服务器") == 1
+    assert get_sort_level("服务器维修", "服务器") == 2
+    assert get_sort_level("老式服务器", "服务器") == 3
+
+
+def test_postings_written_with_index(session):
+    entry, = _add_titles(session, "服务器")
+    rows = {(p.token, p.tf, p.doc_len) for p in SearchPosting.query.filter_by(index_id=entry.id)}
+    assert rows == {("服", 1, 3), ("务", 1, 3), ("器", 1, 3), ("服务", 1, 3), ("务器", 1, 3)}
+
+
+def test_postings_follow_title_changes_and_deletes(session):
+    entry, = _add_titles(session, "服务器")
+    entry.title = "路由器"
+    session.commit()
+    assert search_titles(session, "服务器") == []
+    assert search_titles(session, "路由器") == [entry]
+
+    session.delete(entry)
+    session.commit()
+    assert SearchPosting.query.count() == 0
+
+
+def test_bm25_ranking(session):
+    exact, long_title, _, _ = _add_titles(session, "服务器", "老式服务器维修记录汇总", "务器服务", "网络设备")
+    # "务器服务" 含全部二元组但不含子串，必须被过滤；更短的标题BM25得分更高
+    assert search_titles(session, "服务器") == [exact, long_title]
+    # 多个关键词之间为"且"
+    assert search_titles(session, "服务器 维修") == [long_title]
+    assert search_titles(session, "交换机") == []
+    assert search_titles(session, "   ") == []
+
+
+def test_ties_break_by_update_time(session):
+    now = datetime.utcnow()
+    older, = _add_titles(session, "复古电脑", update_time=now - timedelta(days=1))
+    newer, = _add_titles(session, "复古电脑", update_time=now)
+    # 得分和匹配级别都相同时，更新时间新的在前
+    assert search_titles(session, "复古电脑") == [newer, older]
+
+
+def test_candidates_capped_to_top_scores(session, monkeypatch):
+    titles = ["服务器" + "测" * i for i in range(6)]
+    entries = _add_titles(session, *reversed(titles))
+    full = search_titles_ranked(session, "服务器")
+    assert len(full) == len(entries)
+    # 标题越短得分越高
+    assert [r.title for _, r in full] == titles
+
+    monkeypatch.setattr(search_index, "MAX_CANDIDATES", 3)
+    capped = search_titles_ranked(session, "服务器")
+    assert capped == full[:3]
+
+
+def test_punctuation_keyword_falls_back_to_like(session, monkeypatch):
+    now = datetime.utcnow()
+    old, = _add_titles(session, "C++入门", update_time=now - timedelta(days=1))
+    new, = _add_titles(session, "精通C++", update_time=now)
+    _add_titles(session, "C语言")
+    assert set(search_titles(session, "++")) == {old, new}
+
+    # 退回LIKE匹配时同样只取最近更新的 MAX_CANDIDATES 条
+    monkeypatch.setattr(search_index, "MAX_CANDIDATES", 1)
+    assert search_titles(session, "++") == [new]
+
+
+def test_like_fallback_escapes_backslash(session):
+    backslash, _ = _add_titles(session, "路径 C:\\ 说明", "折扣 100%")
+    # 反斜杠按字面匹配，不能把后面的通配符 "%" 转义成字面的 "%"
+    assert search_titles(session, "\\") == [backslash]
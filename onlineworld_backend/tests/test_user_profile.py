@@ -0,0 +1,20 @@
+"""个人主页接口：浏览量合并缓冲区里尚未写回的部分，不再单独统计发帖/回帖总数"""
+from forum.models import Board, Post
+from forum.view_counter import view_counter
+
+
+def test_profile_view_count_includes_pending_views(client, session):
+    board = Board(name="测试板块")
+    session.add(board)
+    session.flush()
+    post = Post(title="我的帖子", content="正文", author="楼主", board_id=board.id, view_count=5)
+    session.add(post)
+    session.commit()
+    view_counter.incr(Post, [post.id, post.id])
+    try:
+        for url in ("/api/user/楼主", "/user/楼主"):
+            data = client.get(url).get_json()["data"]
+            assert data["posts"][0]["view_count"] == 7
+            assert data["user_info"] == {"author": "楼主"}
+    finally:
+        view_counter.flush()
@@ -4,7 +4,7 @@ import axios from 'axios'
  * 下载网盘文件
  * @param {string} share_id - 分享号
  * @param {string} password - 密码
- * @returns {Promise<Object>} - 包含下载结果的Promise
+ * @returns {Promise<Object>} - 包含下载结果的Promise；成功时 resumeUrl 为可断点续传的GET下载链接（有时效）
  */
 export const downloadDiskFile = async (share_id, password) => {
   try {
@@ -23,6 +23,8 @@ export const downloadDiskFile = async (share_id, password) => {
       // 处理成功的文件下载响应
       const contentType = response.headers['content-type']
       const contentDisposition = response.headers['content-disposition']
+      // 服务器签发的GET下载链接，支持Range断点续传，下载中断后用它继续
+      const resumeUrl = response.headers['x-download-url'] || null
       
       // 提取文件名
       let fileName = 'download_file'
@@ -97,7 +99,8 @@ export const downloadDiskFile = async (share_id, password) => {
       return {
         success: true,
         message: '文件下载成功',
-        fileName
+        fileName,
+        resumeUrl
       }
     } else {
       // 处理非200状态码的响应